@@ -0,0 +1,143 @@
+"""Benchmark of the ways to decode policy documents and fill a model.
+
+Encodes --rules RBAC with domains rules as one BSON stream, as a cursor receives
+them, and times decoding it and filling a model with:
+
+    per-document   decode_all, then load_policy_document for every document
+    raw-bson       RawBSONDocument, the rule read from the raw bytes in Python
+    loader         decode_all, then PolicyLoader, as load_policy does
+    loader-no-gc   the same with the garbage collector paused, as with pause_gc
+
+    python benchmarks/bench_decode.py [--rules 1000000] [--layout field|compact]
+"""
+
+import argparse
+import gc
+import os
+import struct
+import sys
+import time
+
+import bson
+import casbin
+from bson.codec_options import CodecOptions
+from bson.raw_bson import RawBSONDocument
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from casbin_pymongo_adapter import CasbinRule  # noqa: E402
+from casbin_pymongo_adapter._persist import (  # noqa: E402
+    PolicyLoader,
+    compact_document,
+    load_policy_document,
+)
+from casbin_pymongo_adapter._util import paused_gc  # noqa: E402
+
+MODEL = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    "..",
+    "tests",
+    "rbac_with_domains_model.conf",
+)
+RAW_OPTIONS = CodecOptions(document_class=RawBSONDocument)
+_INT32 = struct.Struct("<i")
+
+
+def rules(count):
+    domains = max(10, count // 1000)
+    for i in range(count):
+        domain = f"domain{i % domains}"
+        if i % 5:
+            yield "p", [f"role{i % 50}", domain, f"data{i}", "read"]
+        else:
+            yield "g", [f"user{i}", f"role{i % 50}", domain]
+
+
+def encode(count, layout):
+    documents = []
+    for ptype, rule in rules(count):
+        line = CasbinRule(ptype, *rule)
+        documents.append(compact_document(line) if layout == "compact" else line.dict())
+    return b"".join(map(bson.encode, documents))
+
+
+def raw_strings(raw, start, end):
+    """Yield the name and value of the string elements of raw[start:end]
+
+    Policy documents only hold strings, and arrays of strings in the compact
+    layout, so no other BSON type is handled.
+    """
+    while start < end and raw[start]:
+        kind = raw[start]
+        name_end = raw.index(0, start + 1)
+        name = raw[start + 1 : name_end].decode()
+        (size,) = _INT32.unpack_from(raw, name_end + 1)
+        if kind == 0x02:
+            value = raw[name_end + 5 : name_end + 4 + size].decode()
+            start = name_end + 5 + size
+        elif kind == 0x04:
+            value = [v for _, v in raw_strings(raw, name_end + 5, name_end + size)]
+            start = name_end + 1 + size
+        else:
+            raise ValueError(f"unexpected BSON type {kind:#x}")
+        yield name, value
+
+
+def load_raw(data, model):
+    loader = PolicyLoader(model)
+    for document in bson.decode_all(data, RAW_OPTIONS):
+        raw = document.raw
+        loader.load(dict(raw_strings(raw, 4, len(raw) - 1)))
+
+
+def load_per_document(data, model):
+    for document in bson.decode_all(data):
+        load_policy_document(document, model)
+
+
+def load_loader(data, model):
+    PolicyLoader(model).load_all(bson.decode_all(data))
+
+
+def load_loader_no_gc(data, model):
+    with paused_gc():
+        load_loader(data, model)
+
+
+MODES = {
+    "per-document": load_per_document,
+    "raw-bson": load_raw,
+    "loader": load_loader,
+    "loader-no-gc": load_loader_no_gc,
+}
+
+
+def best_seconds(function, data, repeat):
+    timings = []
+    for _ in range(repeat):
+        model = casbin.Enforcer(MODEL).get_model()
+        start = time.perf_counter()
+        function(data, model)
+        timings.append(time.perf_counter() - start)
+        del model
+        gc.collect()
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rules", type=int, default=1000000)
+    parser.add_argument("--layout", choices=["field", "compact"], default="field")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    data = encode(args.rules, args.layout)
+    print(f"{args.rules} rules, {args.layout} layout, {len(data) / 1e6:.1f} MB BSON")
+    print(f"{'mode':<14}{'seconds':>9}{'rules/s':>12}")
+    for name, function in MODES.items():
+        seconds = best_seconds(function, data, args.repeat)
+        print(f"{name:<14}{seconds:>9.2f}{args.rules / seconds:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
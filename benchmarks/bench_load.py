@@ -0,0 +1,75 @@
+"""Benchmark of load_policy as the thread pool grows.
+
+Seeds a collection with --rules rules unless it already holds that many, then
+times Adapter.load_policy with parallelism 1, 2, 4 and 8 against a running
+MongoDB.
+
+    python benchmarks/bench_load.py [--uri mongodb://localhost:27017] [--rules 1000000]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import casbin
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from casbin_pymongo_adapter import Adapter  # noqa: E402
+
+MODEL = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "tests", "rbac_model.conf"
+)
+
+
+def seed(adapter, rules):
+    collection = adapter._collection
+    if collection.estimated_document_count() == rules:
+        return
+    collection.drop()
+    adapter.add_policies(
+        "p",
+        "p",
+        (
+            [f"user{i}", f"domain{i % 100}", f"data{i % 1000}", "read"]
+            for i in range(rules)
+        ),
+    )
+
+
+def best_load_seconds(adapter, parallelism, repeat):
+    model = casbin.Enforcer(MODEL).get_model()
+    timings = []
+    for _ in range(repeat):
+        model.clear_policy()
+        start = time.perf_counter()
+        adapter.load_policy(model, parallelism=parallelism)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--uri", default="mongodb://localhost:27017")
+    parser.add_argument("--dbname", default="casbin_bench")
+    parser.add_argument("--rules", type=int, default=1000000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    adapter = Adapter(args.uri, args.dbname, chunk_size=10000)
+    seed(adapter, args.rules)
+
+    print(f"{'threads':<10}{'seconds':>10}{'rules/s':>14}{'speedup':>10}")
+    baseline = None
+    for parallelism in (1, 2, 4, 8):
+        seconds = best_load_seconds(adapter, parallelism, args.repeat)
+        baseline = baseline or seconds
+        print(
+            f"{parallelism:<10}{seconds:>10.2f}{args.rules / seconds:>14.0f}"
+            f"{baseline / seconds:>9.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""Micro-benchmark of the per-rule overhead of CasbinRule.
+
+Compares the current `__slots__` CasbinRule with the previous
+implementation, which kept a `__dict__` and built `dict()` through `dir()`.
+
+    python benchmarks/bench_rule.py [--number 100000]
+"""
+
+import argparse
+import os
+import sys
+import timeit
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from casbin_pymongo_adapter._rule import CasbinRule  # noqa: E402
+
+
+class LegacyCasbinRule:
+    """CasbinRule as it was before the `__slots__` rework"""
+
+    def __init__(
+        self, ptype=None, v0=None, v1=None, v2=None, v3=None, v4=None, v5=None
+    ):
+        self.ptype = ptype
+        self.v0 = v0
+        self.v1 = v1
+        self.v2 = v2
+        self.v3 = v3
+        self.v4 = v4
+        self.v5 = v5
+
+    def dict(self):
+        d = {"ptype": self.ptype}
+
+        for value in dir(self):
+            if (
+                getattr(self, value) is not None
+                and value.startswith("v")
+                and value[1:].isnumeric()
+            ):
+                d[value] = getattr(self, value)
+
+        return d
+
+
+RULE = ("alice", "domain1", "data1", "read")
+DOCUMENT = {"_id": None, "ptype": "p", "v0": "alice", "v1": "data1", "v2": "read"}
+
+
+def legacy_from_document(document):
+    rule = LegacyCasbinRule(document["ptype"])
+    for key, value in document.items():
+        setattr(rule, key, value)
+    return rule
+
+
+def per_call_ns(statement, number):
+    return min(timeit.repeat(statement, number=number, repeat=5)) / number * 1e9
+
+
+def bytes_per_instance(cls, count):
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    rules = [cls("p", *RULE) for _ in range(count)]
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    size = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    del rules
+    return size / count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--number", type=int, default=100000)
+    args = parser.parse_args()
+
+    cases = [
+        (
+            "construct + dict()",
+            lambda: LegacyCasbinRule("p", *RULE).dict(),
+            lambda: CasbinRule("p", *RULE).dict(),
+        ),
+        (
+            "from document",
+            lambda: legacy_from_document(DOCUMENT),
+            lambda: CasbinRule.from_document(DOCUMENT),
+        ),
+    ]
+
+    print(f"{'case':<22}{'legacy ns':>12}{'slots ns':>12}{'speedup':>10}")
+    for name, legacy, current in cases:
+        legacy_ns = per_call_ns(legacy, args.number)
+        current_ns = per_call_ns(current, args.number)
+        print(
+            f"{name:<22}{legacy_ns:>12.0f}{current_ns:>12.0f}"
+            f"{legacy_ns / current_ns:>9.1f}x"
+        )
+
+    legacy_bytes = bytes_per_instance(LegacyCasbinRule, args.number)
+    current_bytes = bytes_per_instance(CasbinRule, args.number)
+    print(f"{'bytes per instance':<22}{legacy_bytes:>12.0f}{current_bytes:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
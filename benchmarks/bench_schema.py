@@ -0,0 +1,130 @@
+"""Benchmark of the field and the compact document layouts.
+
+Encodes --rules RBAC with domains rules in both layouts and reports the BSON
+size of the documents and the time to decode them and fill a model, which is
+what load_policy spends its client time on. Unless --offline is given, both
+layouts are also written to a running MongoDB to report the collection and
+index sizes and time Adapter.load_policy.
+
+    python benchmarks/bench_schema.py [--uri mongodb://localhost:27017] [--rules 1000000] [--offline]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import bson
+import casbin
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from casbin_pymongo_adapter import Adapter, CasbinRule  # noqa: E402
+from casbin_pymongo_adapter._persist import (  # noqa: E402
+    PolicyLoader,
+    compact_document,
+)
+
+MODEL = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    "..",
+    "tests",
+    "rbac_with_domains_model.conf",
+)
+LAYOUTS = ("field", "compact")
+
+
+def rules(count):
+    domains = max(10, count // 1000)
+    for i in range(count):
+        domain = f"domain{i % domains}"
+        if i % 5:
+            yield "p", [f"role{i % 50}", domain, f"data{i}", "read"]
+        else:
+            yield "g", [f"user{i}", f"role{i % 50}", domain]
+
+
+def document(layout, ptype, rule):
+    line = CasbinRule(ptype, *rule)
+    return compact_document(line) if layout == "compact" else line.dict()
+
+
+def best_seconds(function, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def offline(count, repeat):
+    print(f"{'layout':<10}{'BSON MB':>10}{'bytes/rule':>12}{'decode+load s':>15}")
+    for layout in LAYOUTS:
+        data = b"".join(
+            bson.encode(document(layout, ptype, rule)) for ptype, rule in rules(count)
+        )
+
+        def load():
+            model = casbin.Enforcer(MODEL).get_model()
+            PolicyLoader(model).load_all(bson.decode_all(data))
+
+        seconds = best_seconds(load, repeat)
+        print(
+            f"{layout:<10}{len(data) / 1e6:>10.1f}{len(data) / count:>12.1f}"
+            f"{seconds:>15.2f}"
+        )
+
+
+def online(uri, dbname, count, repeat):
+    print(
+        f"\n{'layout':<10}{'data MB':>10}{'storage MB':>12}{'index MB':>10}"
+        f"{'load_policy s':>15}"
+    )
+    for layout in LAYOUTS:
+        adapter = Adapter(
+            uri,
+            dbname,
+            collection=f"casbin_rule_{layout}",
+            chunk_size=10000,
+            compact=layout == "compact",
+        )
+        collection = adapter._collection
+        if collection.estimated_document_count() != count:
+            collection.drop()
+            adapter.ensure_indexes()
+            model = casbin.Enforcer(MODEL).get_model()
+            for ptype, rule in rules(count):
+                model.add_policy(ptype[0], ptype, rule)
+            adapter.save_policy(model)
+        stats = collection.database.command("collStats", collection.name)
+
+        def load():
+            adapter.load_policy(casbin.Enforcer(MODEL).get_model())
+
+        seconds = best_seconds(load, repeat)
+        print(
+            f"{layout:<10}{stats['size'] / 1e6:>10.1f}"
+            f"{stats['storageSize'] / 1e6:>12.1f}"
+            f"{stats['totalIndexSize'] / 1e6:>10.1f}{seconds:>15.2f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--uri", default="mongodb://localhost:27017")
+    parser.add_argument("--dbname", default="casbin_bench")
+    parser.add_argument("--rules", type=int, default=1000000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--offline", action="store_true", help="skip the MongoDB measurements"
+    )
+    args = parser.parse_args()
+
+    offline(args.rules, args.repeat)
+    if not args.offline:
+        online(args.uri, args.dbname, args.rules, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
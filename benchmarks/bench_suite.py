@@ -0,0 +1,276 @@
+"""Benchmark suite of the adapter operations on RBAC with domains datasets.
+
+For each dataset size, times save_policy, load_policy, load_filtered_policy of
+one domain, single and batch add and remove, and update_policies, with the sync
+and the async adapter against a running MongoDB. Reports throughput, latency
+percentiles and the peak RSS of the process, optionally as JSON, and compares
+the throughput with a baseline JSON run.
+
+    python benchmarks/bench_suite.py [--uri mongodb://localhost:27017] [--rules 10000 100000 1000000]
+        [--output results.json] [--baseline baseline.json] [--threshold 0.1]
+"""
+
+import argparse
+import asyncio
+import inspect
+import json
+import os
+import platform
+import resource
+import sys
+import time
+
+import casbin
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from casbin_pymongo_adapter import Adapter, Filter  # noqa: E402
+from casbin_pymongo_adapter.asynchronous import (  # noqa: E402
+    Adapter as AsyncAdapter,
+)
+
+MODEL = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    "..",
+    "tests",
+    "rbac_with_domains_model.conf",
+)
+RULES_PER_DOMAIN = 1000
+BATCH_SIZE = 1000
+
+
+def domain_count(rules):
+    return max(10, rules // RULES_PER_DOMAIN)
+
+
+def dataset(rules):
+    """Yield the rules of a synthetic RBAC with domains policy, 80% p and 20% g"""
+    domains = domain_count(rules)
+    for i in range(rules):
+        domain = f"domain{i % domains}"
+        if i % 5:
+            yield "p", ["p", f"role{i % 50}", domain, f"data{i}", "read"]
+        else:
+            yield "g", ["g", f"user{i}", f"role{i % 50}", domain]
+
+
+def new_model(rules=0):
+    model = casbin.Enforcer(MODEL).get_model()
+    for sec, (ptype, *rule) in dataset(rules):
+        model.add_policy(sec, ptype, rule)
+    return model
+
+
+def extra_rules(tag, count):
+    return [
+        [f"bench_{tag}{i}", "bench_domain", f"data{i}", "write"] for i in range(count)
+    ]
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / (1 << 20) if platform.system() == "Darwin" else peak / 1024
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def summarize(adapter, rules, case, samples, items):
+    """Describe the timings of a case, `items` rules or calls per sample"""
+    return {
+        "adapter": adapter,
+        "rules": rules,
+        "case": case,
+        "samples": len(samples),
+        "throughput": items * len(samples) / sum(samples),
+        "p50_ms": percentile(samples, 0.50) * 1000,
+        "p95_ms": percentile(samples, 0.95) * 1000,
+        "p99_ms": percentile(samples, 0.99) * 1000,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+async def call(result):
+    return await result if inspect.isawaitable(result) else result
+
+
+async def timed(function, *args):
+    start = time.perf_counter()
+    await call(function(*args))
+    return time.perf_counter() - start
+
+
+async def bench_adapter(name, adapter, rules, args):
+    results = []
+
+    def report(case, samples, items):
+        result = summarize(name, rules, case, samples, items)
+        results.append(result)
+        print(
+            f"{name:<7}{rules:>9} {case:<22}{result['throughput']:>12.0f}/s"
+            f"{result['p50_ms']:>10.2f}{result['p95_ms']:>10.2f}{result['p99_ms']:>10.2f}"
+            f"{result['peak_rss_mb']:>10.0f}"
+        )
+
+    model = new_model(rules)
+    samples = []
+    for _ in range(args.repeat):
+        # keeps the indexes, unlike a drop
+        await call(adapter._collection.delete_many({}))
+        samples.append(await timed(adapter.save_policy, model))
+    report("save_policy", samples, rules)
+    del model
+
+    samples = []
+    for _ in range(args.repeat):
+        model = new_model()
+        samples.append(await timed(adapter.load_policy, model))
+    report("load_policy", samples, rules)
+    del model
+
+    samples = []
+    domains = domain_count(rules)
+    for i in range(args.ops):
+        domain = f"domain{i % domains}"
+        samples.append(
+            await timed(
+                adapter.load_filtered_policy,
+                new_model(),
+                Filter(
+                    any_of=[Filter(ptype="p", v1=domain), Filter(ptype="g", v2=domain)]
+                ),
+            )
+        )
+    report("load_filtered_policy", samples, 1)
+
+    single = extra_rules("single", args.ops)
+    report(
+        "add_policy",
+        [await timed(adapter.add_policy, "p", "p", rule) for rule in single],
+        1,
+    )
+    report(
+        "remove_policy",
+        [await timed(adapter.remove_policy, "p", "p", rule) for rule in single],
+        1,
+    )
+
+    batches = [extra_rules(f"batch{i}_", BATCH_SIZE) for i in range(args.repeat)]
+    report(
+        "add_policies",
+        [await timed(adapter.add_policies, "p", "p", batch) for batch in batches],
+        BATCH_SIZE,
+    )
+    updated = [[[*rule[:3], "read"] for rule in batch] for batch in batches]
+    report(
+        "update_policies",
+        [
+            await timed(adapter.update_policies, "p", "p", batch, new)
+            for batch, new in zip(batches, updated)
+        ],
+        BATCH_SIZE,
+    )
+    report(
+        "remove_policies",
+        [await timed(adapter.remove_policies, "p", "p", batch) for batch in updated],
+        BATCH_SIZE,
+    )
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Print the throughput change of every case found in the baseline
+
+    Returns:
+        int: Number of cases slower than the baseline by more than the threshold
+    """
+    previous = {
+        (result["adapter"], result["rules"], result["case"]): result
+        for result in baseline["results"]
+    }
+    regressions = 0
+    print(
+        f"\n{'adapter':<7}{'rules':>9} {'case':<22}{'baseline':>12}{'now':>12}{'change':>9}"
+    )
+    for result in results:
+        before = previous.get((result["adapter"], result["rules"], result["case"]))
+        if before is None:
+            continue
+        change = result["throughput"] / before["throughput"] - 1
+        regressed = change < -threshold
+        regressions += regressed
+        print(
+            f"{result['adapter']:<7}{result['rules']:>9} {result['case']:<22}"
+            f"{before['throughput']:>12.0f}{result['throughput']:>12.0f}"
+            f"{change:>+8.0%}{'  REGRESSION' if regressed else ''}"
+        )
+    return regressions
+
+
+async def run(args):
+    results = []
+    print(
+        f"{'adapter':<7}{'rules':>9} {'case':<22}{'throughput':>14}"
+        f"{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'rss MB':>10}"
+    )
+    for rules in args.rules:
+        if "sync" in args.adapters:
+            adapter = Adapter(args.uri, args.dbname, create_indexes=True)
+            results.extend(await bench_adapter("sync", adapter, rules, args))
+            adapter._collection.drop()
+        if "async" in args.adapters:
+            adapter = AsyncAdapter(args.uri, args.dbname)
+            await adapter.ensure_indexes()
+            results.extend(await bench_adapter("async", adapter, rules, args))
+            await adapter._collection.drop()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--uri", default="mongodb://localhost:27017")
+    parser.add_argument("--dbname", default="casbin_bench")
+    parser.add_argument(
+        "--rules", type=int, nargs="+", default=[10000, 100000, 1000000]
+    )
+    parser.add_argument(
+        "--adapters", nargs="+", choices=["sync", "async"], default=["sync", "async"]
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--ops", type=int, default=200, help="calls timed by the single rule cases"
+    )
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="JSON file of a previous run to compare to")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="throughput drop reported as a regression, 0.1 for 10%%",
+    )
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(
+                {
+                    "python": platform.python_version(),
+                    "platform": platform.platform(),
+                    "results": results,
+                },
+                f,
+                indent=2,
+            )
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,19 @@
 from .adapter import Adapter
-from ._filter import Filter
+from ._filter import Filter, Prefix, Range
+from ._router import TenantRouter
 from ._rule import CasbinRule
+from .domain_cache import DomainCache
+from .metrics import Metrics
+from .watcher import Watcher
 
 __all__ = [
     "Adapter",
     "Filter",
+    "Prefix",
+    "Range",
     "CasbinRule",
+    "TenantRouter",
+    "Watcher",
+    "DomainCache",
+    "Metrics",
 ]
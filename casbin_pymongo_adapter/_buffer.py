@@ -0,0 +1,231 @@
+import asyncio
+import contextvars
+import threading
+import time
+from functools import wraps
+from inspect import iscoroutinefunction
+
+from ._util import logger
+
+ADD = "add"
+REMOVE = "remove"
+
+
+def flushed(method):
+    """Write the adapter's buffered writes, if any, before running a method
+
+    Loads, lookups and bulk writes then see every rule added or removed before
+    them.
+    """
+    if iscoroutinefunction(method):
+
+        @wraps(method)
+        async def wrapper(self, *args, **kwargs):
+            if self._buffer is not None:
+                await self._buffer.flush()
+            return await method(self, *args, **kwargs)
+
+    else:
+
+        @wraps(method)
+        def wrapper(self, *args, **kwargs):
+            if self._buffer is not None:
+                self._buffer.flush()
+            return method(self, *args, **kwargs)
+
+    return wrapper
+
+
+class PendingWrites:
+    """
+    Rule writes waiting for the next flush, in arrival order
+
+    A write cancels the pending write of the opposite kind on the same rule.
+    casbin only adds a rule missing from the model and only removes a rule
+    present in it, so an add followed by a remove, or a remove followed by an
+    add, leaves the stored policy as it was.
+    """
+
+    def __init__(self):
+        self._writes = {}
+
+    def __len__(self):
+        return len(self._writes)
+
+    def push(self, kind, ptype, rule):
+        key = (ptype, tuple(rule))
+        pending = self._writes.pop(key, None)
+        if pending is None or pending == kind:
+            self._writes[key] = kind
+
+    def drain(self):
+        """Remove and return the pending writes as (kind, ptype, rule) tuples"""
+        writes = [
+            (kind, ptype, list(rule)) for (ptype, rule), kind in self._writes.items()
+        ]
+        self._writes.clear()
+        return writes
+
+
+class _Buffer:
+    def __init__(self, write, size, interval, max_pending, on_error):
+        """
+        Args:
+            write (callable): Called with the list of (kind, ptype, rule) writes to send.
+            size (int): Number of pending writes that triggers a flush.
+            interval (float): Seconds a write waits at most before it is flushed.
+            max_pending (int): Number of pending writes beyond which a write flushes
+                          the buffer itself before returning.
+            on_error (callable, optional): Called as on_error(error, writes) when a flush fails.
+        """
+        if size < 1:
+            raise ValueError("buffer size must be at least 1")
+        self._write = write
+        self._size = size
+        self._interval = interval
+        self._max_pending = max(size, max_pending)
+        self._on_error = on_error
+        self._pending = PendingWrites()
+        # clock time of the oldest pending write
+        self._since = 0.0
+
+    def __len__(self):
+        return len(self._pending)
+
+    def _failed(self, error, writes):
+        if self._on_error is not None:
+            self._on_error(error, writes)
+        else:
+            logger.error("write buffer: %d writes failed: %s", len(writes), error)
+
+
+class WriteBuffer(_Buffer):
+    """
+    Queue the add_policy and remove_policy writes of an adapter and send them as
+    bulk writes from a background thread
+
+    The thread runs while writes are pending. It flushes when `size` writes are
+    pending or when the oldest one has waited `interval` seconds.
+    """
+
+    def __init__(self, write, size, interval, max_pending, on_error=None):
+        super().__init__(write, size, interval, max_pending, on_error)
+        self._condition = threading.Condition()
+        # held from the drain to the end of the write, so a flush returns after
+        # the writes drained by a concurrent flush are sent too
+        self._flush_lock = threading.Lock()
+        self._thread = None
+
+    def push(self, kind, ptype, rule):
+        while True:
+            with self._condition:
+                if len(self._pending) < self._max_pending:
+                    if not self._pending:
+                        self._since = time.monotonic()
+                    self._pending.push(kind, ptype, rule)
+                    if len(self._pending) >= self._size:
+                        self._condition.notify()
+                    if self._thread is None:
+                        self._thread = threading.Thread(
+                            target=self._run, name="casbin-pymongo-writes", daemon=True
+                        )
+                        self._thread.start()
+                    return
+            # backpressure: the caller waits for the pending writes to be sent
+            self._flush(raise_errors=False)
+
+    def flush(self):
+        """Send every pending write, raising the error of a failed flush"""
+        self._flush(raise_errors=True)
+
+    def _flush(self, raise_errors):
+        with self._flush_lock:
+            with self._condition:
+                writes = self._pending.drain()
+            if not writes:
+                return
+            try:
+                self._write(writes)
+            except Exception as e:
+                self._failed(e, writes)
+                if raise_errors:
+                    raise
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while True:
+                    if not self._pending:
+                        self._thread = None
+                        return
+                    remaining = self._since + self._interval - time.monotonic()
+                    if len(self._pending) >= self._size or remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+            self._flush(raise_errors=False)
+
+
+class AsyncWriteBuffer(_Buffer):
+    """
+    Queue the add_policy and remove_policy writes of an asynchronous adapter and
+    send them as bulk writes from an asyncio task
+
+    The task runs while writes are pending. It flushes when `size` writes are
+    pending or when the oldest one has waited `interval` seconds.
+    """
+
+    def __init__(self, write, size, interval, max_pending, on_error=None):
+        super().__init__(write, size, interval, max_pending, on_error)
+        self._task = None
+        # created in the event loop, on first use
+        self._wakeup = None
+        self._flush_lock = None
+
+    async def push(self, kind, ptype, rule):
+        while len(self._pending) >= self._max_pending:
+            # backpressure: the caller waits for the pending writes to be sent
+            await self._flush(raise_errors=False)
+        if not self._pending:
+            self._since = time.monotonic()
+        self._pending.push(kind, ptype, rule)
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            # the task starts from an empty context: the copy create_task makes
+            # would hold the caller's session, which is not the buffer's to use
+            loop = asyncio.get_running_loop()
+            self._task = contextvars.Context().run(loop.create_task, self._run())
+        elif len(self._pending) >= self._size:
+            self._wakeup.set()
+
+    async def flush(self):
+        """Send every pending write, raising the error of a failed flush"""
+        await self._flush(raise_errors=True)
+
+    async def _flush(self, raise_errors):
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        async with self._flush_lock:
+            writes = self._pending.drain()
+            if not writes:
+                return
+            try:
+                await self._write(writes)
+            except Exception as e:
+                self._failed(e, writes)
+                if raise_errors:
+                    raise
+
+    async def _run(self):
+        try:
+            while self._pending:
+                remaining = self._since + self._interval - time.monotonic()
+                if len(self._pending) < self._size and remaining > 0:
+                    self._wakeup.clear()
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), remaining)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                await self._flush(raise_errors=False)
+        finally:
+            self._task = None
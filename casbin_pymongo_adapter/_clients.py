@@ -0,0 +1,79 @@
+import threading
+
+
+def _frozen(value):
+    if isinstance(value, (list, tuple)):
+        return tuple(map(_frozen, value))
+    if isinstance(value, dict):
+        return tuple(sorted((k, _frozen(v)) for k, v in value.items()))
+    return value
+
+
+class ClientRegistry:
+    """
+    MongoClient and AsyncMongoClient instances shared by the adapters of a process
+
+    Adapters created from the same URI and client options share one client, and
+    so one connection pool and one set of monitoring threads. Every adapter
+    using a client holds a reference to it, and the client is closed by the
+    adapter releasing the last one.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # key -> [client, references]
+        self._clients = {}
+        # id(client) -> key
+        self._keys = {}
+
+    def acquire(self, client_class, uri, scope=None, **options):
+        """Return the shared client of a URI and options, creating it if needed
+
+        Args:
+            client_class (type): MongoClient or AsyncMongoClient
+            uri (str): Connection string of the client
+            scope (optional): Clients of different scopes are never shared. The
+                          asynchronous adapter passes its event loop, since an
+                          AsyncMongoClient is bound to the loop it runs in.
+            **options: Keyword arguments of the client constructor, such as maxPoolSize
+
+        Returns:
+            The client, to be given back with release
+        """
+        key = (client_class, uri, scope, _frozen(options))
+        with self._lock:
+            entry = self._clients.get(key)
+            if entry is None:
+                entry = self._clients[key] = [client_class(uri, **options), 0]
+                self._keys[id(entry[0])] = key
+            entry[1] += 1
+            return entry[0]
+
+    def release(self, client):
+        """Give back a client returned by acquire
+
+        Returns:
+            The client when this was its last reference, for the caller to
+            close, None otherwise
+        """
+        with self._lock:
+            key = self._keys.get(id(client))
+            if key is None:
+                return None
+            entry = self._clients[key]
+            entry[1] -= 1
+            if entry[1] > 0:
+                return None
+            del self._clients[key]
+            del self._keys[id(client)]
+            return client
+
+    def references(self, client):
+        """Return the number of adapters holding a client, 0 if it is not shared"""
+        with self._lock:
+            key = self._keys.get(id(client))
+            return 0 if key is None else self._clients[key][1]
+
+
+# the registry of every adapter of the process
+clients = ClientRegistry()
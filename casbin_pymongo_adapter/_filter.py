@@ -1,16 +1,212 @@
+import re
+
+from ._persist import COMPACT_PROJECTION, POLICY_PROJECTION, compact_query
+from ._rule import FIELDS
+
+FILTER_FIELDS = ("ptype",) + FIELDS
+
+
+class Prefix:
+    """
+    Match values starting with a prefix
+
+    Compiled to an anchored, case-sensitive regex, which MongoDB answers with an
+    index range scan.
+    """
+
+    __slots__ = ("prefix",)
+
+    def __init__(self, prefix):
+        self.prefix = prefix
+
+    def condition(self):
+        return re.compile("^" + re.escape(self.prefix))
+
+    def __eq__(self, other):
+        return isinstance(other, Prefix) and other.prefix == self.prefix
+
+    def __hash__(self):
+        return hash((Prefix, self.prefix))
+
+    def __repr__(self):
+        return f"Prefix({self.prefix!r})"
+
+
+class Range:
+    """
+    Match values in the half-open range [start, stop), either bound may be None
+    """
+
+    __slots__ = ("start", "stop")
+
+    def __init__(self, start=None, stop=None):
+        self.start = start
+        self.stop = stop
+
+    def condition(self):
+        condition = {}
+        if self.start is not None:
+            condition["$gte"] = self.start
+        if self.stop is not None:
+            condition["$lt"] = self.stop
+        return condition
+
+    def __eq__(self, other):
+        return isinstance(other, Range) and (other.start, other.stop) == (
+            self.start,
+            self.stop,
+        )
+
+    def __hash__(self):
+        return hash((Range, self.start, self.stop))
+
+    def __repr__(self):
+        return f"Range({self.start!r}, {self.stop!r})"
+
+
+def _field_conditions(values):
+    matches = [
+        value.condition() if isinstance(value, Prefix) else value
+        for value in values
+        if not isinstance(value, Range)
+    ]
+    conditions = [value.condition() for value in values if isinstance(value, Range)]
+    if len(matches) == 1:
+        conditions.insert(0, matches[0])
+    elif matches:
+        conditions.insert(0, {"$in": matches})
+    return conditions
+
+
+def filter_query(filter, compact=False):
+    """Return the query and projection of a Filter, or of any object with its attributes
+
+    In the compact layout a projection keeps the values up to the last `v` field
+    it names, as a slice of the `r` array.
+    """
+    if isinstance(filter, Filter):
+        query, projection = filter.query(), filter.projection_spec()
+    else:
+        query, projection = compile_query(filter), compile_projection(filter)
+    if not compact:
+        return query, projection
+    if projection is POLICY_PROJECTION:
+        projection = COMPACT_PROJECTION
+    else:
+        count = max(
+            (int(field[1:]) + 1 for field in projection if field in FIELDS), default=0
+        )
+        projection = {**COMPACT_PROJECTION, "r": {"$slice": count}}
+    return compact_query(query), projection
+
+
+def compile_query(filter):
+    """Build the Mongo query of a filter, or of any object with the same attributes
+
+    Each field matches any of its values. Fields, and the `any_of` groups, are
+    combined with AND.
+    """
+    raw_query = getattr(filter, "raw_query", None)
+    if raw_query is not None:
+        return raw_query
+
+    query = {}
+    clauses = []
+    for field in FILTER_FIELDS:
+        conditions = _field_conditions(getattr(filter, field, ()))
+        if len(conditions) == 1:
+            query[field] = conditions[0]
+        elif conditions:
+            clauses.append({"$or": [{field: c} for c in conditions]})
+
+    groups = getattr(filter, "any_of", ())
+    if groups:
+        clauses.append(
+            {
+                "$or": [
+                    group.query() if isinstance(group, Filter) else compile_query(group)
+                    for group in groups
+                ]
+            }
+        )
+    if clauses:
+        query["$and"] = clauses
+    return query
+
+
+def compile_projection(filter):
+    """Build the projection of a filter, all rule fields if it has none"""
+    fields = getattr(filter, "projection", None)
+    if fields is None:
+        return POLICY_PROJECTION
+    return {"_id": 0, "ptype": 1, **{field: 1 for field in fields}}
+
+
 class Filter:
     """
     Filter rule model
+
+    Each of `ptype` and `v0`..`v5` lists the values the field may take. A value
+    is a string, a `Prefix` or a `Range`. `any_of` lists filters of which at
+    least one must match, for instance the p rules of a domain plus the g rules
+    of the same domain. `projection` names the `v` fields to load, all of them by
+    default.
+
+    The filter is compiled into a Mongo query once and recompiled only after an
+    attribute is assigned. Field values are stored as tuples, so they cannot be
+    changed in place behind the compiled query's back.
     """
 
-    ptype = []
-    v0 = []
-    v1 = []
-    v2 = []
-    v3 = []
-    v4 = []
-    v5 = []
+    def __init__(
+        self,
+        ptype=(),
+        v0=(),
+        v1=(),
+        v2=(),
+        v3=(),
+        v4=(),
+        v5=(),
+        any_of=(),
+        projection=None,
+        raw_query=None,
+    ):
+        self.ptype = ptype
+        self.v0 = v0
+        self.v1 = v1
+        self.v2 = v2
+        self.v3 = v3
+        self.v4 = v4
+        self.v5 = v5
+        self.any_of = any_of
+        self.projection = projection
+
+        # `raw_query` expected dict.
+        # if set `raw_query`, all other filters are ignored
+        self.raw_query = raw_query
+
+    def __setattr__(self, name, value):
+        if name in FILTER_FIELDS:
+            value = (
+                (value,) if isinstance(value, (str, Prefix, Range)) else tuple(value)
+            )
+        elif name == "any_of":
+            value = tuple(value)
+        elif name == "projection" and value is not None:
+            value = tuple(value)
+        object.__setattr__(self, name, value)
+        object.__setattr__(self, "_compiled", None)
+
+    def query(self):
+        """Return the Mongo query of the filter"""
+        return self._compile()[0]
+
+    def projection_spec(self):
+        """Return the Mongo projection of the filter"""
+        return self._compile()[1]
 
-    # `raw_query` expected dict.
-    # if set `raw_query`, all other filters are ignored
-    raw_query = None
+    def _compile(self):
+        # the groups cache their own queries, but may have changed since
+        if self._compiled is None or self.any_of:
+            compiled = (compile_query(self), compile_projection(self))
+            object.__setattr__(self, "_compiled", compiled)
+        return self._compiled
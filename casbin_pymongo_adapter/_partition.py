@@ -0,0 +1,52 @@
+# sampled ids per partition, more samples give more even partitions
+SAMPLES_PER_PARTITION = 16
+
+# partitions per concurrent reader, so a slow partition does not hold up the load
+PARTITIONS_PER_WORKER = 4
+
+
+def sample_pipeline(partitions):
+    """Build the aggregation sampling `_id` values to split a collection at
+
+    The sample is sorted by the server, which orders mixed `_id` types too.
+    """
+    return [
+        {"$sample": {"size": partitions * SAMPLES_PER_PARTITION}},
+        {"$project": {"_id": 1}},
+        {"$sort": {"_id": 1}},
+    ]
+
+
+def partition_queries(sampled_ids, partitions):
+    """Split the `_id` space into ranges at evenly spaced sampled ids
+
+    Every document matches exactly one query. Range queries only match `_id`
+    values of the bound's type, so the first range is written as a negation,
+    which also picks up documents whose `_id` has another type. A sample of
+    mixed types is not split at all.
+
+    Args:
+        sampled_ids (list): Sorted `_id` values returned by sample_pipeline
+        partitions (int): Number of ranges wanted
+
+    Returns:
+        list[dict]: Queries in `_id` order, a single empty query if the
+                    collection cannot be split
+    """
+    if len({type(_id) for _id in sampled_ids}) != 1:
+        return [{}]
+
+    bounds = []
+    step = len(sampled_ids) / partitions
+    for index in range(1, partitions):
+        bound = sampled_ids[int(index * step)]
+        if not bounds or bound != bounds[-1]:
+            bounds.append(bound)
+    if not bounds:
+        return [{}]
+
+    queries = [{"_id": {"$not": {"$gte": bounds[0]}}}]
+    for lower, upper in zip(bounds, bounds[1:]):
+        queries.append({"_id": {"$gte": lower, "$lt": upper}})
+    queries.append({"_id": {"$gte": bounds[-1]}})
+    return queries
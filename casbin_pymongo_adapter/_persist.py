@@ -0,0 +1,323 @@
+from pymongo import ASCENDING, IndexModel, InsertOne, UpdateOne
+
+from ._rule import FIELDS, CasbinRule
+
+# only the rule fields are fetched, `_id` is never decoded
+POLICY_PROJECTION = {"_id": 0, "ptype": 1, **{field: 1 for field in FIELDS}}
+REVISION_PROJECTION = {**POLICY_PROJECTION, "rev": 1}
+
+# compact layout: {"t": ptype, "r": [v0, v1, ...]}, the field names are not
+# repeated in every document. The fields of the other layout are projected too,
+# so documents not migrated yet still load.
+COMPACT_PROJECTION = {**POLICY_PROJECTION, "t": 1, "r": 1}
+COMPACT_REVISION_PROJECTION = {**COMPACT_PROJECTION, "rev": 1}
+
+# codes of IndexOptionsConflict and IndexKeySpecsConflict
+INDEX_CONFLICT_CODES = (85, 86)
+DUPLICATE_KEY_CODE = 11000
+
+# documents written before rule keys were enabled have no key and are left out
+KEY_INDEX = IndexModel("key", unique=True, sparse=True)
+
+
+def compact_field(field):
+    """Return the path of a rule field in the compact layout, `v1` being `r.1`"""
+    if field == "ptype":
+        return "t"
+    if field in FIELDS:
+        return f"r.{field[1:]}"
+    return field
+
+
+def compact_query(query):
+    """Rewrite a query on the rule fields for the compact layout"""
+    if isinstance(query, dict):
+        return {
+            compact_field(key): compact_query(value) for key, value in query.items()
+        }
+    if isinstance(query, list):
+        return [compact_query(value) for value in query]
+    return query
+
+
+def compact_document(line):
+    """Return the compact document of a rule"""
+    return {"t": line.ptype, "r": list(line.to_tuple())}
+
+
+def policy_index_models(secondary_indexes=(), rule_keys=False, compact=False):
+    """Describe the indexes of a policy collection
+
+    Args:
+        secondary_indexes (Iterable): Fields indexed on top of the compound rule
+                          index. Each entry is a field name or a sequence of field names.
+        rule_keys (bool): Whether to add the unique index on the rule key
+        compact (bool): Whether the documents use the compact layout
+
+    Returns:
+        list[IndexModel]: The compound `(ptype, v0, ..., v5)` index, or the
+                          multikey `(t, r)` index of the compact layout, the rule
+                          key index and the secondary indexes
+    """
+    if compact:
+        models = [IndexModel([("t", ASCENDING), ("r", ASCENDING)])]
+    else:
+        models = [IndexModel([("ptype", ASCENDING)] + [(f, ASCENDING) for f in FIELDS])]
+    if rule_keys:
+        models.append(KEY_INDEX)
+    for fields in secondary_indexes:
+        if isinstance(fields, str):
+            fields = (fields,)
+        if compact:
+            fields = map(compact_field, fields)
+        models.append(IndexModel([(field, ASCENDING) for field in fields]))
+    return models
+
+
+def filtered_query(ptype, field_index, field_values, compact=False):
+    """Build the query of a remove or update by field filter
+
+    Returns:
+        dict: The query, None if field_index and field_values are out of range
+    """
+    if not (0 <= field_index <= 5):
+        return None
+    if not (1 <= field_index + len(field_values) <= 6):
+        return None
+    query = {
+        f"v{index + field_index}": value
+        for index, value in enumerate(field_values)
+        if value != ""
+    }
+    query["ptype"] = ptype
+    return compact_query(query) if compact else query
+
+
+def rule_query(line, rule_keys=False, compact=False):
+    """Build the query matching exactly one rule, by key or by its fields
+
+    In the compact layout the whole `r` array is compared, which excludes longer
+    rules by itself.
+    """
+    if rule_keys:
+        return {"key": line.key()}
+    if compact:
+        return compact_document(line)
+    return line.exact_query()
+
+
+def insert_operation(document, rule_keys=False):
+    """Build the write adding a rule document
+
+    With rule keys it is an upsert on the key, so writing the same rule twice,
+    for instance when a call is retried, stores it once.
+    """
+    if not rule_keys:
+        return InsertOne(document)
+    fields = {k: v for k, v in document.items() if k != "key"}
+    return UpdateOne({"key": document["key"]}, {"$setOnInsert": fields}, upsert=True)
+
+
+def update_operation(
+    ptype, old_rule, new_rule, revision=None, rule_keys=False, compact=False
+):
+    """Build the update replacing exactly old_rule with new_rule
+
+    The filter is scoped by ptype, so it uses the compound rule index and never
+    touches a rule of another ptype, and the `v` fields the new rule no longer
+    has are unset.
+    """
+    new_line = CasbinRule(ptype, *new_rule)
+    if compact:
+        new_values = compact_document(new_line)
+        update = {"$set": new_values}
+    else:
+        new_values = new_line.dict()
+        update = {"$set": new_values}
+        trailing = FIELDS[len(new_values) - 1 :]
+        if trailing:
+            update["$unset"] = {field: "" for field in trailing}
+    if revision is not None:
+        new_values["rev"] = revision
+    if rule_keys:
+        new_values["key"] = new_line.key()
+    old_line = CasbinRule(ptype, *old_rule)
+    return UpdateOne(rule_query(old_line, rule_keys, compact), update)
+
+
+def layout_update(document, compact):
+    """Build the update rewriting a stored rule document in the other layout
+
+    Args:
+        document (dict): Document in the field layout, or in the compact layout
+        compact (bool): Whether to rewrite it in the compact layout
+    """
+    line = CasbinRule.from_document(document)
+    if compact:
+        unset = dict.fromkeys(("ptype",) + FIELDS, "")
+        return {"$set": compact_document(line), "$unset": unset}
+    return {"$set": line.dict(), "$unset": {"t": "", "r": ""}}
+
+
+def load_policy_document(document, model):
+    """Load a policy document into the model
+
+    Unlike casbin's `persist.load_policy_line`, the values are appended as they
+    are stored, so there is no string join and re-split and values containing
+    commas survive.
+
+    Args:
+        document (dict): Document holding `ptype` and `v0`..`v5`, or `t` and `r`
+        model (Model): Casbin model the rule is appended to
+    """
+    rule = document.get("r")
+    if rule is None:
+        ptype = document.get("ptype")
+    else:
+        ptype = document.get("t")
+    if not ptype:
+        return
+
+    section = model.model.get(ptype[0])
+    if section is None:
+        return
+    assertion = section.get(ptype)
+    if assertion is None:
+        return
+
+    if rule is None:
+        rule = [value for value in map(document.get, FIELDS) if value is not None]
+    assertion.policy_map[",".join(rule)] = len(assertion.policy)
+    assertion.policy.append(rule)
+
+
+# the fields of a document with n keys besides ptype
+_FIELD_PREFIXES = [FIELDS[:count] for count in range(len(FIELDS) + 1)]
+
+
+class PolicyLoader:
+    """
+    Append policy documents to a model, like load_policy_document
+
+    The assertion of each ptype is looked up once per load instead of once per
+    document. The values of a field layout document holding `ptype` and
+    `v0`..`vN` only, as loaded with POLICY_PROJECTION, are read without probing
+    the absent fields.
+    """
+
+    __slots__ = ("_model", "_assertions")
+
+    def __init__(self, model):
+        self._model = model
+        self._assertions = {}
+
+    def _assertion(self, ptype):
+        assertion = self._assertions.get(ptype)
+        if assertion is None and ptype and ptype not in self._assertions:
+            assertion = self._model.model.get(ptype[0], {}).get(ptype)
+            self._assertions[ptype] = assertion
+        return assertion
+
+    def load_all(self, documents):
+        """Append every document of an iterable"""
+        assertions = self._assertions
+        prefixes = _FIELD_PREFIXES
+        for document in documents:
+            rule = document.get("r")
+            if rule is None:
+                ptype = document.get("ptype")
+                try:
+                    rule = list(map(document.__getitem__, prefixes[len(document) - 1]))
+                except (KeyError, IndexError):
+                    rule = None
+                if rule is None or None in rule:
+                    rule = [v for v in map(document.get, FIELDS) if v is not None]
+            else:
+                ptype = document.get("t")
+
+            assertion = assertions.get(ptype)
+            if assertion is None:
+                assertion = self._assertion(ptype)
+                if assertion is None:
+                    continue
+            assertion.policy_map[",".join(rule)] = len(assertion.policy)
+            assertion.policy.append(rule)
+
+    def load(self, document):
+        """Append one document"""
+        self.load_all((document,))
+
+
+def _assertion_key(model, ptype):
+    if not ptype or model.model.get(ptype[0], {}).get(ptype) is None:
+        return None
+    return ptype[0]
+
+
+def _matches_filter(rule, field_index, field_values):
+    return all(
+        value == "" or (field_index + i < len(rule) and rule[field_index + i] == value)
+        for i, value in enumerate(field_values)
+    )
+
+
+def apply_policy_changes(model, documents, tombstones):
+    """Apply changed rules and tombstones to the model in revision order
+
+    Changes are checked against a set of the rules of each assertion they
+    touch, built once per call, and only the adds of missing rules and the
+    removes of present ones reach the model. casbin's own membership test scans
+    the whole policy, so a change that is already applied, as when a grace
+    window is read again, costs a set lookup instead.
+
+    Args:
+        model (Model): Casbin model holding the policy as of an earlier revision
+        documents (list[dict]): Rule documents written after that revision
+        tombstones (list[dict]): Tombstones recorded after that revision, either
+                          an exact rule or a `field_index`/`field_values` filter
+
+    Returns:
+        int: The highest revision applied, 0 if there was none
+    """
+    changes = [(document["rev"], True, document) for document in documents]
+    changes.extend((tombstone["rev"], False, tombstone) for tombstone in tombstones)
+    changes.sort(key=lambda change: change[0])
+
+    # ptype -> set of the rule tuples of its assertion
+    present = {}
+    for _, added, change in changes:
+        line = CasbinRule.from_document(change)
+        ptype = line.ptype
+        sec = _assertion_key(model, ptype)
+        if sec is None:
+            continue
+        assertion = model.model[sec][ptype]
+        rules = present.get(ptype)
+        if rules is None:
+            rules = present[ptype] = set(map(tuple, assertion.policy))
+
+        if "field_index" in change:
+            field_index, field_values = change["field_index"], change["field_values"]
+            matched = [
+                rule
+                for rule in rules
+                if _matches_filter(rule, field_index, field_values)
+            ]
+            if matched:
+                model.remove_filtered_policy(sec, ptype, field_index, *field_values)
+                rules.difference_update(matched)
+            continue
+        rule = line.to_tuple()
+        if added and rule not in rules:
+            if getattr(assertion, "priority_index", -1) >= 0:
+                # keeps the policy sorted by priority
+                model.add_policy(sec, ptype, list(rule))
+            else:
+                assertion.policy_map[",".join(rule)] = len(assertion.policy)
+                assertion.policy.append(list(rule))
+            rules.add(rule)
+        elif not added and rule in rules:
+            model.remove_policy(sec, ptype, list(rule))
+            rules.discard(rule)
+
+    return changes[-1][0] if changes else 0
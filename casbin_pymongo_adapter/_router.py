@@ -0,0 +1,121 @@
+import re
+from hashlib import blake2b
+
+# domains used verbatim in a collection name, anything else is hashed
+_SAFE_DOMAIN = re.compile(r"[A-Za-z0-9_.-]{1,64}")
+
+
+def _hash(value, digest_size=8):
+    return blake2b(value.encode(), digest_size=digest_size)
+
+
+class TenantRouter:
+    """
+    Spread the rules of the tenants over one collection per tenant
+
+    Passed as the `collection` of an adapter. The tenant of a rule is its domain
+    field, `v1` of p rules and `v2` of g rules by default. Its rules are stored in
+    the collection `<name>__<domain>`, or with `buckets` in one of that many
+    collections `<name>__<bucket>` picked by a stable hash of the domain. Rules of
+    other ptypes, or too short to have a domain, stay in the collection `<name>`.
+
+    Loads, filtered loads and writes only touch the collections of the tenants
+    they concern, and a tenant is dropped with Adapter.drop_tenant.
+    """
+
+    def __init__(self, name="casbin_rule", domain_fields=None, buckets=None):
+        """
+        Args:
+            name (str, optional): Collection of the rules without a tenant, and prefix of the tenant collections.
+                          Defaults to "casbin_rule".
+            domain_fields (dict, optional): Index of the domain in the rules of each ptype.
+                          Defaults to {"p": 1, "g": 2}, as in the RBAC with domains model.
+            buckets (int, optional): Number of collections the tenants are hashed into. Defaults to one
+                          collection per tenant.
+        """
+        if buckets is not None and buckets < 1:
+            raise ValueError("buckets must be at least 1")
+        self.name = name
+        self.domain_fields = domain_fields or {"p": 1, "g": 2}
+        self.buckets = buckets
+
+    def collection_name(self, domain):
+        """Return the name of the collection holding the rules of a domain"""
+        if domain is None:
+            return self.name
+        if self.buckets is not None:
+            bucket = int.from_bytes(_hash(domain).digest(), "big") % self.buckets
+            return f"{self.name}__{bucket}"
+        if _SAFE_DOMAIN.fullmatch(domain):
+            return f"{self.name}__{domain}"
+        return f"{self.name}__~{_hash(domain, 16).hexdigest()}"
+
+    def is_tenant_collection(self, name):
+        """Whether a collection name is one of the tenant collections"""
+        return name.startswith(f"{self.name}__")
+
+    def rule_collection_name(self, ptype, rule):
+        """Return the name of the collection a rule is stored in"""
+        index = self.domain_fields.get(ptype)
+        if index is None or index >= len(rule):
+            return self.name
+        return self.collection_name(rule[index])
+
+    def filtered_collection_names(self, ptype, field_index, field_values):
+        """Return the names of the collections holding rules a field filter can match
+
+        Returns:
+            set[str]: The collection names, None if the filter does not fix the domain
+        """
+        index = self.domain_fields.get(ptype)
+        if index is None:
+            return {self.name}
+        position = index - field_index
+        if 0 <= position < len(field_values) and field_values[position]:
+            return {self.collection_name(field_values[position])}
+        return None
+
+    def filter_collection_names(self, filter):
+        """Return the names of the collections holding rules a Filter can match
+
+        Only plain string values of `ptype` and of the domain fields narrow the
+        collections down, the `any_of` groups are considered when the fields
+        themselves do not.
+
+        Returns:
+            set[str]: The collection names, None if the filter does not fix the domains
+        """
+        if getattr(filter, "raw_query", None) is not None:
+            return None
+        names = self._field_collection_names(filter)
+        groups = getattr(filter, "any_of", ())
+        if names is not None or not groups:
+            return names
+        names = set()
+        for group in groups:
+            group_names = self.filter_collection_names(group)
+            if group_names is None:
+                return None
+            names |= group_names
+        return names
+
+    def _field_collection_names(self, filter):
+        ptypes = _values(filter, "ptype")
+        if not ptypes or not all(isinstance(ptype, str) for ptype in ptypes):
+            return None
+        names = set()
+        for ptype in ptypes:
+            index = self.domain_fields.get(ptype)
+            if index is None:
+                names.add(self.name)
+                continue
+            domains = _values(filter, f"v{index}")
+            if not domains or not all(isinstance(domain, str) for domain in domains):
+                return None
+            names.update(map(self.collection_name, domains))
+        return names
+
+
+def _values(filter, field):
+    values = getattr(filter, field, ())
+    return (values,) if isinstance(values, str) else values
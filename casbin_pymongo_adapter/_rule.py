@@ -1,8 +1,16 @@
+import hashlib
+import json
+
+FIELDS = ("v0", "v1", "v2", "v3", "v4", "v5")
+
+
 class CasbinRule:
     """
     CasbinRule model
     """
 
+    __slots__ = ("ptype",) + FIELDS
+
     def __init__(
         self, ptype=None, v0=None, v1=None, v2=None, v3=None, v4=None, v5=None
     ):
@@ -14,19 +22,56 @@ class CasbinRule:
         self.v4 = v4
         self.v5 = v5
 
+    @classmethod
+    def from_document(cls, document):
+        """Build a rule from a stored document, ignoring `_id` and any other key
+
+        Documents of the compact layout, `{"t": ptype, "r": [v0, v1, ...]}`, are
+        recognized by their `r` array.
+        """
+        values = document.get("r")
+        if values is not None:
+            return cls(document.get("t"), *values)
+        return cls(document.get("ptype"), *map(document.get, FIELDS))
+
+    def _values(self):
+        return (self.v0, self.v1, self.v2, self.v3, self.v4, self.v5)
+
+    def to_tuple(self):
+        """Return the rule values, without ptype, as casbin keeps them in a model"""
+        return tuple(value for value in self._values() if value is not None)
+
     def dict(self):
         d = {"ptype": self.ptype}
 
-        for value in dir(self):
-            if (
-                getattr(self, value) is not None
-                and value.startswith("v")
-                and value[1:].isnumeric()
-            ):
-                d[value] = getattr(self, value)
+        for field, value in zip(FIELDS, self._values()):
+            if value is not None:
+                d[field] = value
 
         return d
 
+    def key(self):
+        """Return a deterministic 16 byte hash of the ptype and the rule values
+
+        Two rules share a key only if they have the same ptype and values, so the
+        key can identify a rule under a unique index.
+        """
+        encoded = json.dumps(
+            [self.ptype, *self.to_tuple()], ensure_ascii=False, separators=(",", ":")
+        ).encode()
+        return hashlib.blake2b(encoded, digest_size=16).digest()
+
+    def exact_query(self):
+        """Build a query matching this rule and nothing longer
+
+        The trailing `v` fields are required to be absent, so that removing
+        `("alice", "data1")` leaves `("alice", "data1", "read")` untouched.
+        """
+        query = self.dict()
+        for index in range(len(query) - 1, len(FIELDS)):
+            query[f"v{index}"] = {"$exists": False}
+        return query
+
     def __str__(self):
         return ", ".join(self.dict().values())
 
@@ -0,0 +1,144 @@
+import mmap
+import os
+import struct
+import sys
+import tempfile
+from array import array
+
+# File layout, all integers little-endian:
+#   magic
+#   header: version, string count, rule count, index count (4 x u64)
+#   string lengths (u32 each) followed by the utf-8 bytes of every string
+#   rule arities (u8 each, ptype included)
+#   string indexes of every rule field (u32 each)
+# Each distinct value is stored once, and every section can be read straight
+# from a memory map.
+MAGIC = b"CASBSNP1"
+HEADER = struct.Struct("<QQQQ")
+
+
+def _little_endian(values):
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
+
+
+def write_snapshot(path, version, model):
+    """Atomically write the policy of a model to a snapshot file
+
+    Args:
+        path (str): Snapshot file, replaced through a temporary file and a rename
+        version (int): Server-side version the policy was loaded at
+        model (Model): Casbin model holding the loaded policy
+    """
+    strings = {}
+    arities = bytearray()
+    indexes = array("I")
+    for sec in ("p", "g"):
+        for ptype, assertion in model.model.get(sec, {}).items():
+            for rule in assertion.policy:
+                arities.append(len(rule) + 1)
+                indexes.append(strings.setdefault(ptype, len(strings)))
+                for value in rule:
+                    indexes.append(strings.setdefault(value, len(strings)))
+
+    encoded = [value.encode() for value in strings]
+    lengths = array("I", map(len, encoded))
+
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".casbin-snapshot-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(MAGIC)
+            f.write(HEADER.pack(version, len(encoded), len(arities), len(indexes)))
+            f.write(_little_endian(lengths).tobytes())
+            f.write(b"".join(encoded))
+            f.write(arities)
+            f.write(_little_endian(indexes).tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def _read_array(view, offset, count):
+    values = array("I")
+    end = offset + count * values.itemsize
+    if end > len(view):
+        raise ValueError("truncated snapshot")
+    values.frombytes(view[offset:end])
+    return _little_endian(values), end
+
+
+def load_snapshot(path, version, model):
+    """Load a snapshot into the model if it was written at the given version
+
+    Args:
+        path (str): Snapshot file
+        version (int): Current server-side version of the policy
+        model (Model): Casbin model the rules are appended to
+
+    Returns:
+        bool: True if the model was loaded from the snapshot, False if the file is
+              missing, stale or unreadable and the policy must come from Mongo
+    """
+    try:
+        f = open(path, "rb")
+    except FileNotFoundError:
+        return False
+
+    with f:
+        # an empty file, e.g. truncated after a full disk, cannot be mapped
+        if os.fstat(f.fileno()).st_size < len(MAGIC) + HEADER.size:
+            return False
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            view = memoryview(mapped)
+            try:
+                return _load_view(view, version, model)
+            except (ValueError, IndexError, struct.error, UnicodeDecodeError):
+                model.clear_policy()
+                return False
+            finally:
+                view.release()
+
+
+def _load_view(view, version, model):
+    if view[: len(MAGIC)] != MAGIC:
+        return False
+    offset = len(MAGIC)
+    snapshot_version, string_count, rule_count, index_count = HEADER.unpack_from(
+        view, offset
+    )
+    if snapshot_version != version:
+        return False
+    offset += HEADER.size
+
+    lengths, offset = _read_array(view, offset, string_count)
+    strings = []
+    for length in lengths:
+        strings.append(str(view[offset : offset + length], "utf-8"))
+        offset += length
+    arities = view[offset : offset + rule_count]
+    offset += rule_count
+    indexes, offset = _read_array(view, offset, index_count)
+    if len(arities) != rule_count or offset != len(view):
+        raise ValueError("malformed snapshot")
+
+    values = list(map(strings.__getitem__, indexes))
+    assertions = {}
+    position = 0
+    for arity in arities:
+        ptype = values[position]
+        rule = values[position + 1 : position + arity]
+        position += arity
+        assertion = assertions.get(ptype)
+        if assertion is None:
+            assertion = model.model.get(ptype[0], {}).get(ptype)
+            if assertion is None:
+                continue
+            assertions[ptype] = assertion
+        assertion.policy_map[",".join(rule)] = len(assertion.policy)
+        assertion.policy.append(rule)
+    return True
@@ -0,0 +1,116 @@
+import json
+import os
+import re
+from itertools import islice
+
+from ._rule import FIELDS, CasbinRule
+
+FORMATS = ("csv", "ndjson")
+
+# the rules read or written between two progress log lines
+PROGRESS_EVERY = 100000
+
+_TOKENS_RE = re.compile(r"[,\[\]()]")
+
+
+def policy_format(path, format=None):
+    """Return the format of a policy file, from its extension unless given
+
+    `.ndjson` and `.jsonl` files hold one JSON rule document per line, any other
+    file is a casbin CSV policy.
+    """
+    if format is None:
+        return "ndjson" if path.endswith((".ndjson", ".jsonl")) else "csv"
+    if format not in FORMATS:
+        raise ValueError(f"unknown policy format {format!r}, expected one of {FORMATS}")
+    return format
+
+
+def csv_tokens(line):
+    """Split a line of a casbin CSV policy like casbin's file adapter does
+
+    Commas inside brackets or parentheses do not separate values, so
+    `p, alice, keyMatch(/data, /*), read` has three values after the ptype.
+    """
+    depth = 0
+    tokens = []
+    start = 0
+    for match in _TOKENS_RE.finditer(line):
+        c = match.group()
+        if c in "[(":
+            depth += 1
+        elif c in "])":
+            depth -= 1
+        elif depth == 0:
+            tokens.append(line[start : match.start()].strip())
+            start = match.end()
+    tokens.append(line[start:].strip())
+    return tokens
+
+
+def read_rules(lines, format, start=0):
+    """Parse the rules of a policy file lazily
+
+    Args:
+        lines (Iterable[str]): Lines of the file
+        format (str): "csv" or "ndjson"
+        start (int, optional): Number of lines to skip, already imported
+
+    Yields:
+        tuple: The line number, ptype and values of each rule. Blank lines and
+               CSV comments are skipped.
+    """
+    for number, line in enumerate(islice(lines, start, None), start + 1):
+        line = line.strip()
+        if not line or (format == "csv" and line.startswith("#")):
+            continue
+        if format == "csv":
+            ptype, *rule = csv_tokens(line)
+        else:
+            parsed = CasbinRule.from_document(json.loads(line))
+            ptype, rule = parsed.ptype, list(parsed.to_tuple())
+        if not ptype or len(rule) > len(FIELDS):
+            raise ValueError(f"line {number}: not a rule of at most 6 values: {line}")
+        yield number, ptype, rule
+
+
+def format_rule(ptype, rule, format):
+    """Return the line of a rule in a policy file
+
+    Raises:
+        ValueError: A value of the rule would not be read back from a CSV line,
+                    such as one holding a comma outside of brackets, a line break
+                    or surrounding spaces. NDJSON holds any value.
+    """
+    if format == "csv":
+        values = [ptype, *rule]
+        line = ", ".join(values)
+        # casbin CSV has no quoting, a value must survive the split as it is
+        if "\n" in line or "\r" in line or csv_tokens(line) != values:
+            raise ValueError(
+                f"{values} cannot be written to a CSV policy, export it as NDJSON"
+            )
+        return line + "\n"
+    document = CasbinRule(ptype, *rule).dict()
+    return json.dumps(document, ensure_ascii=False, separators=(",", ":")) + "\n"
+
+
+def read_checkpoint(path):
+    """Return the number of lines an interrupted import already wrote, 0 if none"""
+    if path is None:
+        return 0
+    try:
+        with open(path) as f:
+            return int(f.read().strip() or 0)
+    except FileNotFoundError:
+        return 0
+
+
+def write_checkpoint(path, lines):
+    """Atomically record that the first `lines` lines of a file were imported"""
+    if path is None:
+        return
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(str(lines))
+    os.replace(tmp_path, path)
@@ -0,0 +1,119 @@
+import gc
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from itertools import islice
+
+from pymongo import IndexModel
+
+logger = logging.getLogger("casbin_pymongo_adapter")
+
+# adapter methods whose rule writes can be given a write concern
+WRITE_CONCERN_METHODS = frozenset(
+    (
+        "save_policy",
+        "add_policy",
+        "add_policies",
+        "remove_policy",
+        "remove_policies",
+        "remove_filtered_policy",
+        "update_policies",
+        "update_filtered_policies",
+        "drop_tenant",
+        "import_policy",
+    )
+)
+
+# true while the current thread or task runs in an adapter's causal_session
+in_causal_session = ContextVar("casbin_pymongo_causal_session", default=False)
+
+
+def chunked(iterable, size):
+    """Split an iterable into lists of at most `size` items
+
+    Args:
+        iterable (Iterable): Items to split
+        size (int): Maximum number of items per chunk
+
+    Yields:
+        list: The next chunk of items
+    """
+    if size < 1:
+        raise ValueError("chunk size must be at least 1")
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def log_chunk_error(method, index, size, error):
+    """Report the write errors of one failed bulk write chunk
+
+    Args:
+        method (str): Adapter method that sent the chunk
+        index (int): Position of the chunk in the batch
+        size (int): Number of operations in the chunk
+        error (BulkWriteError): Error raised by pymongo
+    """
+    write_errors = error.details.get("writeErrors", [])
+    logger.error(
+        "%s: chunk %d failed, %d of %d operations rejected: %s",
+        method,
+        index,
+        len(write_errors),
+        size,
+        [write_error.get("errmsg") for write_error in write_errors],
+    )
+
+
+def index_models(index_information):
+    """Rebuild the secondary indexes described by Collection.index_information()
+
+    Args:
+        index_information (dict): Index name to index description
+
+    Returns:
+        list[IndexModel]: Every index except the default `_id` one
+    """
+    models = []
+    for name, info in index_information.items():
+        if name == "_id_":
+            continue
+        options = {k: v for k, v in info.items() if k not in ("key", "v", "ns")}
+        models.append(IndexModel(info["key"], name=name, **options))
+    return models
+
+
+@contextmanager
+def paused_gc(pause=True):
+    """Disable the cyclic garbage collector for the block, if it was enabled
+
+    Loading a policy allocates millions of lists and strings, none of them in a
+    reference cycle, which would trigger many pointless collections.
+    """
+    if not pause or not gc.isenabled():
+        yield
+        return
+    gc.disable()
+    try:
+        yield
+    finally:
+        gc.enable()
+
+
+def check_write_concerns(write_concerns):
+    """Validate the write_concerns option of an adapter
+
+    Returns:
+        dict: The write concern of each adapter method, by method name
+    """
+    write_concerns = dict(write_concerns or {})
+    unknown = sorted(set(write_concerns) - WRITE_CONCERN_METHODS)
+    if unknown:
+        raise ValueError(
+            f"write_concerns: unknown methods {unknown}, "
+            f"expected some of {sorted(WRITE_CONCERN_METHODS)}"
+        )
+    return write_concerns
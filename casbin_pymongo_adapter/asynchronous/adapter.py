@@ -1,8 +1,45 @@
-from casbin import persist
+import asyncio
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from uuid import uuid4
+
 from casbin.persist.adapters.asyncio.adapter import AsyncAdapter
-from pymongo import AsyncMongoClient
+from pymongo import AsyncMongoClient, DeleteMany, IndexModel, ReturnDocument
+from pymongo.errors import BulkWriteError, OperationFailure
 
+from .._persist import (
+    INDEX_CONFLICT_CODES,
+    KEY_INDEX,
+    COMPACT_PROJECTION,
+    COMPACT_REVISION_PROJECTION,
+    POLICY_PROJECTION,
+    REVISION_PROJECTION,
+    PolicyLoader,
+    apply_policy_changes,
+    compact_document,
+    filtered_query,
+    insert_operation,
+    policy_index_models,
+    rule_query,
+    update_operation,
+)
+from .._clients import clients
+from .._buffer import ADD, REMOVE, AsyncWriteBuffer, flushed
+from .._filter import filter_query
+from .._partition import PARTITIONS_PER_WORKER, partition_queries, sample_pipeline
+from .._router import TenantRouter
 from .._rule import CasbinRule
+from .._snapshot import load_snapshot, write_snapshot
+from ..metrics import instrumented
+from .._util import (
+    check_write_concerns,
+    chunked,
+    in_causal_session,
+    index_models,
+    log_chunk_error,
+    logger,
+    paused_gc,
+)
 
 
 class Adapter(AsyncAdapter):
@@ -16,6 +53,27 @@ class Adapter(AsyncAdapter):
         filtered=False,
         client=None,
         db_name=None,
+        chunk_size=1000,
+        atomic_save=False,
+        batch_size=0,
+        create_indexes=False,
+        secondary_indexes=(),
+        track_revisions=False,
+        snapshot_path=None,
+        rule_keys=False,
+        parallelism=1,
+        metrics=None,
+        compact=False,
+        pause_gc=False,
+        buffer_size=0,
+        flush_interval=1.0,
+        max_pending=None,
+        on_flush_error=None,
+        read_preference=None,
+        write_concerns=None,
+        max_pool_size=None,
+        min_pool_size=None,
+        revision_grace=None,
     ):
         """Create an adapter for Mongodb
 
@@ -24,13 +82,63 @@ class Adapter(AsyncAdapter):
                           See https://pymongo.readthedocs.io/en/stable/api/pymongo/mongo_client.html#pymongo.mongo_client.MongoClient.
                           Required if client is not provided.
             dbname (str, optional): Database to store policy. Required if client is not provided.
-            collection (str, optional): Collection of the choosen database. Defaults to "casbin_rule".
+            collection (str or TenantRouter, optional): Collection of the choosen database. Defaults to "casbin_rule".
+                          A TenantRouter spreads the rules over one collection per tenant instead.
             filtered (bool, optional): Whether to use filtered query. Defaults to False.
             client (AsyncMongoClient, optional): An existing AsyncMongoClient instance to reuse. If provided, uri is ignored.
             db_name (str, optional): Database name to use with the provided client. Takes precedence over dbname.
+            chunk_size (int, optional): Maximum number of rules sent in one bulk write by add_policies, remove_policies and save_policy. Defaults to 1000.
+            atomic_save (bool, optional): Whether save_policy replaces the whole collection by writing a staging collection
+                          and renaming it over the current one. Defaults to False, which appends the rules to the collection.
+            batch_size (int, optional): Number of documents fetched per round trip when loading policy. Defaults to 0,
+                          which leaves the batch size to the server.
+            create_indexes (bool, optional): Whether to call ensure_indexes before the first policy load. Defaults to False.
+            secondary_indexes (list, optional): Extra indexes created by ensure_indexes, such as ["v1"] for domains.
+                          Each entry is a field name or a list of field names.
+            track_revisions (bool, optional): Whether every write is stamped with a revision and every delete leaves a
+                          tombstone, which load_policy_since needs. Defaults to False.
+            snapshot_path (str, optional): Local file load_policy keeps a snapshot of the policy in. The snapshot is
+                          used instead of Mongo while the revision counter has not moved. Requires track_revisions.
+            rule_keys (bool, optional): Whether every document carries a hash of its rule under a unique index. Adds
+                          become idempotent upserts and exact lookups use the key. The index is created before
+                          the first write to a collection. Run backfill_rule_keys on a collection written without
+                          it first. Defaults to False.
+            parallelism (int, optional): Number of `_id` ranges load_policy reads concurrently. Defaults to 1, which
+                          reads the collection through a single cursor.
+
+            metrics (Metrics, optional): Metrics recording the calls of the adapter methods. Its command listener is
+                          registered on the client created from uri, register it yourself on a client passed in.
+            compact (bool, optional): Whether rules are stored as {"t": ptype, "r": [v0, v1, ...]} instead of one field
+                          per value, which makes documents smaller and faster to load. Documents of either layout are
+                          loaded, run migrate_schema after switching an existing collection. Defaults to False.
+            pause_gc (bool, optional): Whether the cyclic garbage collector is disabled while a policy is loaded. The
+                          rules loaded never form cycles, so collecting only slows large loads down, but the pause
+                          applies to the whole process, including the other tasks of the event loop. Defaults to False.
+            buffer_size (int, optional): Number of add_policy and remove_policy calls queued before they are sent as
+                          one bulk write from an asyncio task. Defaults to 0, which writes every call at once.
+            flush_interval (float, optional): Seconds a buffered call waits at most before it is sent. Defaults to 1.0.
+            max_pending (int, optional): Number of buffered calls beyond which add_policy and remove_policy send the
+                          buffer themselves before returning. Defaults to 10 times buffer_size.
+            on_flush_error (callable, optional): Called as on_flush_error(error, writes) when a background flush fails,
+                          writes being the (kind, ptype, rule) tuples that were sent. Defaults to logging the error.
+            read_preference (ReadPreference, optional): Read preference of load_policy, load_filtered_policy and
+                          load_policy_since, such as SecondaryPreferred(max_staleness=120) or Nearest(). Other reads
+                          stay on the primary. Defaults to the read preference of the client.
+            write_concerns (dict, optional): WriteConcern of the rule writes of each adapter method, by method name,
+                          such as {"save_policy": WriteConcern(w=1, j=False), "remove_policy": WriteConcern("majority")}.
+                          update_policy uses the one of update_policies. Defaults to the write concern of the client.
+            max_pool_size (int, optional): maxPoolSize of the client created from uri. Defaults to the pymongo default.
+            min_pool_size (int, optional): minPoolSize of the client created from uri. Defaults to the pymongo default.
+            revision_grace (int, optional): Number of revisions below a checkpoint that load_policy_since and snapshot
+                          loads read again. A write reserves its revisions before its documents land, so this should
+                          exceed the revisions reserved by the writes in flight at once. Defaults to 2 times chunk_size.
 
         Note:
             When both client and uri are provided, client takes precedence and uri is ignored.
+
+            The client created from uri is shared with the other adapters of the process created with the same uri,
+            pool sizes and metrics, and is only created when the adapter first talks to MongoDB. Call close to
+            release it.
         """
         # Support both db_name and dbname for backward compatibility
         database_name = db_name if db_name is not None else dbname
@@ -41,38 +149,465 @@ class Adapter(AsyncAdapter):
                 raise ValueError(
                     "db_name or dbname must be provided when using an existing client"
                 )
-            mongo_client = client
+            self._client_options = None
         else:
-            # Create a new client from URI
+            # The shared client of the URI is acquired on first use
             if uri is None:
                 raise ValueError("uri must be provided when client is not specified")
             if database_name is None:
                 raise ValueError("dbname must be provided when client is not specified")
-            mongo_client = AsyncMongoClient(uri)
+            listeners = [] if metrics is None else [metrics.command_listener()]
+            self._client_options = {"event_listeners": listeners}
+            if max_pool_size is not None:
+                self._client_options["maxPoolSize"] = max_pool_size
+            if min_pool_size is not None:
+                self._client_options["minPoolSize"] = min_pool_size
+        self._uri = uri
+        self._client = client
+        self._database_name = database_name
 
-        db = mongo_client[database_name]
-        self._collection = db[collection]
+        if isinstance(collection, TenantRouter):
+            if atomic_save:
+                raise ValueError("atomic_save is not supported with a TenantRouter")
+            self._router = collection
+            collection = collection.name
+        else:
+            self._router = None
+
+        self._collection_name = collection
+        # (collection, meta, tombstones), resolved on first use
+        self._handles = None
         self._filtered = filtered
+        self._chunk_size = chunk_size
+        self._atomic_save = atomic_save
+        self._batch_size = batch_size
+        self._secondary_indexes = secondary_indexes
+        self._rule_keys = rule_keys
+        self._parallelism = parallelism
+        self._metrics = metrics
+        self._compact = compact
+        self._pause_gc = pause_gc
+        self._read_preference = read_preference
+        self._write_concerns = check_write_concerns(write_concerns)
+        if buffer_size:
+            self._buffer = AsyncWriteBuffer(
+                self._write_buffered,
+                buffer_size,
+                flush_interval,
+                10 * buffer_size if max_pending is None else max_pending,
+                on_flush_error,
+            )
+        else:
+            self._buffer = None
+        if compact:
+            self._projection = COMPACT_PROJECTION
+            self._revision_projection = COMPACT_REVISION_PROJECTION
+        else:
+            self._projection = POLICY_PROJECTION
+            self._revision_projection = REVISION_PROJECTION
+        self._create_indexes = create_indexes
+        # tenant collections whose indexes were created by this adapter
+        self._indexed = set()
+        # collections whose unique key index was created by this adapter
+        self._keyed = set()
+        if snapshot_path is not None and not track_revisions:
+            raise ValueError("snapshot_path requires track_revisions=True")
+        self._snapshot_path = snapshot_path
+        self._track_revisions = track_revisions
+        self._revision_grace = (
+            2 * chunk_size if revision_grace is None else revision_grace
+        )
+        self._indexes_pending = create_indexes
 
     def is_filtered(self):
         return self._filtered
 
-    async def load_policy(self, model):
+    @property
+    def _collection(self):
+        return (self._handles or self._connect())[0]
+
+    @property
+    def _meta(self):
+        if not self._track_revisions:
+            return None
+        return (self._handles or self._connect())[1]
+
+    @property
+    def _tombstones(self):
+        if not self._track_revisions:
+            return None
+        return (self._handles or self._connect())[2]
+
+    def _connect(self):
+        """Resolve the client and the collections, acquiring the shared client of the uri"""
+        client = self._client
+        if client is None:
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                loop = None
+            client = self._client = clients.acquire(
+                AsyncMongoClient, self._uri, loop, **self._client_options
+            )
+        db = client[self._database_name]
+        name = self._collection_name
+        if self._track_revisions:
+            meta = db[f"{name}_meta"]
+            tombstones = db[f"{name}_tombstones"]
+        else:
+            meta = tombstones = None
+        self._handles = (db[name], meta, tombstones)
+        return self._handles
+
+    async def close(self):
+        """Send the buffered writes and release the client created from uri
+
+        The shared client is closed once every adapter using it is closed. A
+        client passed to the adapter is left open. Using the adapter again
+        acquires the client again.
+        """
+        if self._buffer is not None:
+            await self._buffer.flush()
+        self._handles = None
+        if self._client_options is None or self._client is None:
+            return
+        client, self._client = self._client, None
+        if clients.release(client) is not None:
+            await client.close()
+
+    async def ensure_indexes(self):
+        """Create the indexes used by rule lookups, deletes and filtered loads
+
+        Creating an index that already exists is a no-op on the server, so this is
+        safe to call at every startup and from many processes at once. An index
+        that conflicts with an existing one of the same name or keys is skipped
+        with a warning.
+
+        Returns:
+            list[str]: Names of the indexes now present
+        """
+        names = []
+        for collection in await self._policy_collections():
+            names.extend(await self._ensure_collection_indexes(collection))
+        if self._tombstones is not None:
+            names.extend(
+                await self._create_indexes_on(self._tombstones, [IndexModel("rev")])
+            )
+        return names
+
+    async def _ensure_collection_indexes(self, collection):
+        indexes = policy_index_models(
+            self._secondary_indexes, self._rule_keys, self._compact
+        )
+        if self._tombstones is not None:
+            indexes.append(IndexModel("rev"))
+        self._indexed.add(collection.name)
+        if self._rule_keys:
+            self._keyed.add(collection.name)
+        return await self._create_indexes_on(collection, indexes)
+
+    @staticmethod
+    async def _create_indexes_on(collection, indexes):
+        names = []
+        for index in indexes:
+            try:
+                names.extend(await collection.create_indexes([index]))
+            except OperationFailure as e:
+                if e.code not in INDEX_CONFLICT_CODES:
+                    raise
+                logger.warning("ensure_indexes: skipped %s: %s", index.document, e)
+        return names
+
+    async def _policy_collections(self):
+        """Return the collections holding rules, the tenant collections included"""
+        if self._router is None:
+            return [self._collection]
+        db = self._collection.database
+        names = sorted(
+            filter(self._router.is_tenant_collection, await db.list_collection_names())
+        )
+        return [self._collection] + [db[name] for name in names]
+
+    async def _named_collections(self, names):
+        """Return the collections of a set of names, or all of them for None"""
+        if names is None:
+            return await self._policy_collections()
+        db = self._collection.database
+        return [db[name] for name in sorted(names)]
+
+    def _rule_collection_name(self, ptype, rule):
+        if self._router is None:
+            return self._collection.name
+        return self._router.rule_collection_name(ptype, rule)
+
+    async def _writable_collection(self, name):
+        """Return a collection about to be written, creating its indexes on first use"""
+        collection = self._collection.database[name]
+        if self._create_indexes and name not in self._indexed:
+            await self._ensure_collection_indexes(collection)
+        if self._rule_keys and name not in self._keyed:
+            # the upserts on the key need its unique index, even without create_indexes
+            await self._create_indexes_on(collection, [KEY_INDEX])
+            self._keyed.add(name)
+        return collection
+
+    def _rule_groups(self, ptype, rules):
+        """Pair the name of each collection with the rules stored in it"""
+        if self._router is None:
+            return [(self._collection.name, rules)]
+        groups = defaultdict(list)
+        for rule in rules:
+            groups[self._rule_collection_name(ptype, rule)].append(rule)
+        return groups.items()
+
+    async def _filtered_collections(self, ptype, field_index, field_values):
+        if self._router is None:
+            return [self._collection]
+        return await self._named_collections(
+            self._router.filtered_collection_names(ptype, field_index, field_values)
+        )
+
+    def _load_collection(self, collection):
+        """Return the collection with the read preference of the loads"""
+        if self._read_preference is None:
+            return collection
+        return collection.with_options(read_preference=self._read_preference)
+
+    def _concerned(self, collection, method):
+        """Return the collection with the write concern of an adapter method"""
+        concern = self._write_concerns.get(method)
+        if concern is None:
+            return collection
+        return collection.with_options(write_concern=concern)
+
+    @asynccontextmanager
+    async def causal_session(self):
+        """Run the adapter calls of a block in one causally consistent session
+
+        Reads in the block see the writes made before them in the block, even
+        when they go to a secondary through read_preference, so a process can
+        revoke a rule and reload the policy without seeing the rule again. The
+        session belongs to the calling task: loads in the block read through a
+        single cursor, whatever the parallelism, and the write buffer is sent in
+        the session only by the calls that flush it.
+
+        Yields:
+            AsyncClientSession: The session bound to the block
+        """
+        client = self._collection.database.client
+        async with client.start_session(causal_consistency=True) as session:
+            token = in_causal_session.set(True)
+            try:
+                async with session.bind(end_session=False):
+                    yield session
+            finally:
+                in_causal_session.reset(token)
+
+    @asynccontextmanager
+    async def _consistent_reads(self):
+        """Read the revision and the rules of a block from one causal session
+
+        With read_preference, each read may go to another member, and a lagging
+        one would serve rules older than a revision read before them. Outside
+        an explicit causal_session and without read_preference, this is a no-op.
+        """
+        if self._read_preference is None or in_causal_session.get():
+            yield
+        else:
+            async with self.causal_session():
+                yield
+
+    async def _next_revision(self, count=1):
+        """Reserve `count` consecutive revisions and return the first one"""
+        meta = await self._meta.find_one_and_update(
+            {"_id": "revision"},
+            {"$inc": {"value": count}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        return meta["value"] - count + 1
+
+    async def _stamp_revisions(self, documents):
+        if self._meta is not None and documents:
+            first = await self._next_revision(len(documents))
+            for offset, document in enumerate(documents):
+                document["rev"] = first + offset
+        return documents
+
+    async def current_revision(self):
+        """Return the latest revision written, a checkpoint for load_policy_since
+
+        Read it before a full load_policy, so writes racing with the load are
+        picked up by the next load_policy_since. It is read with the
+        read_preference of the loads; with one, read it and load in the same
+        causal_session so the load is at least as recent as the revision.
+        """
+        self._require_revisions("current_revision")
+        meta = (
+            await self._load_collection(self._meta).find_one({"_id": "revision"}) or {}
+        )
+        return meta.get("value", 0)
+
+    @instrumented
+    @flushed
+    async def load_policy_since(self, model, checkpoint):
+        """Apply the changes written after a checkpoint to an already loaded model
+
+        Changed rules are added and tombstoned rules removed, in revision order.
+        The changes of the revision_grace revisions below the checkpoint are
+        applied again, a no-op unless a write reserved its revision before the
+        checkpoint was taken and landed after. When the checkpoint predates an atomic save_policy or pruned tombstones,
+        the model is cleared and fully reloaded instead. Role links are not
+        rebuilt, call the enforcer's build_role_links afterwards.
+
+        Args:
+            model (Model): Casbin model loaded as of the checkpoint
+            checkpoint (int): Revision returned by current_revision or by the previous call
+
+        Returns:
+            int: The checkpoint to pass to the next call
+        """
+        self._require_revisions("load_policy_since")
+        async with self._consistent_reads():
+            meta = await self._load_collection(self._meta).find_one({"_id": "revision"})
+            meta = meta or {}
+            if checkpoint < meta.get("floor", 0):
+                model.clear_policy()
+                await self.load_policy(model)
+                return meta.get("value", 0)
+
+            return max(checkpoint, await self._apply_changes_since(model, checkpoint))
+
+    async def _apply_changes_since(self, model, checkpoint):
+        """Apply the changes of the revisions above checkpoint - revision_grace
+
+        A write reserves its revisions before its documents land, so documents
+        under a checkpoint can land after it was read. Reading the grace window
+        again picks them up, and the changes already applied are skipped.
+
+        Returns:
+            int: The highest revision applied, 0 if there was none
+        """
+        query = {"rev": {"$gt": checkpoint - self._revision_grace}}
+        documents = []
+        for collection in await self._policy_collections():
+            documents.extend(
+                await self._load_collection(collection)
+                .find(query, projection=self._revision_projection)
+                .to_list(None)
+            )
+        tombstones = (
+            await self._load_collection(self._tombstones)
+            .find(query, projection={"_id": 0})
+            .to_list(None)
+        )
+        return apply_policy_changes(model, documents, tombstones)
+
+    async def prune_tombstones(self, revision):
+        """Delete the tombstones up to a revision
+
+        Callers whose checkpoint is older than the revision fall back to a full
+        reload in load_policy_since.
+
+        Returns:
+            int: Number of tombstones deleted
+        """
+        self._require_revisions("prune_tombstones")
+        await self._raise_floor(revision)
+        result = await self._tombstones.delete_many({"rev": {"$lte": revision}})
+        return result.deleted_count
+
+    async def _raise_floor(self, revision):
+        await self._meta.update_one(
+            {"_id": "revision"}, {"$max": {"floor": revision}}, upsert=True
+        )
+
+    def _require_revisions(self, method):
+        if self._meta is None:
+            raise ValueError(f"{method} requires track_revisions=True")
+
+    async def _record_tombstones(self, tombstones):
+        if self._tombstones is not None and tombstones:
+            await self._tombstones.insert_many(await self._stamp_revisions(tombstones))
+
+    async def _create_pending_indexes(self):
+        if self._indexes_pending:
+            await self.ensure_indexes()
+            self._indexes_pending = False
+
+    @instrumented
+    @flushed
+    async def load_policy(self, model, parallelism=None):
         """Implementing add Interface for casbin. Load all policy rules from mongodb
 
         Args:
             model (CasbinRule): CasbinRule object
+            parallelism (int, optional): Overrides the parallelism given to the adapter
         """
+        await self._create_pending_indexes()
+        if self._snapshot_path is None:
+            await self._load_rules(model, parallelism)
+            return
 
-        async for line in self._collection.find():
-            if "ptype" not in line:
-                continue
-            rule = CasbinRule(line["ptype"])
-            for key, value in line.items():
-                setattr(rule, key, value)
+        # the rules are read at least as recently as the revision, even when a
+        # lagging member serves the load
+        async with self._consistent_reads():
+            # read before loading, so a write racing with the load leaves the
+            # snapshot stale instead of missing the write
+            revision = await self.current_revision()
+            if await asyncio.to_thread(
+                load_snapshot, self._snapshot_path, revision, model
+            ):
+                # writes reserved before the snapshot and landed after it
+                await self._apply_changes_since(model, revision)
+                return
+            await self._load_rules(model, parallelism)
+        await asyncio.to_thread(write_snapshot, self._snapshot_path, revision, model)
 
-            persist.load_policy_line(str(rule), model)
+    async def _load_rules(self, model, parallelism):
+        parallelism = self._parallelism if parallelism is None else parallelism
+        loader = PolicyLoader(model)
+        with paused_gc(self._pause_gc):
+            for collection in map(
+                self._load_collection, await self._policy_collections()
+            ):
+                if parallelism > 1 and not in_causal_session.get():
+                    await self._load_partitioned(loader, collection, parallelism)
+                else:
+                    async for line in collection.find(
+                        projection=self._projection, batch_size=self._batch_size
+                    ):
+                        loader.load(line)
 
+    async def _load_partitioned(self, loader, collection, parallelism):
+        """Read `_id` ranges of the collection concurrently, then fill the model
+
+        Each range is read in `_id` order and the ranges are merged in order, so
+        the model is filled the same way whatever the split points were.
+        """
+        cursor = await collection.aggregate(
+            sample_pipeline(parallelism * PARTITIONS_PER_WORKER)
+        )
+        sampled_ids = [document["_id"] async for document in cursor]
+        queries = partition_queries(sampled_ids, parallelism * PARTITIONS_PER_WORKER)
+        semaphore = asyncio.Semaphore(parallelism)
+
+        async def read(query):
+            async with semaphore:
+                cursor = collection.find(
+                    query,
+                    projection=self._projection,
+                    sort=[("_id", 1)],
+                    batch_size=self._batch_size,
+                )
+                return [document async for document in cursor]
+
+        partitions = await asyncio.gather(*(read(query) for query in queries))
+        for documents in partitions:
+            loader.load_all(documents)
+
+    @instrumented
+    @flushed
     async def load_filtered_policy(self, model, filter):
         """Load filtered policy rules from mongodb
 
@@ -80,68 +615,223 @@ class Adapter(AsyncAdapter):
             model (CasbinRule): CasbinRule object
             filter (Filter): Filter rule object
         """
-        query = {}
-        if getattr(filter, "raw_query", None) is None:
-            for attr in ("ptype", "v0", "v1", "v2", "v3", "v4", "v5"):
-                if len(getattr(filter, attr)) > 0:
-                    value = getattr(filter, attr)
-                    query[attr] = {"$in": value}
-        else:
-            query = getattr(filter, "raw_query")
+        await self._create_pending_indexes()
+        query, projection = filter_query(filter, self._compact)
+        loader = PolicyLoader(model)
+        with paused_gc(self._pause_gc):
+            for collection in map(
+                self._load_collection, await self._filter_collections(filter)
+            ):
+                async for line in collection.find(
+                    query, projection=projection, batch_size=self._batch_size
+                ):
+                    loader.load(line)
+        self._filtered = True
 
-        async for line in self._collection.find(query):
-            if "ptype" not in line:
-                continue
-            rule = CasbinRule(line["ptype"])
-            for key, value in line.items():
-                setattr(rule, key, value)
+    async def _filter_collections(self, filter):
+        if self._router is None:
+            return [self._collection]
+        return await self._named_collections(
+            self._router.filter_collection_names(filter)
+        )
 
-            persist.load_policy_line(str(rule), model)
-        self._filtered = True
+    async def explain_filter(self, filter, verbosity="queryPlanner"):
+        """Explain the query load_filtered_policy runs for a filter
+
+        The winning plan shows whether the load is an index scan (IXSCAN) or reads
+        the whole collection (COLLSCAN).
+
+        Args:
+            filter (Filter): Filter rule object
+            verbosity (str, optional): "queryPlanner", "executionStats" or "allPlansExecution". Defaults to "queryPlanner".
+
+        Returns:
+            dict: The output of the explain command. With a TenantRouter, the outputs
+                  for each collection the filter is sent to, keyed by collection name.
+        """
+        query, projection = filter_query(filter, self._compact)
+        explained = {}
+        for collection in await self._filter_collections(filter):
+            explained[collection.name] = await collection.database.command(
+                "explain",
+                {"find": collection.name, "filter": query, "projection": projection},
+                verbosity=verbosity,
+            )
+        if self._router is None:
+            return explained[self._collection.name]
+        return explained
+
+    @staticmethod
+    def _policy_line(ptype, rule):
+        return CasbinRule(ptype, *rule)
+
+    def _policy_document(self, ptype, rule):
+        line = self._policy_line(ptype, rule)
+        document = compact_document(line) if self._compact else line.dict()
+        if self._rule_keys:
+            document["key"] = line.key()
+        return document
 
     async def _save_policy_line(self, ptype, rule):
-        line = CasbinRule(ptype=ptype)
-        for index, value in enumerate(rule):
-            setattr(line, f"v{index}", value)
-        await self._collection.insert_one(line.dict())
+        document = (await self._stamp_revisions([self._policy_document(ptype, rule)]))[
+            0
+        ]
+        collection = self._concerned(
+            await self._writable_collection(self._rule_collection_name(ptype, rule)),
+            "add_policy",
+        )
+        if self._rule_keys:
+            await collection.bulk_write([insert_operation(document, True)])
+        else:
+            await collection.insert_one(document)
+
+    async def _write_documents(self, collection, documents):
+        if self._rule_keys:
+            operations = [insert_operation(document, True) for document in documents]
+            await collection.bulk_write(operations, ordered=False)
+        else:
+            await collection.insert_many(documents, ordered=False)
 
     async def _delete_policy_lines(self, ptype, rule):
-        line = CasbinRule(ptype=ptype)
-        for index, value in enumerate(rule):
-            setattr(line, f"v{index}", value)
+        line = self._policy_line(ptype, rule)
+        collection = self._concerned(
+            self._collection.database[self._rule_collection_name(ptype, rule)],
+            "remove_policy",
+        )
+        # one indexed delete, longer rules are excluded by the query or the key
+        results = await collection.delete_many(
+            rule_query(line, self._rule_keys, self._compact)
+        )
+        if results.deleted_count > 0:
+            await self._record_tombstones([line.dict()])
+        return results.deleted_count
 
-        # if rule is empty, do nothing
-        # else find all given rules and delete them
-        if len(line.dict()) == 0:
-            return 0
-        else:
-            line_dict = line.dict()
-            line_dict_keys_len = len(line_dict)
-            to_delete = [
-                result["_id"]
-                async for result in self._collection.find(line_dict)
-                if line_dict_keys_len == len(result.keys()) - 1
-            ]
-            results = await self._collection.delete_many({"_id": {"$in": to_delete}})
-            return results.deleted_count
+    async def flush(self):
+        """Send the add_policy and remove_policy calls still buffered
+
+        Loads, lookups and the other writes flush the buffer first by themselves.
+        Call it before the event loop stops, as the buffer is only sent from a
+        task otherwise.
+
+        Raises:
+            Exception: The error of the failed bulk write, after on_flush_error
+        """
+        if self._buffer is not None:
+            await self._buffer.flush()
+
+    async def _write_buffered(self, writes):
+        """Send writes drained from the buffer, unordered bulk writes per collection
+
+        The buffer cancels an add and a remove of the same rule, so the writes
+        concern distinct rules and their order does not matter.
+        """
+        added = []
+        removed = []
+        for kind, ptype, rule in writes:
+            name = self._rule_collection_name(ptype, rule)
+            if kind == ADD:
+                added.append((name, self._policy_document(ptype, rule)))
+            else:
+                removed.append((name, self._policy_line(ptype, rule)))
+        await self._stamp_revisions([document for _, document in added])
+
+        # adds and removes are sent apart, with the write concerns of
+        # add_policy and remove_policy
+        operations = defaultdict(list)
+        for name, document in added:
+            operations[name, "add_policy"].append(
+                insert_operation(document, self._rule_keys)
+            )
+        for name, line in removed:
+            operations[name, "remove_policy"].append(
+                DeleteMany(rule_query(line, self._rule_keys, self._compact))
+            )
+        for (name, method), group in operations.items():
+            collection = self._concerned(await self._writable_collection(name), method)
+            for chunk in chunked(group, self._chunk_size):
+                await collection.bulk_write(chunk, ordered=False)
+        await self._record_tombstones([line.dict() for _, line in removed])
+
+    @staticmethod
+    def _policy_rules(model):
+        for sec in ["p", "g"]:
+            if sec not in model.model.keys():
+                continue
+            for ptype, ast in model.model[sec].items():
+                for rule in ast.policy:
+                    yield ptype, rule
+
+    def _policy_documents(self, model):
+        for ptype, rule in self._policy_rules(model):
+            yield self._policy_document(ptype, rule)
+
+    async def _insert_documents(self, collection, documents):
+        for chunk in chunked(documents, self._chunk_size):
+            await self._write_documents(collection, await self._stamp_revisions(chunk))
 
+    @instrumented
+    @flushed
     async def save_policy(self, model) -> bool:
         """Implement add Interface for casbin. Save the policy in mongodb
 
+        With atomic_save the rules are written to a staging collection which then
+        replaces the current collection in one rename, so readers never see a
+        partially saved policy.
+
         Args:
             model (Class Model): Casbin Model which loads from .conf file usually.
 
         Returns:
             bool: True if succeed
         """
-        for sec in ["p", "g"]:
-            if sec not in model.model.keys():
-                continue
-            for ptype, ast in model.model[sec].items():
-                for rule in ast.policy:
-                    await self._save_policy_line(ptype, rule)
+        if self._router is not None:
+            groups = defaultdict(list)
+            for ptype, rule in self._policy_rules(model):
+                groups[self._rule_collection_name(ptype, rule)].append(
+                    self._policy_document(ptype, rule)
+                )
+            for name, documents in groups.items():
+                await self._insert_documents(
+                    self._concerned(
+                        await self._writable_collection(name), "save_policy"
+                    ),
+                    documents,
+                )
+            return True
+        if not self._atomic_save:
+            collection = await self._writable_collection(self._collection.name)
+            await self._insert_documents(
+                self._concerned(collection, "save_policy"),
+                self._policy_documents(model),
+            )
+            return True
+
+        # readers with an older checkpoint must reload the replaced policy
+        floor = await self._next_revision() if self._meta is not None else None
+        db = self._collection.database
+        staging = await db.create_collection(
+            f"{self._collection.name}_staging_{uuid4().hex}"
+        )
+        try:
+            if self._rule_keys:
+                # each upsert looks its key up in the staging collection
+                await staging.create_indexes([KEY_INDEX])
+            await self._insert_documents(
+                self._concerned(staging, "save_policy"), self._policy_documents(model)
+            )
+            indexes = index_models(await self._collection.index_information())
+            if indexes:
+                await staging.create_indexes(indexes)
+            await staging.rename(self._collection.name, dropTarget=True)
+        except BaseException:
+            await staging.drop()
+            raise
+        if floor is not None:
+            await self._raise_floor(floor)
+            await self._tombstones.delete_many({"rev": {"$lt": floor}})
         return True
 
+    @instrumented
     async def add_policy(self, sec, ptype, rule):
         """Add policy rules to mongodb
 
@@ -153,9 +843,101 @@ class Adapter(AsyncAdapter):
         Returns:
             bool: True if succeed else False
         """
+        if self._buffer is not None:
+            await self._buffer.push(ADD, ptype, rule)
+            return True
         await self._save_policy_line(ptype, rule)
         return True
 
+    @instrumented
+    @flushed
+    async def add_policies(self, sec, ptype, rules):
+        """Add policy rules to mongodb in bulk.
+           Rules are sent as unordered insert_many calls of at most chunk_size documents,
+           or as upserts with rule_keys.
+
+        Args:
+            sec (str): Section name, 'g' or 'p'
+            ptype (str): Policy type, 'g', 'g2', 'p', etc.
+            rules (list[list[str]]): Casbin rules will be added
+
+        Returns:
+            bool: True if every rule was inserted else False
+        """
+        succeeded = True
+        for name, group in self._rule_groups(ptype, rules):
+            collection = self._concerned(
+                await self._writable_collection(name), "add_policies"
+            )
+            documents = (self._policy_document(ptype, rule) for rule in group)
+            for index, chunk in enumerate(chunked(documents, self._chunk_size)):
+                try:
+                    await self._write_documents(
+                        collection, await self._stamp_revisions(chunk)
+                    )
+                except BulkWriteError as e:
+                    succeeded = False
+                    log_chunk_error("add_policies", index, len(chunk), e)
+        return succeeded
+
+    @instrumented
+    @flushed
+    async def has_policy(self, sec, ptype, rule):
+        """Check whether a rule is stored in mongodb
+
+        Args:
+            sec (str): Section name, 'g' or 'p'
+            ptype (str): Policy type, 'g', 'g2', 'p', etc.
+            rule (list[str]): Casbin rule to look up
+
+        Returns:
+            bool: True if the rule is stored else False
+        """
+        query = rule_query(
+            self._policy_line(ptype, rule), self._rule_keys, self._compact
+        )
+        collection = self._collection.database[self._rule_collection_name(ptype, rule)]
+        return await collection.find_one(query, projection={"_id": 1}) is not None
+
+    @instrumented
+    @flushed
+    async def remove_policies(self, sec, ptype, rules):
+        """Remove policy rules in mongodb in bulk(rules duplicate are also removed)
+           Rules are sent as unordered bulk_write calls of at most chunk_size deletes.
+
+        Args:
+            sec (str): Section name, 'g' or 'p'
+            ptype (str): Policy type, 'g', 'g2', 'p', etc.
+            rules (list[list[str]]): Casbin rules if they are exactly same as will be removed.
+
+        Returns:
+            bool: True if every chunk succeeded and at least one policy was removed else False
+        """
+        succeeded = True
+        deleted_count = 0
+        for name, group in self._rule_groups(ptype, rules):
+            collection = self._concerned(
+                self._collection.database[name], "remove_policies"
+            )
+            lines = (self._policy_line(ptype, rule) for rule in group)
+            for index, chunk in enumerate(chunked(lines, self._chunk_size)):
+                chunk_start = deleted_count
+                operations = [
+                    DeleteMany(rule_query(line, self._rule_keys, self._compact))
+                    for line in chunk
+                ]
+                try:
+                    result = await collection.bulk_write(operations, ordered=False)
+                    deleted_count += result.deleted_count
+                except BulkWriteError as e:
+                    succeeded = False
+                    deleted_count += e.details.get("nRemoved", 0)
+                    log_chunk_error("remove_policies", index, len(chunk), e)
+                if deleted_count > chunk_start:
+                    await self._record_tombstones([line.dict() for line in chunk])
+        return succeeded and deleted_count > 0
+
+    @instrumented
     async def remove_policy(self, sec, ptype, rule):
         """Remove policy rules in mongodb(rules duplicate are also removed)
 
@@ -166,9 +948,15 @@ class Adapter(AsyncAdapter):
         Returns:
             Number: Number of policies be removed
         """
+        if self._buffer is not None:
+            # whether the rule was stored is only known once the buffer is sent
+            await self._buffer.push(REMOVE, ptype, rule)
+            return True
         deleted_count = await self._delete_policy_lines(ptype, rule)
         return deleted_count > 0
 
+    @instrumented
+    @flushed
     async def remove_filtered_policy(self, sec, ptype, field_index, *field_values):
         """Remove policy rules taht match the filter from the storage.
            This is part of the Auto-Save feature.
@@ -182,19 +970,29 @@ class Adapter(AsyncAdapter):
         Returns:
             bool: True if succeed else False
         """
-        if not (0 <= field_index <= 5):
-            return False
-        if not (1 <= field_index + len(field_values) <= 6):
+        query = filtered_query(ptype, field_index, field_values, self._compact)
+        if query is None:
             return False
-        query = {
-            f"v{index + field_index}": value
-            for index, value in enumerate(field_values)
-            if value != ""
-        }
-        query["ptype"] = ptype
-        results = await self._collection.delete_many(query)
-        return results.deleted_count > 0
+        deleted_count = 0
+        for collection in await self._filtered_collections(
+            ptype, field_index, field_values
+        ):
+            collection = self._concerned(collection, "remove_filtered_policy")
+            deleted_count += (await collection.delete_many(query)).deleted_count
+        if deleted_count > 0:
+            await self._record_tombstones(
+                [
+                    {
+                        "ptype": ptype,
+                        "field_index": field_index,
+                        "field_values": list(field_values),
+                    }
+                ]
+            )
+        return deleted_count > 0
 
+    @instrumented
+    @flushed
     async def update_policy(self, sec, ptype, old_rule, new_rule):
         """Update the old_rule with the new_rule in the database (storage).
 
@@ -203,26 +1001,259 @@ class Adapter(AsyncAdapter):
             ptype (str): policy type
             old_rule (list[str]): the old rule that needs to be modified
             new_rule (list[str]): the new rule to replace the old rule
-        """
-        filter_query = {}
-        for index, value in enumerate(old_rule):
-            filter_query[f"v{index}"] = value
-
-        await self._collection.find_one_and_update(
-            filter_query,
-            {"$set": {f"v{index}": value for index, value in enumerate(new_rule)}},
-        )
 
-        return None
+        Returns:
+            bool: True if the old rule was found else False
+        """
+        return await self._update_policies(ptype, [old_rule], [new_rule])
 
+    @instrumented
+    @flushed
     async def update_policies(self, sec, ptype, old_rules, new_rules):
         """Update the old_rule with the new_rule in the database (storage).
+           Every update is sent in one ordered bulk_write per collection, matching
+           exactly the old rule of the given ptype.
 
         Args:
             sec (str): section type
             ptype (str): policy type
             old_rules (list[list[str]]): the old rules that needs to be modified
             new_rules (list[list[str]]): the new rules to replace the old rule
+
+        Returns:
+            bool: True if every old rule was found else False. The old rules that
+                  matched nothing are logged.
+        """
+        return await self._update_policies(ptype, old_rules, new_rules)
+
+    async def _update_policies(self, ptype, old_rules, new_rules):
+        pairs = list(zip(old_rules, new_rules))
+        if not pairs:
+            return True
+        revision = None
+        if self._meta is not None:
+            # the tombstone of each old rule sorts right before its new rule
+            revision = await self._next_revision(2 * len(pairs))
+
+        def document_revision(index):
+            return None if revision is None else revision + 2 * index + 1
+
+        # a rule moving to the collection of another tenant is deleted and inserted
+        groups = defaultdict(list)
+        moved = []
+        for index, (old_rule, new_rule) in enumerate(pairs):
+            name = self._rule_collection_name(ptype, old_rule)
+            if name == self._rule_collection_name(ptype, new_rule):
+                groups[name].append(index)
+            else:
+                moved.append(index)
+
+        matched_count = 0
+        # pairs known to have matched, and pairs sent whose match is unknown
+        matched = []
+        sent = []
+        for name, indexes in groups.items():
+            operations = [
+                update_operation(
+                    ptype,
+                    *pairs[index],
+                    document_revision(index),
+                    self._rule_keys,
+                    self._compact,
+                )
+                for index in indexes
+            ]
+            collection = self._concerned(
+                await self._writable_collection(name), "update_policies"
+            )
+            try:
+                result = await collection.bulk_write(operations, ordered=True)
+                count = result.matched_count
+                attempted = indexes
+            except BulkWriteError as e:
+                count = e.details.get("nMatched", 0)
+                attempted = self._attempted(indexes, e)
+                log_chunk_error("update_policies", 0, len(operations), e)
+            matched_count += count
+            if count == len(attempted):
+                matched.extend(attempted)
+            else:
+                sent.extend(attempted)
+        for index in moved:
+            if await self._move_rule(ptype, *pairs[index], document_revision(index)):
+                matched_count += 1
+                matched.append(index)
+
+        if revision is not None and sent:
+            # an update that matched left its new rule stored
+            found = await self._stored_rules(ptype, [pairs[i][1] for i in sent])
+            matched.extend(i for i in sent if tuple(pairs[i][1]) in found)
+        if revision is not None and matched:
+            await self._tombstones.insert_many(
+                [
+                    {
+                        **CasbinRule(ptype, *pairs[index][0]).dict(),
+                        "rev": revision + 2 * index,
+                    }
+                    for index in sorted(matched)
+                ]
+            )
+        if matched_count == len(pairs):
+            return True
+
+        # an old rule matched nothing if its new rule is not stored now
+        found = await self._stored_rules(ptype, [new for _, new in pairs])
+        unmatched = [old for old, new in pairs if tuple(new) not in found]
+        logger.warning(
+            "update_policies: %d of %d rules matched nothing: %s",
+            len(pairs) - matched_count,
+            len(pairs),
+            unmatched,
+        )
+        return False
+
+    @staticmethod
+    def _attempted(indexes, error):
+        """Return the indexes an ordered bulk write applied before its first error"""
+        write_errors = error.details.get("writeErrors")
+        return indexes[: write_errors[0]["index"]] if write_errors else indexes
+
+    async def _stored_rules(self, ptype, rules):
+        """Return the tuples of the rules of a list that are stored"""
+        found = set()
+        for name, group in self._rule_groups(ptype, rules):
+            async for document in self._collection.database[name].find(
+                {
+                    "$or": [
+                        rule_query(
+                            CasbinRule(ptype, *rule), self._rule_keys, self._compact
+                        )
+                        for rule in group
+                    ]
+                },
+                projection=self._projection,
+            ):
+                found.add(CasbinRule.from_document(document).to_tuple())
+        return found
+
+    async def _move_rule(self, ptype, old_rule, new_rule, revision):
+        """Replace a rule by one stored in another collection
+
+        Returns:
+            int: 1 if the old rule was found else 0
         """
-        for old_rule, new_rule in zip(old_rules, new_rules):
-            await self.update_policy(sec, ptype, old_rule, new_rule)
+        old_collection = self._concerned(
+            self._collection.database[self._rule_collection_name(ptype, old_rule)],
+            "update_policies",
+        )
+        query = rule_query(
+            self._policy_line(ptype, old_rule), self._rule_keys, self._compact
+        )
+        if (await old_collection.delete_one(query)).deleted_count == 0:
+            return 0
+        document = self._policy_document(ptype, new_rule)
+        if revision is not None:
+            document["rev"] = revision
+        await self._write_documents(
+            self._concerned(
+                await self._writable_collection(
+                    self._rule_collection_name(ptype, new_rule)
+                ),
+                "update_policies",
+            ),
+            [document],
+        )
+        return 1
+
+    @instrumented
+    @flushed
+    async def update_filtered_policies(
+        self, sec, ptype, new_rules, field_index, *field_values
+    ):
+        """Replace the rules that match the filter with new_rules in the storage.
+           The removal and the inserts are sent in one ordered bulk_write per collection.
+
+        Args:
+            sec (str): section type
+            ptype (str): policy type
+            new_rules (list[list[str]]): the new rules replacing the matching ones
+            field_index (int): The policy index at which the filed_values begins filtering. Its range is [0, 5]
+            field_values(List[str]): A list of rules to filter policy which starts from
+
+        Returns:
+            list[list[str]]: The rules that were replaced
+        """
+        query = filtered_query(ptype, field_index, field_values, self._compact)
+        if query is None:
+            return []
+        old_rules = []
+        replaced = set()
+        for collection in await self._filtered_collections(
+            ptype, field_index, field_values
+        ):
+            async for document in collection.find(query, projection=self._projection):
+                old_rules.append(list(CasbinRule.from_document(document).to_tuple()))
+                replaced.add(collection.name)
+        if not old_rules:
+            return []
+
+        tombstone = {
+            "ptype": ptype,
+            "field_index": field_index,
+            "field_values": list(field_values),
+        }
+        documents = [self._policy_document(ptype, rule) for rule in new_rules]
+        # the removal sorts before the new rules, which may match the filter too
+        await self._stamp_revisions([tombstone] + documents)
+        groups = {name: [DeleteMany(query)] for name in replaced}
+        for rule, document in zip(new_rules, documents):
+            groups.setdefault(self._rule_collection_name(ptype, rule), []).append(
+                insert_operation(document, self._rule_keys)
+            )
+        for name, operations in groups.items():
+            collection = self._concerned(
+                await self._writable_collection(name), "update_filtered_policies"
+            )
+            try:
+                await collection.bulk_write(operations, ordered=True)
+            except BulkWriteError as e:
+                log_chunk_error("update_filtered_policies", 0, len(operations), e)
+        if self._tombstones is not None:
+            await self._tombstones.insert_one(tombstone)
+        return old_rules
+
+    @instrumented
+    @flushed
+    async def drop_tenant(self, domain):
+        """Remove every rule of a tenant, requires a TenantRouter collection
+
+        With one collection per tenant the collection is dropped, which is far
+        cheaper than deleting its rules one by one. With buckets the rules of the
+        domain are deleted from its bucket.
+
+        Args:
+            domain (str): Domain of the tenant
+        """
+        if self._router is None:
+            raise ValueError("drop_tenant requires a TenantRouter collection")
+        name = self._router.collection_name(domain)
+        collection = self._concerned(self._collection.database[name], "drop_tenant")
+        if self._router.buckets is None:
+            await collection.drop()
+            self._indexed.discard(name)
+            self._keyed.discard(name)
+        else:
+            await collection.delete_many(
+                {
+                    "$or": [
+                        filtered_query(ptype, index, [domain], self._compact)
+                        for ptype, index in self._router.domain_fields.items()
+                    ]
+                }
+            )
+        await self._record_tombstones(
+            [
+                {"ptype": ptype, "field_index": index, "field_values": [domain]}
+                for ptype, index in self._router.domain_fields.items()
+            ]
+        )
@@ -0,0 +1,162 @@
+"""Maintenance commands for a casbin policy collection.
+
+casbin-pymongo backfill-keys mongodb://localhost:27017 casbin
+casbin-pymongo migrate-schema mongodb://localhost:27017 casbin --compact
+casbin-pymongo import mongodb://localhost:27017 casbin policy.csv --checkpoint policy.checkpoint
+casbin-pymongo export mongodb://localhost:27017 casbin policy.ndjson
+casbin-pymongo deduplicate mongodb://localhost:27017 casbin --dry-run
+python -m casbin_pymongo_adapter backfill-keys mongodb://localhost:27017 casbin
+"""
+
+import argparse
+import logging
+
+from .adapter import Adapter
+
+
+def _adapter(args, **kwargs):
+    return Adapter(args.uri, args.dbname, collection=args.collection, **kwargs)
+
+
+def backfill_keys(args):
+    keyed, deleted = _adapter(args, rule_keys=True).backfill_rule_keys(args.batch_size)
+    print(f"{keyed} documents keyed, {deleted} duplicates deleted")
+
+
+def migrate_schema(args):
+    migrated = _adapter(args, compact=args.compact).migrate_schema(args.batch_size)
+    layout = "compact" if args.compact else "field"
+    print(f"{migrated} documents rewritten in the {layout} layout")
+
+
+def import_policy(args):
+    adapter = _adapter(
+        args,
+        chunk_size=args.chunk_size,
+        rule_keys=args.rule_keys,
+        compact=args.compact,
+        track_revisions=args.track_revisions,
+    )
+    imported = adapter.import_policy(args.path, args.format, args.checkpoint)
+    print(f"{imported} rules imported from {args.path}")
+
+
+def export_policy(args):
+    adapter = _adapter(args, batch_size=args.batch_size)
+    exported = adapter.export_policy(args.path, args.format)
+    print(f"{exported} rules exported to {args.path}")
+
+
+def deduplicate(args):
+    adapter = _adapter(args, compact=args.compact)
+    duplicates = adapter.deduplicate(args.dry_run, args.batch_size)
+    verb = "found" if args.dry_run else "deleted"
+    for ptype, count in sorted(duplicates.items()):
+        print(f"{ptype}: {count} extra copies {verb}")
+    print(f"{sum(duplicates.values())} extra copies {verb}")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="casbin-pymongo", description=__doc__.splitlines()[0]
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    backfill = commands.add_parser(
+        "backfill-keys", help="add the rule key to documents written without one"
+    )
+    backfill.add_argument(
+        "--batch-size", type=int, default=1000, help="documents keyed per bulk write"
+    )
+    backfill.set_defaults(func=backfill_keys)
+
+    migrate = commands.add_parser(
+        "migrate-schema", help="rewrite the documents in the compact or field layout"
+    )
+    migrate.add_argument(
+        "--compact",
+        action=argparse.BooleanOptionalAction,
+        default=True,
+        help="store rules as {t, r} documents, --no-compact for one field per value",
+    )
+    migrate.add_argument(
+        "--batch-size",
+        type=int,
+        default=1000,
+        help="documents rewritten per bulk write",
+    )
+    migrate.set_defaults(func=migrate_schema)
+
+    import_ = commands.add_parser(
+        "import", help="stream the rules of a CSV or NDJSON policy file into MongoDB"
+    )
+    import_.add_argument(
+        "--chunk-size", type=int, default=1000, help="rules written per bulk write"
+    )
+    import_.add_argument(
+        "--checkpoint", help="file recording the progress, to resume an import"
+    )
+    import_.add_argument(
+        "--rule-keys",
+        action="store_true",
+        help="write rule keys, for a collection using rule_keys",
+    )
+    import_.add_argument(
+        "--compact",
+        action="store_true",
+        help="write {t, r} documents, for a collection using compact",
+    )
+    import_.add_argument(
+        "--track-revisions",
+        action="store_true",
+        help="stamp the rules with revisions, for adapters using track_revisions",
+    )
+    import_.set_defaults(func=import_policy)
+
+    export = commands.add_parser(
+        "export", help="stream the stored rules to a CSV or NDJSON policy file"
+    )
+    export.add_argument(
+        "--batch-size", type=int, default=1000, help="documents read per round trip"
+    )
+    export.set_defaults(func=export_policy)
+
+    dedup = commands.add_parser(
+        "deduplicate", help="delete the extra copies of rules stored more than once"
+    )
+    dedup.add_argument(
+        "--dry-run", action="store_true", help="only report the extra copies by ptype"
+    )
+    dedup.add_argument(
+        "--compact",
+        action="store_true",
+        help="group {t, r} documents, for a collection using compact",
+    )
+    dedup.add_argument(
+        "--batch-size", type=int, default=1000, help="rules deduplicated per bulk write"
+    )
+    dedup.set_defaults(func=deduplicate)
+
+    for command in (import_, export):
+        command.add_argument(
+            "--format",
+            choices=["csv", "ndjson"],
+            help="file format, by default from the extension: .ndjson or .jsonl, else csv",
+        )
+
+    for command in commands.choices.values():
+        command.add_argument("uri", help="MongoDB connection string")
+        command.add_argument("dbname", help="database holding the policy")
+        command.add_argument(
+            "--collection", default="casbin_rule", help="policy collection"
+        )
+    for command in (import_, export):
+        command.add_argument("path", help="policy file")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    args.func(args)
+    return 0
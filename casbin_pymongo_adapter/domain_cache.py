@@ -0,0 +1,180 @@
+import sys
+import threading
+from collections import OrderedDict
+
+from casbin.model.policy_op import PolicyOp
+
+from ._filter import Filter
+
+
+def _rule_bytes(rule):
+    return sys.getsizeof(rule) + sum(sys.getsizeof(value) for value in rule)
+
+
+class DomainCache:
+    """Load the policy of a domain on its first enforce and evict cold domains.
+
+    The enforcer's model only holds the rules of the domains recently enforced
+    against. A domain that is not resident is fetched with one filtered query
+    covering its p and g rules and merged into the model. When a limit is
+    exceeded, the least recently used domains are removed from the model again.
+
+    Create the adapter with `filtered=True`, so the enforcer does not load the
+    whole policy when it is created. Rules are only ever loaded per domain, so
+    rules without a domain field are never loaded.
+    """
+
+    def __init__(
+        self,
+        enforcer,
+        domain_fields=None,
+        request_domain_index=1,
+        max_domains=1000,
+        max_rules=None,
+        max_bytes=None,
+    ):
+        """Wrap an enforcer whose adapter supports load_filtered_policy
+
+        Args:
+            enforcer (Enforcer): Enforcer whose model receives the domains. Its current policy is cleared.
+            domain_fields (dict, optional): Index of the domain in the rules of each ptype.
+                          Defaults to {"p": 1, "g": 2}, as in the RBAC with domains model.
+            request_domain_index (int, optional): Position of the domain among the enforce arguments. Defaults to 1.
+            max_domains (int, optional): Maximum number of resident domains. Defaults to 1000.
+            max_rules (int, optional): Maximum number of resident rules. Defaults to no limit.
+            max_bytes (int, optional): Maximum estimated size of the resident rules. Defaults to no limit.
+        """
+        self._enforcer = enforcer
+        self._domain_fields = domain_fields or {"p": 1, "g": 2}
+        self._request_domain_index = request_domain_index
+        self._max_domains = max_domains
+        self._max_rules = max_rules
+        self._max_bytes = max_bytes
+        # domain -> (number of rules, estimated bytes), least recently used first
+        self._domains = OrderedDict()
+        self._rules = 0
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.RLock()
+        enforcer.get_model().clear_policy()
+        enforcer.build_role_links()
+
+    def enforce(self, *rvals):
+        """Load the domain of the request if needed, then enforce it"""
+        with self._lock:
+            self.load_domain(rvals[self._request_domain_index])
+            return self._enforcer.enforce(*rvals)
+
+    def load_domain(self, domain):
+        """Make the rules of a domain resident
+
+        Returns:
+            bool: True if the domain was already resident
+        """
+        with self._lock:
+            if domain in self._domains:
+                self._domains.move_to_end(domain)
+                self.hits += 1
+                return True
+            self.misses += 1
+            rules, size = self._load(domain)
+            self._domains[domain] = (rules, size)
+            self._rules += rules
+            self._bytes += size
+            self._evict()
+            return False
+
+    def evict_domain(self, domain):
+        """Remove the rules of a domain from the model
+
+        Returns:
+            bool: True if the domain was resident
+        """
+        with self._lock:
+            if domain not in self._domains:
+                return False
+            rules, size = self._domains.pop(domain)
+            self._rules -= rules
+            self._bytes -= size
+            self._remove(domain)
+            return True
+
+    def stats(self):
+        """Return the cache counters and the resident totals"""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "domains": len(self._domains),
+                "rules": self._rules,
+                "bytes": self._bytes,
+            }
+
+    def _assertions(self):
+        model = self._enforcer.get_model()
+        for ptype, index in self._domain_fields.items():
+            assertion = model.model.get(ptype[0], {}).get(ptype)
+            if assertion is not None:
+                yield ptype, index, assertion
+
+    def _load(self, domain):
+        assertions = list(self._assertions())
+        before = {ptype: len(assertion.policy) for ptype, _, assertion in assertions}
+        self._enforcer.get_adapter().load_filtered_policy(
+            self._enforcer.get_model(),
+            Filter(
+                any_of=[
+                    Filter(ptype=ptype, **{f"v{index}": domain})
+                    for ptype, index, _ in assertions
+                ]
+            ),
+        )
+
+        rules = size = 0
+        for ptype, _, assertion in assertions:
+            loaded = assertion.policy[before[ptype] :]
+            rules += len(loaded)
+            size += sum(map(_rule_bytes, loaded))
+            self._build_role_links(PolicyOp.Policy_add, ptype, loaded)
+        return rules, size
+
+    def _remove(self, domain):
+        for ptype, index, assertion in self._assertions():
+            kept = []
+            removed = []
+            for rule in assertion.policy:
+                if len(rule) > index and rule[index] == domain:
+                    removed.append(rule)
+                else:
+                    kept.append(rule)
+            if not removed:
+                continue
+            assertion.policy = kept
+            assertion.policy_map = {",".join(rule): i for i, rule in enumerate(kept)}
+            self._build_role_links(PolicyOp.Policy_remove, ptype, removed)
+
+    def _build_role_links(self, op, ptype, rules):
+        if not rules or ptype[0] != "g":
+            return
+        role_manager = self._enforcer.get_named_role_manager(ptype)
+        if role_manager is not None:
+            self._enforcer.get_model().build_incremental_role_links(
+                role_manager, op, "g", ptype, rules
+            )
+
+    def _over_limit(self):
+        return (
+            len(self._domains) > self._max_domains
+            or (self._max_rules is not None and self._rules > self._max_rules)
+            or (self._max_bytes is not None and self._bytes > self._max_bytes)
+        )
+
+    def _evict(self):
+        # the domain just loaded is kept even if it alone exceeds a limit
+        while len(self._domains) > 1 and self._over_limit():
+            domain = next(iter(self._domains))
+            self.evict_domain(domain)
+            self.evictions += 1
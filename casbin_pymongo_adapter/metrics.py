@@ -0,0 +1,238 @@
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from inspect import iscoroutinefunction
+
+import bson
+from pymongo.monitoring import CommandListener
+
+# upper bounds in seconds of the latency histogram buckets
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, float("inf"))
+
+# adapter method the commands sent from the current thread or task belong to
+_current_method = ContextVar("casbin_pymongo_method", default=None)
+
+_READ_BATCHES = ("firstBatch", "nextBatch")
+_WRITE_COMMANDS = frozenset(("insert", "update", "delete"))
+
+
+def instrumented(method):
+    """Record the calls of an adapter method in the adapter's metrics, if any
+
+    Without metrics the wrapper costs one attribute lookup per call.
+    """
+    name = method.__name__
+    if iscoroutinefunction(method):
+
+        @wraps(method)
+        async def wrapper(self, *args, **kwargs):
+            if self._metrics is None:
+                return await method(self, *args, **kwargs)
+            with self._metrics.measure(name):
+                return await method(self, *args, **kwargs)
+
+    else:
+
+        @wraps(method)
+        def wrapper(self, *args, **kwargs):
+            if self._metrics is None:
+                return method(self, *args, **kwargs)
+            with self._metrics.measure(name):
+                return method(self, *args, **kwargs)
+
+    return wrapper
+
+
+class _Stats:
+    __slots__ = (
+        "calls",
+        "errors",
+        "seconds",
+        "histogram",
+        "documents_read",
+        "documents_written",
+        "bytes_sent",
+        "bytes_received",
+    )
+
+    def __init__(self, buckets):
+        self.calls = 0
+        self.errors = 0
+        self.seconds = 0.0
+        self.histogram = [0] * len(buckets)
+        self.documents_read = 0
+        self.documents_written = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+
+    def snapshot(self, buckets):
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "seconds": self.seconds,
+            "histogram": list(zip(buckets, self.histogram)),
+            "documents_read": self.documents_read,
+            "documents_written": self.documents_written,
+            "bytes_sent": self.bytes_sent,
+            "bytes_received": self.bytes_received,
+        }
+
+
+class Metrics:
+    """
+    Counters and latency histograms of the adapter methods and of the commands
+    they send
+
+    Pass the same instance to the adapter as `metrics`. The adapter records the
+    calls of its methods, and `command_listener()` records the round trips of
+    the client: their latency, the BSON bytes sent and received and the
+    documents read and written. Commands are attributed to the adapter method
+    that sent them.
+    """
+
+    def __init__(self, callback=None, buckets=DEFAULT_BUCKETS):
+        """
+        Args:
+            callback (callable, optional): Called after every adapter method as
+                          callback(method, seconds, error), error being the exception raised or None.
+            buckets (tuple[float], optional): Upper bounds in seconds of the latency histogram buckets,
+                          ending with float("inf"). Defaults to DEFAULT_BUCKETS.
+        """
+        self._callback = callback
+        self._buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._methods = {}
+        self._commands = {}
+        self._listener = None
+
+    def command_listener(self):
+        """Return the CommandListener feeding these metrics
+
+        The adapter registers it on the client it creates. Register it yourself
+        on a client passed to the adapter, through its `event_listeners`.
+        """
+        if self._listener is None:
+            self._listener = _MetricsListener(self)
+        return self._listener
+
+    @contextmanager
+    def measure(self, method):
+        """Time a block as a call of an adapter method"""
+        token = _current_method.set(method)
+        error = None
+        start = time.perf_counter()
+        try:
+            yield
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            seconds = time.perf_counter() - start
+            _current_method.reset(token)
+            with self._lock:
+                stats = self._stats(self._methods, method)
+                self._observe(stats, seconds, error is not None)
+            if self._callback is not None:
+                self._callback(method, seconds, error)
+
+    def snapshot(self):
+        """Return a copy of the counters
+
+        Returns:
+            dict: "methods" and "commands", each mapping a name to its calls,
+                  errors, seconds, latency histogram as (upper bound, count) pairs,
+                  documents read and written and bytes sent and received
+        """
+        with self._lock:
+            return {
+                "methods": {
+                    name: stats.snapshot(self._buckets)
+                    for name, stats in self._methods.items()
+                },
+                "commands": {
+                    name: stats.snapshot(self._buckets)
+                    for name, stats in self._commands.items()
+                },
+            }
+
+    def reset(self):
+        """Set every counter back to zero"""
+        with self._lock:
+            self._methods.clear()
+            self._commands.clear()
+
+    def _stats(self, table, name):
+        stats = table.get(name)
+        if stats is None:
+            stats = table[name] = _Stats(self._buckets)
+        return stats
+
+    def _observe(self, stats, seconds, failed):
+        stats.calls += 1
+        stats.seconds += seconds
+        if failed:
+            stats.errors += 1
+        for index, bound in enumerate(self._buckets):
+            if seconds <= bound:
+                stats.histogram[index] += 1
+                break
+
+    def _record_command(self, method, command, seconds, reply, sent, failed):
+        received = len(bson.encode(reply)) if reply else 0
+        read = written = 0
+        if not failed:
+            cursor = reply.get("cursor")
+            if cursor is not None:
+                for batch in _READ_BATCHES:
+                    read += len(cursor.get(batch, ()))
+            elif command in _WRITE_COMMANDS:
+                written = reply.get("n", 0)
+
+        with self._lock:
+            stats = self._stats(self._commands, command)
+            self._observe(stats, seconds, failed)
+            targets = [stats]
+            if method is not None:
+                targets.append(self._stats(self._methods, method))
+            for stats in targets:
+                stats.documents_read += read
+                stats.documents_written += written
+                stats.bytes_sent += sent
+                stats.bytes_received += received
+
+
+class _MetricsListener(CommandListener):
+    """Pair the started and finished events of each command and record them"""
+
+    def __init__(self, metrics):
+        self._metrics = metrics
+        self._pending = {}
+
+    def started(self, event):
+        # the event fires in the thread or task running the command, so the
+        # adapter method it belongs to is still current
+        self._pending[(event.connection_id, event.request_id)] = (
+            _current_method.get(),
+            len(bson.encode(event.command)) if event.command else 0,
+        )
+
+    def succeeded(self, event):
+        self._finish(event, event.reply, False)
+
+    def failed(self, event):
+        self._finish(event, event.failure, True)
+
+    def _finish(self, event, reply, failed):
+        method, sent = self._pending.pop(
+            (event.connection_id, event.request_id), (None, 0)
+        )
+        self._metrics._record_command(
+            method,
+            event.command_name,
+            event.duration_micros / 1e6,
+            reply,
+            sent,
+            failed,
+        )
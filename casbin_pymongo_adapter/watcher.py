@@ -0,0 +1,315 @@
+import os
+import threading
+
+import bson
+from casbin.model.policy_op import PolicyOp
+from pymongo.errors import OperationFailure, PyMongoError
+
+from ._persist import rule_query
+from ._rule import FIELDS, CasbinRule
+from ._util import logger
+
+# ChangeStreamHistoryLost and ChangeStreamFatalError: the resume token is unusable
+UNRESUMABLE_CODES = (260, 280, 286)
+
+# the resume token is persisted when the stream is idle or after this many changes
+SAVE_EVERY = 1000
+
+# first server version accepting fullDocumentBeforeChange
+PRE_IMAGES_VERSION = (6, 0)
+
+# fields holding the rule, in either document layout
+RULE_FIELDS = frozenset(("ptype", "t", "r") + FIELDS)
+
+
+def touches_rule(description):
+    """Whether the updateDescription of an update event changes a rule field
+
+    Updates of other fields only, such as the `key` written by backfill_rule_keys
+    or the `rev` of a revision, leave the rule as it was.
+    """
+    fields = list(description.get("updatedFields", {}))
+    fields.extend(description.get("removedFields", []))
+    return any(field.split(".", 1)[0] in RULE_FIELDS for field in fields)
+
+
+class Watcher:
+    """Watcher that tails the change stream of the policy collection.
+
+    Inserts, deletes and updates written by any process are applied to the local
+    enforcer's model one rule at a time, so no full reload is needed. A full
+    reload only happens when a change cannot be applied incrementally: a delete
+    or update without a pre-image, a dropped or renamed collection, or a resume
+    token that fell out of the oplog. The reload waits until the stream has no
+    more events ready, so a burst of such changes triggers one reload.
+
+    Change streams need a replica set or a sharded cluster. Deletes and updates
+    carry the removed rule only when the collection records pre-images
+    (MongoDB 6.0+, see `enable_pre_images`). The rule is then looked up before it
+    is removed from the model, as the deleted document may be one of several
+    copies of it.
+    """
+
+    def __init__(
+        self,
+        adapter,
+        enforcer=None,
+        resume_token_path=None,
+        max_await_time_ms=1000,
+        retry_interval=1.0,
+        start=True,
+    ):
+        """Create a watcher for the collection of an adapter
+
+        Args:
+            adapter (Adapter): Adapter whose collection is watched.
+            enforcer (Enforcer, optional): Enforcer whose model receives the changes. Without it every change
+                          only calls the update callback, like a classic casbin watcher.
+            resume_token_path (str, optional): File the resume token is persisted to, so a restarted watcher
+                          continues where the previous one stopped.
+            max_await_time_ms (int, optional): How long one poll of the change stream waits for new events. Defaults to 1000.
+            retry_interval (float, optional): Seconds to wait before reopening the stream after an error. Defaults to 1.0.
+            start (bool, optional): Whether to start the background thread right away. Defaults to True.
+        """
+        if adapter._router is not None:
+            raise ValueError("Watcher does not support a TenantRouter collection")
+        self._collection = adapter._collection
+        self._rule_keys = adapter._rule_keys
+        self._compact = adapter._compact
+        self._enforcer = enforcer
+        self._resume_token_path = resume_token_path
+        self._max_await_time_ms = max_await_time_ms
+        self._retry_interval = retry_interval
+        self._callback = None
+        self._resume_token = self._read_resume_token()
+        self._saved_resume_token = self._resume_token
+        self._reload_pending = False
+        # whether the server supports pre-images, asked when the stream first opens
+        self._pre_images = None
+        self._stop = threading.Event()
+        self._thread = None
+        if start:
+            self.start()
+
+    def enable_pre_images(self):
+        """Make the collection record pre-images, so deletes and updates apply incrementally"""
+        self._collection.database.command(
+            "collMod",
+            self._collection.name,
+            changeStreamPreAndPostImages={"enabled": True},
+        )
+
+    def set_update_callback(self, func):
+        """Set the function called when the policy has to be fully reloaded
+
+        Without an enforcer, it is called for every change instead.
+        """
+        self._callback = func
+
+    def update(self):
+        """Nothing to do: writes reach other instances through the change stream"""
+        return True
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="casbin-pymongo-watcher", daemon=True
+        )
+        self._thread.start()
+
+    def close(self):
+        """Stop the background thread and persist the last resume token"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self._write_resume_token()
+
+    @property
+    def resume_token(self):
+        return self._resume_token
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self._watch()
+            except OperationFailure as e:
+                if e.code in UNRESUMABLE_CODES:
+                    logger.warning("watcher: resume token is unusable: %s", e)
+                    self._resume_token = None
+                    self._reload_pending = True
+                    continue
+                logger.error("watcher: change stream failed: %s", e)
+                self._stop.wait(self._retry_interval)
+            except PyMongoError as e:
+                logger.error("watcher: change stream failed: %s", e)
+                self._stop.wait(self._retry_interval)
+
+    def _watch(self):
+        options = {}
+        if self._pre_images is None:
+            version = self._collection.database.client.server_info()["versionArray"]
+            self._pre_images = tuple(version[:2]) >= PRE_IMAGES_VERSION
+        if self._pre_images:
+            # older servers reject the option, their deletes and updates reload
+            options["full_document_before_change"] = "whenAvailable"
+        with self._collection.watch(
+            full_document="updateLookup",
+            resume_after=self._resume_token,
+            max_await_time_ms=self._max_await_time_ms,
+            **options,
+        ) as stream:
+            # the stream is open, so a reload from here on misses no change
+            if self._reload_pending:
+                self._reload_pending = False
+                self._reload()
+            applied = 0
+            while stream.alive and not self._stop.is_set():
+                change = stream.try_next()
+                if change is None or applied >= SAVE_EVERY:
+                    self._write_resume_token()
+                    applied = 0
+                if change is None:
+                    self._resume_token = stream.resume_token
+                    if self._reload_pending:
+                        # the burst of changes needing a reload is over
+                        self._reload_pending = False
+                        self._reload()
+                    continue
+                if change["operationType"] == "invalidate":
+                    # the collection was dropped or renamed over, e.g. by an atomic
+                    # save_policy: start a new stream and reload everything
+                    self._resume_token = None
+                    self._reload_pending = True
+                    return
+                self._apply(change)
+                self._resume_token = stream.resume_token
+                applied += 1
+
+    def _apply(self, change):
+        operation = change["operationType"]
+        if operation not in ("insert", "delete", "update", "replace"):
+            return
+        if operation == "update" and not touches_rule(
+            change.get("updateDescription", {})
+        ):
+            return
+        if self._enforcer is None:
+            self._notify()
+            return
+        if self._reload_pending:
+            # the coming reload reads this change too
+            return
+
+        before = change.get("fullDocumentBeforeChange")
+        after = change.get("fullDocument")
+        if operation == "insert":
+            self._add(after)
+        elif before is None or (operation != "delete" and after is None):
+            self._reload_pending = True
+        elif operation == "delete":
+            self._remove(before)
+        else:
+            self._update(before, after)
+
+    def _rule(self, document):
+        rule = CasbinRule.from_document(document)
+        ptype = rule.ptype
+        model = self._enforcer.get_model()
+        if not ptype or model.model.get(ptype[0], {}).get(ptype) is None:
+            return None, None, None
+        return ptype[0], ptype, list(rule.to_tuple())
+
+    def _add(self, document):
+        sec, ptype, rule = self._rule(document)
+        if sec is None:
+            return
+        model = self._enforcer.get_model()
+        if model.add_policy(sec, ptype, rule) and sec == "g":
+            self._build_role_links(PolicyOp.Policy_add, ptype, rule)
+
+    def _stored(self, document):
+        """Whether the rule of a document is still stored, in another copy
+
+        deduplicate and backfill_rule_keys delete the extra copies of a rule,
+        and the delete event of a copy must not remove the rule from the model.
+        """
+        query = rule_query(
+            CasbinRule.from_document(document), self._rule_keys, self._compact
+        )
+        return self._collection.find_one(query, projection={"_id": 1}) is not None
+
+    def _remove(self, document):
+        sec, ptype, rule = self._rule(document)
+        if sec is None or self._stored(document):
+            return
+        model = self._enforcer.get_model()
+        if model.remove_policy(sec, ptype, rule) and sec == "g":
+            self._build_role_links(PolicyOp.Policy_remove, ptype, rule)
+
+    def _update(self, before, after):
+        sec, ptype, old_rule = self._rule(before)
+        new_sec, new_ptype, new_rule = self._rule(after)
+        if sec is None or (sec, ptype) != (new_sec, new_ptype):
+            self._remove(before)
+            self._add(after)
+            return
+        if self._stored(before):
+            self._add(after)
+            return
+        model = self._enforcer.get_model()
+        if model.update_policy(sec, ptype, old_rule, new_rule) and sec == "g":
+            self._build_role_links(PolicyOp.Policy_remove, ptype, old_rule)
+            self._build_role_links(PolicyOp.Policy_add, ptype, new_rule)
+
+    def _build_role_links(self, op, ptype, rule):
+        role_manager = self._enforcer.get_named_role_manager(ptype)
+        if role_manager is not None:
+            self._enforcer.get_model().build_incremental_role_links(
+                role_manager, op, "g", ptype, [rule]
+            )
+
+    def _reload(self):
+        try:
+            if self._callback is not None:
+                self._callback()
+            elif self._enforcer is not None:
+                self._enforcer.load_policy()
+        except Exception:
+            # keep the thread alive and retry once the stream is idle again
+            logger.exception("watcher: reload failed")
+            self._reload_pending = True
+            self._stop.wait(self._retry_interval)
+
+    def _notify(self):
+        if self._callback is None:
+            return
+        try:
+            self._callback()
+        except Exception:
+            logger.exception("watcher: update callback failed")
+
+    def _read_resume_token(self):
+        if self._resume_token_path is None:
+            return None
+        try:
+            with open(self._resume_token_path, "rb") as f:
+                return bson.decode(f.read())
+        except FileNotFoundError:
+            return None
+
+    def _write_resume_token(self):
+        token = self._resume_token
+        if (
+            self._resume_token_path is None
+            or token is None
+            or token == self._saved_resume_token
+        ):
+            return
+        tmp_path = f"{self._resume_token_path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(bson.encode(token))
+        os.replace(tmp_path, self._resume_token_path)
+        self._saved_resume_token = token
@@ -48,4 +48,7 @@ setup(
         "Operating System :: OS Independent",
     ],
     data_files=[desc_file],
+    entry_points={
+        "console_scripts": ["casbin-pymongo=casbin_pymongo_adapter.cli:main"],
+    },
 )
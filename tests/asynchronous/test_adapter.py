@@ -1,8 +1,14 @@
 from casbin_pymongo_adapter.asynchronous import Adapter
-from casbin_pymongo_adapter import Filter
-from pymongo import AsyncMongoClient
+from casbin_pymongo_adapter._clients import clients
+from casbin_pymongo_adapter import CasbinRule, Filter, Metrics, Prefix, TenantRouter
+from pymongo import AsyncMongoClient, WriteConcern
+from pymongo.read_preferences import Nearest
 from unittest import IsolatedAsyncioTestCase
+import asyncio
 import casbin
+import gc
+import os
+import tempfile
 
 from tests.helper import get_fixture
 
@@ -141,6 +147,68 @@ class TestConfig(IsolatedAsyncioTestCase):
         self.assertTrue(e.enforce("alice", "data2", "write"))
         self.assertFalse(result)
 
+    async def test_load_policy_keeps_commas(self):
+        """
+        test load_policy with values containing commas
+        """
+        adapter = Adapter("mongodb://localhost:27017", "casbin_test", batch_size=2)
+        e = casbin.AsyncEnforcer(get_fixture("rbac_model.conf"), adapter)
+
+        await adapter.add_policy(
+            sec="p", ptype="p", rule=("alice", "data1,data2", "read")
+        )
+        await adapter.add_policy(sec="p", ptype="p", rule=("bob", "data2", "write"))
+        await adapter.add_policy(sec="g", ptype="g", rule=("alice", "data2_admin"))
+        await e.load_policy()
+
+        self.assertEqual(
+            e.get_policy(),
+            [["alice", "data1,data2", "read"], ["bob", "data2", "write"]],
+        )
+        self.assertEqual(e.get_grouping_policy(), [["alice", "data2_admin"]])
+        self.assertTrue(e.enforce("alice", "data1,data2", "read"))
+        self.assertFalse(e.enforce("alice", "data1", "read"))
+
+    async def test_add_policies(self):
+        """
+        test add_policies
+        """
+        adapter = Adapter("mongodb://localhost:27017", "casbin_test", chunk_size=2)
+        e = casbin.AsyncEnforcer(get_fixture("rbac_model.conf"), adapter)
+
+        rules = [("alice", f"data{i}", "read") for i in range(5)]
+        self.assertTrue(await adapter.add_policies(sec="p", ptype="p", rules=rules))
+        await e.load_policy()
+
+        for i in range(5):
+            self.assertTrue(e.enforce("alice", f"data{i}", "read"))
+        self.assertFalse(e.enforce("alice", "data5", "read"))
+
+    async def test_remove_policies(self):
+        """
+        test remove_policies
+        """
+        adapter = Adapter("mongodb://localhost:27017", "casbin_test", chunk_size=2)
+        e = casbin.AsyncEnforcer(get_fixture("rbac_model.conf"), adapter)
+
+        rules = [("alice", f"data{i}", "read") for i in range(5)]
+        await adapter.add_policies(sec="p", ptype="p", rules=rules)
+
+        # incomplete rules do not remove longer ones
+        result = await adapter.remove_policies(
+            sec="p", ptype="p", rules=[("alice", "data0"), ("alice", "data1")]
+        )
+        self.assertFalse(result)
+
+        result = await adapter.remove_policies(sec="p", ptype="p", rules=rules[:3])
+        self.assertTrue(result)
+        await e.load_policy()
+
+        self.assertFalse(e.enforce("alice", "data0", "read"))
+        self.assertFalse(e.enforce("alice", "data2", "read"))
+        self.assertTrue(e.enforce("alice", "data3", "read"))
+        self.assertTrue(e.enforce("alice", "data4", "read"))
+
     async def test_save_policy(self):
         """
         test save_policy
@@ -159,6 +227,288 @@ class TestConfig(IsolatedAsyncioTestCase):
 
         self.assertTrue(e.enforce("alice", "data4", "read"))
 
+    async def test_save_policy_atomic(self):
+        """
+        test save_policy with atomic_save
+        """
+        e = await get_enforcer()
+        client = AsyncMongoClient("mongodb://localhost:27017")
+        await client["casbin_test"]["casbin_rule"].create_index(
+            [("v0", 1)], name="by_v0"
+        )
+
+        adapter = Adapter("mongodb://localhost:27017", "casbin_test", atomic_save=True)
+        model = e.get_model()
+        model.clear_policy()
+        model.add_policy("p", "p", ["alice", "data4", "read"])
+        model.add_policy("g", "g", ["bob", "data2_admin"])
+        self.assertTrue(await adapter.save_policy(model))
+
+        e = casbin.AsyncEnforcer(get_fixture("rbac_model.conf"), adapter)
+        await e.load_policy()
+        self.assertTrue(e.enforce("alice", "data4", "read"))
+        self.assertFalse(e.enforce("alice", "data1", "read"))
+        self.assertEqual(e.get_grouping_policy(), [["bob", "data2_admin"]])
+
+        db = client["casbin_test"]
+        self.assertEqual(await db["casbin_rule"].count_documents({}), 2)
+        self.assertIn("by_v0", await db["casbin_rule"].index_information())
+        self.assertEqual(await db.list_collection_names(), ["casbin_rule"])
+
+    async def test_ensure_indexes(self):
+        """
+        test ensure_indexes
+        """
+        adapter = Adapter(
+            "mongodb://localhost:27017",
+            "casbin_test",
+            create_indexes=True,
+            secondary_indexes=["v1", ("v2", "v0")],
+        )
+        e = casbin.AsyncEnforcer(get_fixture("rbac_model.conf"), adapter)
+        await e.load_policy()
+
+        indexes = await AsyncMongoClient("mongodb://localhost:27017")["casbin_test"][
+            "casbin_rule"
+        ].index_information()
+        names = ["ptype_1_v0_1_v1_1_v2_1_v3_1_v4_1_v5_1", "v1_1", "v2_1_v0_1"]
+        for name in names:
+            self.assertIn(name, indexes)
+        self.assertEqual(await adapter.ensure_indexes(), names)
+
+    async def test_ensure_indexes_on_filtered_load(self):
+        adapter = Adapter(
+            "mongodb://localhost:27017",
+            "casbin_test",
+            filtered=True,
+            create_indexes=True,
+            secondary_indexes=["v1"],
+        )
+        e = casbin.AsyncEnforcer(get_fixture("rbac_model.conf"), adapter)
+        filter = Filter()
+        filter.ptype = ["p"]
+        await e.load_filtered_policy(filter)
+
+        indexes = await AsyncMongoClient("mongodb://localhost:27017")["casbin_test"][
+            "casbin_rule"
+        ].index_information()
+        self.assertIn("ptype_1_v0_1_v1_1_v2_1_v3_1_v4_1_v5_1", indexes)
+        self.assertIn("v1_1", indexes)
+
+    async def test_load_policy_since(self):
+        """
+        test load_policy_since
+        """
+        adapter = Adapter(
+            "mongodb://localhost:27017", "casbin_test", track_revisions=True
+        )
+        await adapter.add_policies(
+            "p", "p", [["alice", "data1", "read"], ["bob", "data2", "write"]]
+        )
+        await adapter.add_policy("g", "g", ["carol", "data2_admin"])
+        checkpoint = await adapter.current_revision()
+        e = casbin.AsyncEnforcer(get_fixture("rbac_model.conf"), adapter)
+        await e.load_policy()
+
+        writer = Adapter(
+            "mongodb://localhost:27017", "casbin_test", track_revisions=True
+        )
+        await writer.add_policy("p", "p", ["data2_admin", "data2", "read"])
+        await writer.remove_policy("p", "p", ["alice", "data1", "read"])
+        await writer.update_policy(
+            "p", "p", ["bob", "data2", "write"], ["bob", "data3", "write"]
+        )
+        await writer.remove_filtered_policy("g", "g", 0, "carol")
+        await writer.add_policy("g", "g", ["dave", "data2_admin"])
+
+        checkpoint = await adapter.load_policy_since(e.get_model(), checkpoint)
+        e.build_role_links()
+        self.assertEqual(checkpoint, await adapter.current_revision())
+        self.assertFalse(e.enforce("alice", "data1", "read"))
+        self.assertFalse(e.enforce("bob", "data2", "write"))
+        self.assertTrue(e.enforce("bob", "data3", "write"))
+        self.assertFalse(e.enforce("carol", "data2", "read"))
+        self.assertTrue(e.enforce("dave", "data2", "read"))
+
+        # nothing changed since
+        self.assertEqual(
+            await adapter.load_policy_since(e.get_model(), checkpoint), checkpoint
+        )
+
+        # an atomic save replaces the collection, older checkpoints fully reload
+        model = e.get_model()
+        model.clear_policy()
+        model.add_policy("p", "p", ["erin", "data4", "read"])
+        await Adapter(
+            "mongodb://localhost:27017",
+            "casbin_test",
+            atomic_save=True,
+            track_revisions=True,
+        ).save_policy(model)
+        model.clear_policy()
+        model.add_policy("p", "p", ["bob", "data3", "write"])
+        await adapter.load_policy_since(model, checkpoint)
+        e.build_role_links()
+        self.assertEqual(e.get_policy(), [["erin", "data4", "read"]])
+
+    async def test_reserved_revision(self):
+        """
+        test a write landing after a checkpoint above its reserved revision
+        """
+        adapter = Adapter(
+            "mongodb://localhost:27017", "casbin_test", track_revisions=True
+        )
+        await adapter.add_policy("p", "p", ["alice", "data1", "read"])
+        e = casbin.AsyncEnforcer(get_fixture("rbac_model.conf"), adapter)
+        await e.load_policy()
+        checkpoint = await adapter.current_revision()
+
+        writer = Adapter(
+            "mongodb://localhost:27017", "casbin_test", track_revisions=True
+        )
+        # writer B reserves a revision, writer C commits the next one
+        reserved = await writer._stamp_revisions(
+            [CasbinRule("p", "bob", "data2", "write").dict()]
+        )
+        await writer.add_policy("p", "p", ["carol", "data3", "read"])
+        checkpoint = await adapter.load_policy_since(e.get_model(), checkpoint)
+
+        # then B lands below the checkpoint
+        await writer._collection.insert_many(reserved)
+        self.assertEqual(
+            await adapter.load_policy_since(e.get_model(), checkpoint), checkpoint
+        )
+        self.assertTrue(e.enforce("bob", "data2", "write"))
+        self.assertTrue(e.enforce("carol", "data3", "read"))
+
+        await adapter.remove_policies("p", "p", [["dave", "data4", "read"]])
+        self.assertEqual(await adapter.current_revision(), checkpoint)
+
+    async def test_snapshot(self):
+        """
+        test load_policy with snapshot_path
+        """
+        await get_enforcer()
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "policy.snapshot")
+            adapter = Adapter(
+                "mongodb://localhost:27017",
+                "casbin_test",
+                track_revisions=True,
+                snapshot_path=path,
+            )
+            e = casbin.AsyncEnforcer(get_fixture("rbac_model.conf"), adapter)
+            await e.load_policy()
+            self.assertTrue(os.path.exists(path))
+            policy = e.get_policy()
+
+            # unversioned writes are not seen while the revision is unchanged
+            client = AsyncMongoClient("mongodb://localhost:27017")
+            await client.casbin_test.casbin_rule.insert_one(
+                {"ptype": "p", "v0": "erin", "v1": "data1", "v2": "read"}
+            )
+            await e.load_policy()
+            self.assertEqual(e.get_policy(), policy)
+
+            await adapter.add_policy("p", "p", ["frank", "data3", "read"])
+            await e.load_policy()
+            self.assertIn(["erin", "data1", "read"], e.get_policy())
+            self.assertIn(["frank", "data3", "read"], e.get_policy())
+
+    async def test_rule_keys(self):
+        adapter = Adapter(
+            "mongodb://localhost:27017",
+            "casbin_test",
+            create_indexes=True,
+            rule_keys=True,
+        )
+        client = AsyncMongoClient("mongodb://localhost:27017")
+        collection = client.casbin_test.casbin_rule
+
+        await adapter.add_policy("p", "p", ["alice", "data1", "read"])
+        await adapter.add_policy("p", "p", ["alice", "data1", "read"])
+        await adapter.add_policies(
+            "p", "p", [["alice", "data1", "read"], ["alice", "data1", "write"]]
+        )
+        self.assertEqual(await collection.count_documents({}), 2)
+
+        self.assertTrue(await adapter.has_policy("p", "p", ["alice", "data1", "read"]))
+        self.assertFalse(await adapter.has_policy("p", "p", ["alice", "data1"]))
+
+        self.assertTrue(
+            await adapter.update_policy(
+                "p", "p", ["alice", "data1", "read"], ["alice", "data2", "read"]
+            )
+        )
+        self.assertTrue(
+            await adapter.remove_policy("p", "p", ["alice", "data2", "read"])
+        )
+        self.assertEqual(await collection.count_documents({}), 1)
+
+    async def test_rule_keys_index(self):
+        db = AsyncMongoClient("mongodb://localhost:27017").casbin_test
+        adapter = Adapter("mongodb://localhost:27017", "casbin_test", rule_keys=True)
+        await adapter.add_policy("p", "p", ["alice", "data1", "read"])
+        self.assertIn("key_1", await db.casbin_rule.index_information())
+
+        adapter = Adapter(
+            "mongodb://localhost:27017",
+            "casbin_test",
+            rule_keys=True,
+            atomic_save=True,
+        )
+        model = (await get_enforcer()).get_model()
+        model.clear_policy()
+        model.add_policies("p", "p", [[f"user{i}", "data1", "read"] for i in range(50)])
+        self.assertTrue(await adapter.save_policy(model))
+        self.assertEqual(await db.casbin_rule.count_documents({}), 50)
+        self.assertIn("key_1", await db.casbin_rule.index_information())
+        self.assertEqual(await db.list_collection_names(), ["casbin_rule"])
+
+    async def test_load_policy_partitioned(self):
+        adapter = Adapter("mongodb://localhost:27017", "casbin_test")
+        await adapter.add_policies(
+            "p", "p", [[f"user{i}", f"data{i % 7}", "read"] for i in range(500)]
+        )
+        await adapter.add_policies(
+            "g", "g", [[f"user{i}", f"role{i % 3}"] for i in range(100)]
+        )
+        e = casbin.AsyncEnforcer(get_fixture("rbac_model.conf"), adapter)
+        await e.load_policy()
+
+        partitioned = casbin.AsyncEnforcer(
+            get_fixture("rbac_model.conf"),
+            Adapter("mongodb://localhost:27017", "casbin_test", parallelism=4),
+        )
+        await partitioned.load_policy()
+        self.assertEqual(partitioned.get_policy(), e.get_policy())
+        self.assertEqual(partitioned.get_grouping_policy(), e.get_grouping_policy())
+
+    async def test_filtered_policy_prefix_and_groups(self):
+        adapter = Adapter("mongodb://localhost:27017", "casbin_test")
+        e = casbin.AsyncEnforcer(get_fixture("rbac_model.conf"), adapter)
+        await e.add_policies(
+            [["tenant1/alice", "data1", "read"], ["tenant2/carol", "data1", "read"]]
+        )
+        await e.add_grouping_policies(
+            [["tenant1/alice", "tenant1/admin"], ["tenant2/carol", "tenant2/admin"]]
+        )
+
+        await e.load_filtered_policy(Filter(v0=Prefix("tenant1/")))
+        self.assertEqual(e.get_policy(), [["tenant1/alice", "data1", "read"]])
+        self.assertEqual(e.get_grouping_policy(), [["tenant1/alice", "tenant1/admin"]])
+
+        await e.load_filtered_policy(
+            Filter(
+                any_of=[
+                    Filter(ptype="p", v0=Prefix("tenant2/")),
+                    Filter(ptype="g", v1="tenant1/admin"),
+                ]
+            )
+        )
+        self.assertEqual(e.get_policy(), [["tenant2/carol", "data1", "read"]])
+        self.assertEqual(e.get_grouping_policy(), [["tenant1/alice", "tenant1/admin"]])
+
     async def test_remove_filtered_policy(self):
         """
         test remove_filtered_policy
@@ -397,3 +747,210 @@ class TestConfig(IsolatedAsyncioTestCase):
 
         self.assertFalse(e.enforce("data2_admin", "data2", "write"))
         self.assertTrue(e.enforce("data2_admin", "data_test", "write"))
+
+    async def test_update_policies_scoped_by_ptype(self):
+        e = await get_enforcer()
+        adapter = e.get_adapter()
+        await adapter.add_policy("g", "g", ["bob", "data2", "write"])
+
+        self.assertTrue(
+            await adapter.update_policies(
+                "p",
+                "p",
+                [["bob", "data2", "write"], ["alice", "data1", "read"]],
+                [["bob", "data3", "write"], ["alice", "data1"]],
+            )
+        )
+        await e.load_policy()
+        self.assertIn(["bob", "data3", "write"], e.get_policy())
+        self.assertIn(["alice", "data1"], e.get_policy())
+        self.assertNotIn(["alice", "data1", "read"], e.get_policy())
+        self.assertIn(["bob", "data2", "write"], e.get_grouping_policy())
+
+        with self.assertLogs("casbin_pymongo_adapter", "WARNING"):
+            self.assertFalse(
+                await adapter.update_policies(
+                    "p",
+                    "p",
+                    [["nobody", "data1", "read"]],
+                    [["nobody", "data2", "read"]],
+                )
+            )
+
+    async def test_update_filtered_policies(self):
+        e = await get_enforcer()
+        self.assertTrue(
+            await e.update_filtered_policies(
+                [["data2_admin", "data3", "read"], ["data2_admin", "data3", "write"]],
+                0,
+                "data2_admin",
+            )
+        )
+        await e.load_policy()
+        self.assertFalse(e.enforce("alice", "data2", "read"))
+        self.assertTrue(e.enforce("alice", "data3", "read"))
+        self.assertTrue(e.enforce("alice", "data3", "write"))
+
+    async def test_tenant_collections(self):
+        adapter = Adapter(
+            "mongodb://localhost:27017",
+            "casbin_test",
+            collection=TenantRouter(),
+            track_revisions=True,
+        )
+        e = casbin.AsyncEnforcer(get_fixture("rbac_with_domains_model.conf"), adapter)
+        await e.add_policies(
+            [
+                ["admin", "tenant1", "data1", "read"],
+                ["admin", "tenant2", "data2", "read"],
+            ]
+        )
+        await e.add_grouping_policies(
+            [["alice", "admin", "tenant1"], ["bob", "admin", "tenant2"]]
+        )
+        db = AsyncMongoClient("mongodb://localhost:27017")["casbin_test"]
+        self.assertEqual(await db["casbin_rule__tenant1"].count_documents({}), 2)
+        self.assertEqual(await db["casbin_rule"].count_documents({}), 0)
+
+        await e.load_filtered_policy(
+            Filter(
+                any_of=[
+                    Filter(ptype="p", v1="tenant2"),
+                    Filter(ptype="g", v2="tenant2"),
+                ]
+            )
+        )
+        self.assertEqual(e.get_policy(), [["admin", "tenant2", "data2", "read"]])
+
+        self.assertTrue(
+            await adapter.update_policy(
+                "p",
+                "p",
+                ["admin", "tenant1", "data1", "read"],
+                ["admin", "tenant3", "data1", "read"],
+            )
+        )
+        self.assertEqual(await db["casbin_rule__tenant3"].count_documents({}), 1)
+
+        await adapter.drop_tenant("tenant2")
+        self.assertNotIn("casbin_rule__tenant2", await db.list_collection_names())
+        await e.load_policy()
+        self.assertEqual(e.get_policy(), [["admin", "tenant3", "data1", "read"]])
+        self.assertEqual(e.get_grouping_policy(), [["alice", "admin", "tenant1"]])
+
+    async def test_metrics(self):
+        metrics = Metrics()
+        adapter = Adapter("mongodb://localhost:27017", "casbin_test", metrics=metrics)
+        e = casbin.AsyncEnforcer(get_fixture("rbac_model.conf"), adapter)
+        await e.add_policy("alice", "data1", "read")
+        await e.load_policy()
+        await e.update_policy(["alice", "data1", "read"], ["alice", "data1", "write"])
+
+        methods = metrics.snapshot()["methods"]
+        self.assertEqual(methods["add_policy"]["calls"], 1)
+        self.assertEqual(methods["load_policy"]["calls"], 1)
+        self.assertEqual(methods["update_policy"]["calls"], 1)
+        self.assertNotIn("update_policies", methods)
+
+    async def test_compact_schema(self):
+        adapter = Adapter("mongodb://localhost:27017", "casbin_test", compact=True)
+        e = casbin.AsyncEnforcer(get_fixture("rbac_model.conf"), adapter)
+        await e.add_policies([["alice", "data1", "read"], ["bob", "data2", "write"]])
+        await e.add_grouping_policy("alice", "admin")
+        collection = AsyncMongoClient(
+            "mongodb://localhost:27017"
+        ).casbin_test.casbin_rule
+        self.assertEqual(
+            await collection.find_one({"t": "g"}, projection={"_id": 0}),
+            {"t": "g", "r": ["alice", "admin"]},
+        )
+
+        await e.update_policy(["bob", "data2", "write"], ["bob", "data2", "read"])
+        await e.remove_policy("alice", "data1", "read")
+        await e.load_policy()
+        self.assertEqual(e.get_policy(), [["bob", "data2", "read"]])
+        self.assertEqual(e.get_grouping_policy(), [["alice", "admin"]])
+
+        await e.load_filtered_policy(Filter(ptype="g", v1="admin"))
+        self.assertEqual(e.get_grouping_policy(), [["alice", "admin"]])
+
+    async def test_load_policy_pause_gc(self):
+        collection = AsyncMongoClient(
+            "mongodb://localhost:27017"
+        ).casbin_test.casbin_rule
+        await collection.insert_many(
+            [
+                {"ptype": "p", "v0": "alice", "v1": "data1", "v2": "read"},
+                {"t": "p", "r": ["bob", "data2", "write"]},
+                {"ptype": "q", "v0": "unknown"},
+            ]
+        )
+        adapter = Adapter(
+            "mongodb://localhost:27017", "casbin_test", compact=True, pause_gc=True
+        )
+        e = casbin.AsyncEnforcer(get_fixture("rbac_model.conf"), adapter)
+        await e.load_policy()
+        self.assertTrue(gc.isenabled())
+        self.assertEqual(
+            e.get_policy(), [["alice", "data1", "read"], ["bob", "data2", "write"]]
+        )
+
+    async def test_write_buffer(self):
+        failures = []
+        adapter = Adapter(
+            "mongodb://localhost:27017",
+            "casbin_test",
+            buffer_size=2,
+            flush_interval=60,
+            on_flush_error=lambda error, writes: failures.append(writes),
+        )
+        e = casbin.AsyncEnforcer(get_fixture("rbac_model.conf"), adapter)
+        collection = AsyncMongoClient(
+            "mongodb://localhost:27017"
+        ).casbin_test.casbin_rule
+        await e.add_policy("alice", "data1", "read")
+        self.assertEqual(await collection.count_documents({}), 0)
+        await e.add_policy("bob", "data2", "write")
+        # the second write reached the size, the background task sends both
+        await asyncio.sleep(0.1)
+        self.assertEqual(await collection.count_documents({}), 2)
+
+        await e.remove_policy("alice", "data1", "read")
+        await e.add_policy("carol", "data3", "read")
+        await e.remove_policy("carol", "data3", "read")
+        await e.load_policy()
+        self.assertEqual(e.get_policy(), [["bob", "data2", "write"]])
+        self.assertEqual(failures, [])
+
+    async def test_read_preference_and_write_concerns(self):
+        adapter = Adapter(
+            "mongodb://localhost:27017",
+            "casbin_test",
+            read_preference=Nearest(max_staleness=120),
+            write_concerns={"save_policy": WriteConcern(w=1, j=False)},
+        )
+        self.assertEqual(
+            adapter._load_collection(adapter._collection).read_preference,
+            Nearest(max_staleness=120),
+        )
+        e = casbin.AsyncEnforcer(get_fixture("rbac_model.conf"), adapter)
+        await e.load_policy()
+        e.get_model().add_policy("p", "p", ["alice", "data1", "read"])
+        await e.save_policy()
+        await e.load_policy()
+        self.assertEqual(e.get_policy(), [["alice", "data1", "read"]])
+
+    async def test_shared_client(self):
+        adapter = Adapter("mongodb://localhost:27017", "casbin_test", max_pool_size=7)
+        other = Adapter("mongodb://localhost:27017", "casbin_test", max_pool_size=7)
+        self.assertIsNone(adapter._handles)
+
+        await adapter.add_policy("p", "p", ["alice", "data1", "read"])
+        self.assertTrue(await other.has_policy("p", "p", ["alice", "data1", "read"]))
+        client = adapter._collection.database.client
+        self.assertIs(other._collection.database.client, client)
+        self.assertEqual(clients.references(client), 2)
+
+        await adapter.close()
+        await other.close()
+        self.assertEqual(clients.references(client), 0)
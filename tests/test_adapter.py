@@ -1,8 +1,17 @@
+from casbin_pymongo_adapter._clients import clients
+from casbin_pymongo_adapter._partition import partition_queries
 from casbin_pymongo_adapter._rule import CasbinRule
-from casbin_pymongo_adapter import Filter, Adapter
-from pymongo import MongoClient
+from casbin_pymongo_adapter._util import in_causal_session
+from casbin_pymongo_adapter import Filter, Adapter, Prefix, Range, TenantRouter
+from casbin_pymongo_adapter.cli import main
+from pymongo import MongoClient, WriteConcern
+from pymongo.read_preferences import SecondaryPreferred
 from unittest import TestCase
 import casbin
+import gc
+import os
+import tempfile
+import time
 
 from tests.helper import get_fixture
 
@@ -149,6 +158,66 @@ class TestConfig(TestCase):
         self.assertTrue(e.enforce("alice", "data2", "write"))
         self.assertFalse(result)
 
+    def test_load_policy_keeps_commas(self):
+        """
+        test load_policy with values containing commas
+        """
+        adapter = Adapter("mongodb://localhost:27017", "casbin_test", batch_size=2)
+        e = casbin.Enforcer(get_fixture("rbac_model.conf"), adapter)
+
+        adapter.add_policy(sec="p", ptype="p", rule=("alice", "data1,data2", "read"))
+        adapter.add_policy(sec="p", ptype="p", rule=("bob", "data2", "write"))
+        adapter.add_policy(sec="g", ptype="g", rule=("alice", "data2_admin"))
+        e.load_policy()
+
+        self.assertEqual(
+            e.get_policy(),
+            [["alice", "data1,data2", "read"], ["bob", "data2", "write"]],
+        )
+        self.assertEqual(e.get_grouping_policy(), [["alice", "data2_admin"]])
+        self.assertTrue(e.enforce("alice", "data1,data2", "read"))
+        self.assertFalse(e.enforce("alice", "data1", "read"))
+
+    def test_add_policies(self):
+        """
+        test add_policies
+        """
+        adapter = Adapter("mongodb://localhost:27017", "casbin_test", chunk_size=2)
+        e = casbin.Enforcer(get_fixture("rbac_model.conf"), adapter)
+
+        rules = [("alice", f"data{i}", "read") for i in range(5)]
+        self.assertTrue(adapter.add_policies(sec="p", ptype="p", rules=rules))
+        e.load_policy()
+
+        for i in range(5):
+            self.assertTrue(e.enforce("alice", f"data{i}", "read"))
+        self.assertFalse(e.enforce("alice", "data5", "read"))
+
+    def test_remove_policies(self):
+        """
+        test remove_policies
+        """
+        adapter = Adapter("mongodb://localhost:27017", "casbin_test", chunk_size=2)
+        e = casbin.Enforcer(get_fixture("rbac_model.conf"), adapter)
+
+        rules = [("alice", f"data{i}", "read") for i in range(5)]
+        adapter.add_policies(sec="p", ptype="p", rules=rules)
+
+        # incomplete rules do not remove longer ones
+        result = adapter.remove_policies(
+            sec="p", ptype="p", rules=[("alice", "data0"), ("alice", "data1")]
+        )
+        self.assertFalse(result)
+
+        result = adapter.remove_policies(sec="p", ptype="p", rules=rules[:3])
+        self.assertTrue(result)
+        e.load_policy()
+
+        self.assertFalse(e.enforce("alice", "data0", "read"))
+        self.assertFalse(e.enforce("alice", "data2", "read"))
+        self.assertTrue(e.enforce("alice", "data3", "read"))
+        self.assertTrue(e.enforce("alice", "data4", "read"))
+
     def test_save_policy(self):
         """
         test save_policy
@@ -167,6 +236,718 @@ class TestConfig(TestCase):
 
         self.assertTrue(e.enforce("alice", "data4", "read"))
 
+    def test_save_policy_atomic(self):
+        """
+        test save_policy with atomic_save
+        """
+        e = get_enforcer()
+        client = MongoClient("mongodb://localhost:27017")
+        client["casbin_test"]["casbin_rule"].create_index([("v0", 1)], name="by_v0")
+
+        adapter = Adapter("mongodb://localhost:27017", "casbin_test", atomic_save=True)
+        model = e.get_model()
+        model.clear_policy()
+        model.add_policy("p", "p", ["alice", "data4", "read"])
+        model.add_policy("g", "g", ["bob", "data2_admin"])
+        self.assertTrue(adapter.save_policy(model))
+
+        e = casbin.Enforcer(get_fixture("rbac_model.conf"), adapter)
+        self.assertTrue(e.enforce("alice", "data4", "read"))
+        self.assertFalse(e.enforce("alice", "data1", "read"))
+        self.assertEqual(e.get_grouping_policy(), [["bob", "data2_admin"]])
+
+        db = client["casbin_test"]
+        self.assertEqual(db["casbin_rule"].count_documents({}), 2)
+        self.assertIn("by_v0", db["casbin_rule"].index_information())
+        self.assertEqual(db.list_collection_names(), ["casbin_rule"])
+
+    def test_ensure_indexes(self):
+        """
+        test ensure_indexes
+        """
+        adapter = Adapter(
+            "mongodb://localhost:27017",
+            "casbin_test",
+            create_indexes=True,
+            secondary_indexes=["v1", ("v2", "v0")],
+        )
+        names = adapter.ensure_indexes()
+        self.assertEqual(
+            names,
+            ["ptype_1_v0_1_v1_1_v2_1_v3_1_v4_1_v5_1", "v1_1", "v2_1_v0_1"],
+        )
+
+        indexes = MongoClient("mongodb://localhost:27017")["casbin_test"][
+            "casbin_rule"
+        ].index_information()
+        for name in names:
+            self.assertIn(name, indexes)
+
+    def test_load_policy_since(self):
+        """
+        test load_policy_since
+        """
+        adapter = Adapter(
+            "mongodb://localhost:27017", "casbin_test", track_revisions=True
+        )
+        adapter.add_policies(
+            "p", "p", [["alice", "data1", "read"], ["bob", "data2", "write"]]
+        )
+        adapter.add_policy("g", "g", ["carol", "data2_admin"])
+        checkpoint = adapter.current_revision()
+        e = casbin.Enforcer(get_fixture("rbac_model.conf"), adapter)
+
+        writer = Adapter(
+            "mongodb://localhost:27017", "casbin_test", track_revisions=True
+        )
+        writer.add_policy("p", "p", ["data2_admin", "data2", "read"])
+        writer.remove_policy("p", "p", ["alice", "data1", "read"])
+        writer.update_policy(
+            "p", "p", ["bob", "data2", "write"], ["bob", "data3", "write"]
+        )
+        writer.remove_filtered_policy("g", "g", 0, "carol")
+        writer.add_policy("g", "g", ["dave", "data2_admin"])
+
+        checkpoint = adapter.load_policy_since(e.get_model(), checkpoint)
+        e.build_role_links()
+        self.assertEqual(checkpoint, adapter.current_revision())
+        self.assertFalse(e.enforce("alice", "data1", "read"))
+        self.assertFalse(e.enforce("bob", "data2", "write"))
+        self.assertTrue(e.enforce("bob", "data3", "write"))
+        self.assertFalse(e.enforce("carol", "data2", "read"))
+        self.assertTrue(e.enforce("dave", "data2", "read"))
+
+        # nothing changed since
+        self.assertEqual(
+            adapter.load_policy_since(e.get_model(), checkpoint), checkpoint
+        )
+
+        # an atomic save replaces the collection, older checkpoints fully reload
+        model = e.get_model()
+        model.clear_policy()
+        model.add_policy("p", "p", ["erin", "data4", "read"])
+        Adapter(
+            "mongodb://localhost:27017",
+            "casbin_test",
+            atomic_save=True,
+            track_revisions=True,
+        ).save_policy(model)
+        model.clear_policy()
+        model.add_policy("p", "p", ["bob", "data3", "write"])
+        adapter.load_policy_since(model, checkpoint)
+        e.build_role_links()
+        self.assertEqual(e.get_policy(), [["erin", "data4", "read"]])
+
+    def test_load_policy_since_large_model(self):
+        """
+        test re-reading the grace window into a large model
+        """
+        adapter = Adapter(
+            "mongodb://localhost:27017", "casbin_test", track_revisions=True
+        )
+        rules = [[f"user{i}", f"data{i}", "read"] for i in range(2000)]
+        adapter.add_policies("p", "p", rules)
+        e = casbin.Enforcer(get_fixture("rbac_model.conf"), adapter)
+        model = e.get_model()
+        # appended directly, casbin's add_policy scans the whole policy
+        model.model["p"]["p"].policy.extend(
+            [f"other{i}", "data", "read"] for i in range(200000)
+        )
+        removed = []
+        remove_policy = model.remove_policy
+        model.remove_policy = lambda *args: removed.append(args) or remove_policy(*args)
+
+        checkpoint = adapter.current_revision()
+        adapter.remove_policy("p", "p", ["user0", "data0", "read"])
+        start = time.perf_counter()
+        checkpoint = adapter.load_policy_since(model, checkpoint)
+        checkpoint = adapter.load_policy_since(model, checkpoint)
+        self.assertLess(time.perf_counter() - start, 5)
+        self.assertEqual(removed, [("p", "p", ["user0", "data0", "read"])])
+        self.assertEqual(len(model.model["p"]["p"].policy), 201999)
+
+    def test_update_policies_tombstones(self):
+        """
+        test tombstoning only the old rules of the updates that matched
+        """
+        adapter = Adapter(
+            "mongodb://localhost:27017",
+            "casbin_test",
+            rule_keys=True,
+            create_indexes=True,
+            track_revisions=True,
+        )
+        adapter.add_policies(
+            "p",
+            "p",
+            [
+                ["alice", "data1", "read"],
+                ["bob", "data2", "write"],
+                ["carol", "data3", "read"],
+            ],
+        )
+        e = casbin.Enforcer(get_fixture("rbac_model.conf"), adapter)
+        checkpoint = adapter.current_revision()
+
+        # the second update collides with a stored rule and stops the third
+        self.assertFalse(
+            adapter.update_policies(
+                "p",
+                "p",
+                [
+                    ["carol", "data3", "read"],
+                    ["alice", "data1", "read"],
+                    ["bob", "data2", "write"],
+                ],
+                [
+                    ["carol", "data3", "write"],
+                    ["bob", "data2", "write"],
+                    ["bob", "data2", "read"],
+                ],
+            )
+        )
+        adapter.load_policy_since(e.get_model(), checkpoint)
+        self.assertTrue(e.enforce("carol", "data3", "write"))
+        self.assertFalse(e.enforce("carol", "data3", "read"))
+        self.assertTrue(e.enforce("alice", "data1", "read"))
+        self.assertTrue(e.enforce("bob", "data2", "write"))
+        tombstones = MongoClient("mongodb://localhost:27017").casbin_test[
+            "casbin_rule_tombstones"
+        ]
+        self.assertEqual(tombstones.count_documents({}), 1)
+
+    def test_reserved_revision(self):
+        """
+        test a write landing after a checkpoint above its reserved revision
+        """
+        adapter = Adapter(
+            "mongodb://localhost:27017", "casbin_test", track_revisions=True
+        )
+        adapter.add_policy("p", "p", ["alice", "data1", "read"])
+        e = casbin.Enforcer(get_fixture("rbac_model.conf"), adapter)
+        checkpoint = adapter.current_revision()
+
+        writer = Adapter(
+            "mongodb://localhost:27017", "casbin_test", track_revisions=True
+        )
+        # writer B reserves a revision, writer C commits the next one
+        reserved = writer._stamp_revisions(
+            [CasbinRule("p", "bob", "data2", "write").dict()]
+        )
+        writer.add_policy("p", "p", ["carol", "data3", "read"])
+        checkpoint = adapter.load_policy_since(e.get_model(), checkpoint)
+        self.assertEqual(checkpoint, reserved[0]["rev"] + 1)
+
+        # then B lands below the checkpoint
+        writer._collection.insert_many(reserved)
+        self.assertEqual(
+            adapter.load_policy_since(e.get_model(), checkpoint), checkpoint
+        )
+        self.assertTrue(e.enforce("bob", "data2", "write"))
+        self.assertTrue(e.enforce("carol", "data3", "read"))
+
+        # removing rules that are not stored leaves the revision alone
+        adapter.remove_policies("p", "p", [["dave", "data4", "read"]])
+        self.assertEqual(adapter.current_revision(), checkpoint)
+
+    def test_snapshot(self):
+        """
+        test load_policy with snapshot_path
+        """
+        e = get_enforcer()
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "policy.snapshot")
+            adapter = Adapter(
+                "mongodb://localhost:27017",
+                "casbin_test",
+                track_revisions=True,
+                snapshot_path=path,
+            )
+            e = casbin.Enforcer(get_fixture("rbac_model.conf"), adapter)
+            self.assertTrue(os.path.exists(path))
+            policy = e.get_policy()
+
+            # unversioned writes are not seen while the revision is unchanged
+            MongoClient("mongodb://localhost:27017").casbin_test.casbin_rule.insert_one(
+                {"ptype": "p", "v0": "erin", "v1": "data1,data2", "v2": "read"}
+            )
+            e.load_policy()
+            self.assertEqual(e.get_policy(), policy)
+            self.assertTrue(e.enforce("alice", "data2", "read"))
+
+            adapter.add_policy("p", "p", ["frank", "data3", "read"])
+            e.load_policy()
+            self.assertIn(["erin", "data1,data2", "read"], e.get_policy())
+            self.assertIn(["frank", "data3", "read"], e.get_policy())
+
+            # a damaged snapshot falls back to Mongo
+            with open(path, "r+b") as f:
+                f.truncate(40)
+            e.load_policy()
+            self.assertEqual(len(e.get_policy()), len(policy) + 2)
+
+            # so does an empty one
+            open(path, "wb").close()
+            e.load_policy()
+            self.assertEqual(len(e.get_policy()), len(policy) + 2)
+
+            # a write reserved before the snapshot and landed after it is loaded
+            reserved = adapter._stamp_revisions(
+                [CasbinRule("p", "gina", "data5", "read").dict()]
+            )
+            e.load_policy()
+            adapter._collection.insert_many(reserved)
+            e.load_policy()
+            self.assertIn(["gina", "data5", "read"], e.get_policy())
+
+        with self.assertRaises(ValueError):
+            Adapter("mongodb://localhost:27017", "casbin_test", snapshot_path=path)
+
+    def test_rule_keys(self):
+        """
+        test rule_keys
+        """
+        adapter = Adapter(
+            "mongodb://localhost:27017",
+            "casbin_test",
+            create_indexes=True,
+            rule_keys=True,
+        )
+        collection = MongoClient("mongodb://localhost:27017").casbin_test.casbin_rule
+
+        # retried adds store the rule once
+        adapter.add_policy("p", "p", ["alice", "data1", "read"])
+        adapter.add_policy("p", "p", ["alice", "data1", "read"])
+        adapter.add_policies(
+            "p", "p", [["alice", "data1", "read"], ["alice", "data1", "write"]]
+        )
+        self.assertEqual(collection.count_documents({}), 2)
+
+        self.assertTrue(adapter.has_policy("p", "p", ["alice", "data1", "read"]))
+        self.assertFalse(adapter.has_policy("p", "p", ["alice", "data1"]))
+        self.assertFalse(adapter.has_policy("p", "p2", ["alice", "data1", "read"]))
+
+        self.assertTrue(
+            adapter.update_policy(
+                "p", "p", ["alice", "data1", "read"], ["alice", "data2", "read"]
+            )
+        )
+        self.assertTrue(adapter.has_policy("p", "p", ["alice", "data2", "read"]))
+        self.assertFalse(adapter.has_policy("p", "p", ["alice", "data1", "read"]))
+
+        self.assertTrue(adapter.remove_policy("p", "p", ["alice", "data2", "read"]))
+        self.assertFalse(adapter.remove_policy("p", "p", ["alice", "data2", "read"]))
+        self.assertEqual(collection.count_documents({}), 1)
+
+    def test_rule_keys_index(self):
+        """
+        test the key index of rule_keys without create_indexes
+        """
+        db = MongoClient("mongodb://localhost:27017").casbin_test
+        adapter = Adapter("mongodb://localhost:27017", "casbin_test", rule_keys=True)
+        adapter.add_policy("p", "p", ["alice", "data1", "read"])
+        self.assertIn("key_1", db.casbin_rule.index_information())
+
+        adapter = Adapter(
+            "mongodb://localhost:27017",
+            "casbin_test",
+            rule_keys=True,
+            atomic_save=True,
+        )
+        model = get_enforcer().get_model()
+        model.clear_policy()
+        model.add_policies("p", "p", [[f"user{i}", "data1", "read"] for i in range(50)])
+        self.assertTrue(adapter.save_policy(model))
+        self.assertEqual(db.casbin_rule.count_documents({}), 50)
+        self.assertIn("key_1", db.casbin_rule.index_information())
+        self.assertEqual(db.list_collection_names(), ["casbin_rule"])
+
+    def test_backfill_rule_keys(self):
+        """
+        test backfill_rule_keys and the backfill-keys command
+        """
+        collection = MongoClient("mongodb://localhost:27017").casbin_test.casbin_rule
+        collection.insert_many(
+            [
+                {"ptype": "p", "v0": "alice", "v1": "data1", "v2": "read"},
+                {"ptype": "p", "v0": "alice", "v1": "data1", "v2": "read"},
+                {"ptype": "p", "v0": "bob", "v1": "data2", "v2": "write"},
+                {"ptype": "g", "v0": "alice", "v1": "admin"},
+                {"ptype": "g", "v0": "alice", "v1": "admin"},
+            ]
+        )
+        adapter = Adapter("mongodb://localhost:27017", "casbin_test", rule_keys=True)
+        self.assertEqual(adapter.backfill_rule_keys(batch_size=2), (3, 2))
+        self.assertEqual(collection.count_documents({"key": {"$exists": True}}), 3)
+        self.assertEqual(collection.count_documents({}), 3)
+        self.assertTrue(adapter.has_policy("g", "g", ["alice", "admin"]))
+
+        collection.insert_one({"ptype": "p", "v0": "bob", "v1": "data2", "v2": "write"})
+        main(["backfill-keys", "mongodb://localhost:27017", "casbin_test"])
+        self.assertEqual(collection.count_documents({}), 3)
+
+    def test_import_export(self):
+        """
+        test streaming a policy file in and out, resuming an interrupted import
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            source = os.path.join(directory, "policy.csv")
+            with open(source, "w") as f:
+                f.write(
+                    "# comment\n"
+                    "p, alice, data1, read\n"
+                    "\n"
+                    "p, bob, keyMatch(/data2, /*), write\n"
+                    "g, alice, admin\n"
+                )
+            checkpoint = os.path.join(directory, "checkpoint")
+            # a previous run wrote the first rule
+            with open(checkpoint, "w") as f:
+                f.write("2")
+            adapter = Adapter("mongodb://localhost:27017", "casbin_test", chunk_size=1)
+            self.assertEqual(
+                adapter.import_policy(source, checkpoint_path=checkpoint), 2
+            )
+            with open(checkpoint) as f:
+                self.assertEqual(f.read(), "5")
+            self.assertEqual(
+                adapter.import_policy(source, checkpoint_path=checkpoint), 0
+            )
+            self.assertEqual(adapter.import_policy(source), 3)
+
+            exported = os.path.join(directory, "policy.ndjson")
+            self.assertEqual(adapter.export_policy(exported), 5)
+            with open(exported) as f:
+                lines = f.read().splitlines()
+            self.assertEqual(len(lines), 5)
+            self.assertIn('{"ptype":"g","v0":"alice","v1":"admin"}', lines)
+
+            adapter._collection.drop()
+            main(
+                [
+                    "import",
+                    "mongodb://localhost:27017",
+                    "casbin_test",
+                    exported,
+                    "--compact",
+                ]
+            )
+            adapter = Adapter("mongodb://localhost:27017", "casbin_test", compact=True)
+            e = casbin.Enforcer(get_fixture("rbac_model.conf"), adapter)
+            self.assertEqual(
+                sorted(e.get_policy()),
+                [
+                    ["alice", "data1", "read"],
+                    ["bob", "keyMatch(/data2, /*)", "write"],
+                    ["bob", "keyMatch(/data2, /*)", "write"],
+                ],
+            )
+            main(["export", "mongodb://localhost:27017", "casbin_test", source])
+            with open(source) as f:
+                self.assertIn("p, bob, keyMatch(/data2, /*), write\n", f.read())
+
+            # casbin CSV cannot quote a comma, the rule only goes to NDJSON
+            adapter.add_policy("p", "p", ["carol", "data1,data2", "read"])
+            with self.assertRaises(ValueError):
+                adapter.export_policy(source)
+            self.assertNotIn("policy.csv.tmp", os.listdir(directory))
+            self.assertEqual(adapter.export_policy(exported), 6)
+
+            adapter._collection.drop()
+            main(
+                [
+                    "import",
+                    "mongodb://localhost:27017",
+                    "casbin_test",
+                    exported,
+                    "--track-revisions",
+                ]
+            )
+            adapter = Adapter(
+                "mongodb://localhost:27017", "casbin_test", track_revisions=True
+            )
+            self.assertEqual(adapter.current_revision(), 6)
+            e = casbin.Enforcer(get_fixture("rbac_model.conf"), adapter)
+            self.assertTrue(e.enforce("carol", "data1,data2", "read"))
+
+    def test_shared_client(self):
+        """
+        test adapters sharing the lazily created client of a uri
+        """
+        adapter = Adapter("mongodb://localhost:27017", "casbin_test", max_pool_size=7)
+        other = Adapter("mongodb://localhost:27017", "casbin_test", max_pool_size=7)
+        self.assertIsNone(adapter._handles)
+        self.assertIsNone(adapter._client)
+
+        adapter.add_policy("p", "p", ["alice", "data1", "read"])
+        self.assertTrue(other.has_policy("p", "p", ["alice", "data1", "read"]))
+        client = adapter._collection.database.client
+        self.assertIs(other._collection.database.client, client)
+        self.assertEqual(client.options.pool_options.max_pool_size, 7)
+        self.assertEqual(clients.references(client), 2)
+
+        adapter.close()
+        self.assertEqual(clients.references(client), 1)
+        other.close()
+        self.assertEqual(clients.references(client), 0)
+
+        mongo_client = MongoClient("mongodb://localhost:27017")
+        adapter = Adapter(client=mongo_client, db_name="casbin_test")
+        self.assertTrue(adapter.has_policy("p", "p", ["alice", "data1", "read"]))
+        adapter.close()
+        self.assertEqual(mongo_client.casbin_test.casbin_rule.count_documents({}), 1)
+
+    def test_deduplicate(self):
+        """
+        test deleting the extra copies of duplicated rules
+        """
+        collection = MongoClient("mongodb://localhost:27017").casbin_test.casbin_rule
+        collection.insert_many(
+            [
+                {"ptype": "p", "v0": "alice", "v1": "data1", "v2": "read"},
+                {"ptype": "p", "v0": "alice", "v1": "data1", "v2": "read"},
+                {"ptype": "p", "v0": "alice", "v1": "data1", "v2": "read"},
+                {"ptype": "p", "v0": "alice", "v1": "data1"},
+                {"ptype": "g", "v0": "alice", "v1": "admin"},
+                {"ptype": "g", "v0": "alice", "v1": "admin"},
+                {"ptype": "g", "v0": "bob", "v1": "admin"},
+            ]
+        )
+        adapter = Adapter("mongodb://localhost:27017", "casbin_test")
+        self.assertEqual(adapter.deduplicate(dry_run=True), {"p": 2, "g": 1})
+        self.assertEqual(collection.count_documents({}), 7)
+
+        first = collection.find_one({"ptype": "p"})["_id"]
+        self.assertEqual(adapter.deduplicate(batch_size=1), {"p": 2, "g": 1})
+        self.assertEqual(collection.count_documents({}), 4)
+        self.assertEqual(collection.count_documents({"_id": first}), 1)
+        self.assertEqual(adapter.deduplicate(), {})
+
+        collection.insert_many([{"t": "g", "r": ["bob", "admin"]} for _ in range(2)])
+        main(["deduplicate", "mongodb://localhost:27017", "casbin_test", "--compact"])
+        self.assertEqual(collection.count_documents({"t": "g"}), 1)
+
+    def test_compact_schema(self):
+        """
+        test adapter with the compact document layout
+        """
+        adapter = Adapter(
+            "mongodb://localhost:27017",
+            "casbin_test",
+            compact=True,
+            track_revisions=True,
+        )
+        e = casbin.Enforcer(get_fixture("rbac_model.conf"), adapter)
+        e.add_policies([["alice", "data1", "read"], ["bob", "data2", "write"]])
+        e.add_grouping_policy("alice", "admin")
+        collection = MongoClient("mongodb://localhost:27017").casbin_test.casbin_rule
+        self.assertEqual(
+            collection.find_one({"t": "g"}, projection={"_id": 0}),
+            {"t": "g", "r": ["alice", "admin"], "rev": 3},
+        )
+
+        checkpoint = adapter.current_revision()
+        e.remove_policy("alice", "data1")
+        self.assertTrue(e.has_policy("alice", "data1", "read"))
+        self.assertTrue(
+            e.update_policy(["bob", "data2", "write"], ["bob", "data2", "read"])
+        )
+        self.assertTrue(e.remove_filtered_grouping_policy(1, "admin"))
+        self.assertFalse(adapter.has_policy("g", "g", ["alice", "admin"]))
+        self.assertTrue(adapter.has_policy("p", "p", ["bob", "data2", "read"]))
+
+        e.load_policy()
+        self.assertEqual(
+            e.get_policy(), [["alice", "data1", "read"], ["bob", "data2", "read"]]
+        )
+        self.assertEqual(e.get_grouping_policy(), [])
+        model = casbin.Enforcer(get_fixture("rbac_model.conf")).get_model()
+        model.add_policy("p", "p", ["alice", "data1", "read"])
+        model.add_policy("p", "p", ["bob", "data2", "write"])
+        model.add_policy("g", "g", ["alice", "admin"])
+        adapter.load_policy_since(model, checkpoint)
+        self.assertEqual(model.get_policy("p", "p"), e.get_policy())
+        self.assertEqual(model.get_policy("g", "g"), [])
+
+        e.load_filtered_policy(Filter(ptype="p", v1="data2", projection=["v0", "v1"]))
+        self.assertEqual(e.get_policy(), [["bob", "data2"]])
+
+    def test_migrate_schema(self):
+        """
+        test migrate_schema and the migrate-schema command
+        """
+        adapter = Adapter("mongodb://localhost:27017", "casbin_test")
+        adapter.add_policies("p", "p", [["alice", "data1", "read"], ["bob", "data2"]])
+        compact = Adapter("mongodb://localhost:27017", "casbin_test", compact=True)
+        compact.add_policy("g", "g", ["alice", "admin"])
+
+        # both layouts are loaded while the collection is migrated
+        e = casbin.Enforcer(get_fixture("rbac_model.conf"), compact)
+        self.assertEqual(len(e.get_policy()), 2)
+        self.assertEqual(len(e.get_grouping_policy()), 1)
+
+        self.assertEqual(compact.migrate_schema(batch_size=1), 2)
+        collection = MongoClient("mongodb://localhost:27017").casbin_test.casbin_rule
+        self.assertEqual(collection.count_documents({"t": {"$exists": True}}), 3)
+        self.assertEqual(collection.count_documents({"ptype": {"$exists": True}}), 0)
+        self.assertTrue(compact.has_policy("p", "p", ["bob", "data2"]))
+
+        main(
+            [
+                "migrate-schema",
+                "mongodb://localhost:27017",
+                "casbin_test",
+                "--no-compact",
+            ]
+        )
+        self.assertEqual(collection.count_documents({"ptype": {"$exists": True}}), 3)
+        self.assertEqual(
+            collection.find_one({"ptype": "g"}, projection={"_id": 0}),
+            {"ptype": "g", "v0": "alice", "v1": "admin"},
+        )
+
+    def test_load_policy_partitioned(self):
+        """
+        test load_policy with parallelism
+        """
+        adapter = Adapter("mongodb://localhost:27017", "casbin_test")
+        adapter.add_policies(
+            "p", "p", [[f"user{i}", f"data{i % 7}", "read"] for i in range(500)]
+        )
+        adapter.add_policies(
+            "g", "g", [[f"user{i}", f"role{i % 3}"] for i in range(100)]
+        )
+        e = casbin.Enforcer(get_fixture("rbac_model.conf"), adapter)
+
+        partitioned = casbin.Enforcer(
+            get_fixture("rbac_model.conf"),
+            Adapter("mongodb://localhost:27017", "casbin_test", parallelism=4),
+        )
+        self.assertEqual(partitioned.get_policy(), e.get_policy())
+        self.assertEqual(partitioned.get_grouping_policy(), e.get_grouping_policy())
+
+        model = e.get_model()
+        model.clear_policy()
+        adapter.load_policy(model, parallelism=8)
+        self.assertEqual(len(e.get_policy()), 500)
+
+    def test_load_policy_pause_gc(self):
+        """
+        test loading mixed documents with the garbage collector paused
+        """
+        collection = MongoClient("mongodb://localhost:27017").casbin_test.casbin_rule
+        collection.insert_many(
+            [
+                {"ptype": "p", "v0": "alice", "v1": "data1", "v2": "read"},
+                {"t": "p", "r": ["bob", "data2", "write"]},
+                {"ptype": "p", "v0": "carol", "v2": "read"},
+                {"ptype": "g", "v0": "alice", "v1": "admin"},
+                {"ptype": "q", "v0": "unknown"},
+                {"v0": "orphan"},
+            ]
+        )
+        adapter = Adapter(
+            "mongodb://localhost:27017", "casbin_test", compact=True, pause_gc=True
+        )
+        e = casbin.Enforcer(get_fixture("rbac_model.conf"), adapter)
+        self.assertTrue(gc.isenabled())
+        self.assertEqual(
+            e.get_policy(),
+            [["alice", "data1", "read"], ["bob", "data2", "write"], ["carol", "read"]],
+        )
+        self.assertEqual(e.get_grouping_policy(), [["alice", "admin"]])
+        self.assertTrue(e.has_policy("bob", "data2", "write"))
+
+        gc.disable()
+        try:
+            e.load_filtered_policy(Filter(ptype="p", v0="bob"))
+            self.assertFalse(gc.isenabled())
+        finally:
+            gc.enable()
+        self.assertEqual(e.get_policy(), [["bob", "data2", "write"]])
+
+    def test_read_preference_and_write_concerns(self):
+        """
+        test loads routed by read preference and writes with their write concern
+        """
+        adapter = Adapter(
+            "mongodb://localhost:27017",
+            "casbin_test",
+            read_preference=SecondaryPreferred(max_staleness=120),
+            write_concerns={
+                "add_policies": WriteConcern(w=1, j=False),
+                "remove_policy": WriteConcern("majority"),
+            },
+        )
+        self.assertEqual(
+            adapter._load_collection(adapter._collection).read_preference,
+            SecondaryPreferred(max_staleness=120),
+        )
+        self.assertEqual(
+            adapter._concerned(adapter._collection, "remove_policy").write_concern,
+            WriteConcern("majority"),
+        )
+        self.assertIs(
+            adapter._concerned(adapter._collection, "add_policy"), adapter._collection
+        )
+
+        e = casbin.Enforcer(get_fixture("rbac_model.conf"), adapter)
+        e.add_policies([["alice", "data1", "read"], ["bob", "data2", "write"]])
+        e.remove_policy("alice", "data1", "read")
+        e.load_policy()
+        self.assertEqual(e.get_policy(), [["bob", "data2", "write"]])
+
+        with self.assertRaises(ValueError):
+            Adapter(
+                "mongodb://localhost:27017",
+                "casbin_test",
+                write_concerns={"load_policy": WriteConcern(w=1)},
+            )
+
+    def test_snapshot_read_preference(self):
+        """
+        test reading the snapshot revision and the rules in one causal session
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            adapter = Adapter(
+                "mongodb://localhost:27017",
+                "casbin_test",
+                read_preference=SecondaryPreferred(),
+                track_revisions=True,
+                snapshot_path=os.path.join(directory, "policy.snapshot"),
+            )
+            sessions = []
+            current_revision = adapter.current_revision
+            adapter.current_revision = lambda: (
+                sessions.append(in_causal_session.get()) or current_revision()
+            )
+            adapter.add_policy("p", "p", ["alice", "data1", "read"])
+            e = casbin.Enforcer(get_fixture("rbac_model.conf"), adapter)
+            adapter.add_policy("p", "p", ["bob", "data2", "write"])
+            e.load_policy()
+            self.assertEqual(sessions, [True, True])
+            self.assertEqual(
+                e.get_policy(), [["alice", "data1", "read"], ["bob", "data2", "write"]]
+            )
+
+    def test_causal_session(self):
+        """
+        test reading the writes of a causally consistent session
+        """
+        adapter = Adapter(
+            "mongodb://localhost:27017",
+            "casbin_test",
+            read_preference=SecondaryPreferred(),
+            parallelism=4,
+        )
+        e = casbin.Enforcer(get_fixture("rbac_model.conf"), adapter)
+        e.add_policy("alice", "data1", "read")
+        with adapter.causal_session() as session:
+            self.assertTrue(session.options.causal_consistency)
+            e.remove_policy("alice", "data1", "read")
+            e.load_policy()
+            self.assertEqual(e.get_policy(), [])
+
     def test_remove_filtered_policy(self):
         """
         test remove_filtered_policy
@@ -343,6 +1124,74 @@ class TestConfig(TestCase):
         self.assertFalse(e.enforce("bob", "data2", "read"))
         self.assertTrue(e.enforce("bob", "data2", "write"))
 
+    def test_filter_query(self):
+        """
+        test Filter compilation
+        """
+        filter = Filter(ptype=["p"], v0=["alice", Prefix("team/")], v1=Range("a", "m"))
+        self.assertEqual(filter.query()["ptype"], "p")
+        self.assertEqual(filter.query()["v0"]["$in"][0], "alice")
+        self.assertEqual(filter.query()["v0"]["$in"][1].pattern, "^team/")
+        self.assertEqual(filter.query()["v1"], {"$gte": "a", "$lt": "m"})
+        self.assertIs(filter.query(), filter.query())
+
+        filter.v0 = ["bob"]
+        self.assertEqual(filter.query()["v0"], "bob")
+        with self.assertRaises(AttributeError):
+            filter.v0.append("carol")
+
+        filter.raw_query = {"v0": "carol"}
+        self.assertEqual(filter.query(), {"v0": "carol"})
+
+    def test_filtered_policy_prefix_and_groups(self):
+        """
+        test load_filtered_policy with Prefix, any_of and projection
+        """
+        adapter = Adapter("mongodb://localhost:27017", "casbin_test")
+        e = casbin.Enforcer(get_fixture("rbac_model.conf"), adapter)
+        e.add_policies(
+            [
+                ["tenant1/alice", "data1", "read"],
+                ["tenant1/bob", "data2", "write"],
+                ["tenant2/carol", "data1", "read"],
+            ]
+        )
+        e.add_grouping_policies(
+            [["tenant1/bob", "tenant1/admin"], ["tenant2/carol", "tenant2/admin"]]
+        )
+
+        e.load_filtered_policy(Filter(v0=Prefix("tenant1/")))
+        self.assertEqual(
+            e.get_policy(),
+            [["tenant1/alice", "data1", "read"], ["tenant1/bob", "data2", "write"]],
+        )
+        self.assertEqual(e.get_grouping_policy(), [["tenant1/bob", "tenant1/admin"]])
+
+        e.load_filtered_policy(
+            Filter(
+                any_of=[
+                    Filter(ptype="p", v1="data1"),
+                    Filter(ptype="g", v1=Prefix("tenant2/")),
+                ],
+                projection=["v0", "v1"],
+            )
+        )
+        self.assertEqual(
+            e.get_policy(), [["tenant1/alice", "data1"], ["tenant2/carol", "data1"]]
+        )
+        self.assertEqual(e.get_grouping_policy(), [["tenant2/carol", "tenant2/admin"]])
+
+    def test_explain_filter(self):
+        """
+        test explain_filter
+        """
+        adapter = Adapter(
+            "mongodb://localhost:27017", "casbin_test", create_indexes=True
+        )
+        adapter.add_policy("p", "p", ["tenant1/alice", "data1", "read"])
+        explanation = adapter.explain_filter(Filter(ptype=["p"], v0=Prefix("tenant1/")))
+        self.assertIn("IXSCAN", str(explanation["queryPlanner"]["winningPlan"]))
+
     async def test_update_policy(self):
         e = get_enforcer()
         example_p = ["mike", "cookie", "eat"]
@@ -402,6 +1251,229 @@ class TestConfig(TestCase):
         self.assertFalse(e.enforce("data2_admin", "data2", "write"))
         self.assertTrue(e.enforce("data2_admin", "data_test", "write"))
 
+    def test_update_policies_scoped_by_ptype(self):
+        """
+        test update_policies only updates rules of the given ptype
+        """
+        e = get_enforcer()
+        adapter = e.get_adapter()
+        adapter.add_policy("g", "g", ["bob", "data2", "write"])
+
+        self.assertTrue(
+            adapter.update_policies(
+                "p",
+                "p",
+                [["bob", "data2", "write"], ["alice", "data1", "read"]],
+                [["bob", "data3", "write"], ["alice", "data1"]],
+            )
+        )
+        e.load_policy()
+        self.assertIn(["bob", "data3", "write"], e.get_policy())
+        self.assertIn(["alice", "data1"], e.get_policy())
+        self.assertNotIn(["alice", "data1", "read"], e.get_policy())
+        self.assertIn(["bob", "data2", "write"], e.get_grouping_policy())
+
+        # a rule that matches nothing is reported, the others are still updated
+        with self.assertLogs("casbin_pymongo_adapter", "WARNING"):
+            self.assertFalse(
+                adapter.update_policies(
+                    "p",
+                    "p",
+                    [["nobody", "data1", "read"], ["bob", "data3", "write"]],
+                    [["nobody", "data2", "read"], ["bob", "data4", "write"]],
+                )
+            )
+        e.load_policy()
+        self.assertIn(["bob", "data4", "write"], e.get_policy())
+        self.assertNotIn(["nobody", "data2", "read"], e.get_policy())
+
+    def test_update_filtered_policies(self):
+        """
+        test update_filtered_policies
+        """
+        e = get_enforcer()
+        self.assertTrue(
+            e.update_filtered_policies(
+                [["data2_admin", "data3", "read"], ["data2_admin", "data3", "write"]],
+                0,
+                "data2_admin",
+            )
+        )
+        e.load_policy()
+        self.assertFalse(e.enforce("alice", "data2", "read"))
+        self.assertTrue(e.enforce("alice", "data3", "read"))
+        self.assertTrue(e.enforce("alice", "data3", "write"))
+
+        adapter = e.get_adapter()
+        self.assertEqual(
+            adapter.update_filtered_policies("p", "p", [], 0, "nobody"), []
+        )
+
+    def test_tenant_router(self):
+        """
+        test TenantRouter collection names
+        """
+        router = TenantRouter()
+        self.assertEqual(router.collection_name(None), "casbin_rule")
+        self.assertEqual(router.collection_name("tenant1"), "casbin_rule__tenant1")
+        self.assertTrue(router.collection_name("a/b$").startswith("casbin_rule__~"))
+        self.assertEqual(
+            router.rule_collection_name("p", ["admin", "tenant1", "data", "read"]),
+            "casbin_rule__tenant1",
+        )
+        self.assertEqual(router.rule_collection_name("p", ["admin"]), "casbin_rule")
+        self.assertEqual(router.rule_collection_name("g2", ["a", "b"]), "casbin_rule")
+        self.assertTrue(router.is_tenant_collection("casbin_rule__tenant1"))
+        self.assertFalse(router.is_tenant_collection("casbin_rule_meta"))
+
+        self.assertEqual(
+            router.filtered_collection_names("g", 1, ["admin", "tenant1"]),
+            {"casbin_rule__tenant1"},
+        )
+        self.assertIsNone(router.filtered_collection_names("p", 0, ["admin"]))
+        self.assertEqual(
+            router.filter_collection_names(
+                Filter(
+                    any_of=[
+                        Filter(ptype="p", v1="tenant1"),
+                        Filter(ptype="g", v2=["tenant1", "tenant2"]),
+                    ]
+                )
+            ),
+            {"casbin_rule__tenant1", "casbin_rule__tenant2"},
+        )
+        self.assertIsNone(
+            router.filter_collection_names(Filter(ptype="p", v1=Prefix("tenant")))
+        )
+        self.assertIsNone(router.filter_collection_names(Filter(v1="tenant1")))
+
+        buckets = TenantRouter(buckets=4)
+        names = {buckets.collection_name(f"tenant{i}") for i in range(100)}
+        self.assertEqual(names, {f"casbin_rule__{i}" for i in range(4)})
+
+    def test_tenant_collections(self):
+        """
+        test adapter with one collection per tenant
+        """
+        adapter = Adapter(
+            "mongodb://localhost:27017",
+            "casbin_test",
+            collection=TenantRouter(),
+            track_revisions=True,
+        )
+        e = casbin.Enforcer(get_fixture("rbac_with_domains_model.conf"), adapter)
+        e.add_policies(
+            [
+                ["admin", "tenant1", "data1", "read"],
+                ["admin", "tenant2", "data2", "read"],
+            ]
+        )
+        e.add_grouping_policies(
+            [["alice", "admin", "tenant1"], ["bob", "admin", "tenant2"]]
+        )
+        db = MongoClient("mongodb://localhost:27017")["casbin_test"]
+        self.assertEqual(db["casbin_rule__tenant1"].count_documents({}), 2)
+        self.assertEqual(db["casbin_rule__tenant2"].count_documents({}), 2)
+        self.assertEqual(db["casbin_rule"].count_documents({}), 0)
+
+        e.load_policy()
+        self.assertTrue(e.enforce("alice", "tenant1", "data1", "read"))
+        self.assertTrue(e.enforce("bob", "tenant2", "data2", "read"))
+
+        e.load_filtered_policy(
+            Filter(
+                any_of=[
+                    Filter(ptype="p", v1="tenant2"),
+                    Filter(ptype="g", v2="tenant2"),
+                ]
+            )
+        )
+        self.assertEqual(e.get_policy(), [["admin", "tenant2", "data2", "read"]])
+
+        # moving a rule to another tenant
+        checkpoint = adapter.current_revision()
+        self.assertTrue(
+            adapter.update_policy(
+                "p",
+                "p",
+                ["admin", "tenant1", "data1", "read"],
+                ["admin", "tenant3", "data1", "read"],
+            )
+        )
+        self.assertEqual(db["casbin_rule__tenant1"].count_documents({}), 1)
+        self.assertEqual(db["casbin_rule__tenant3"].count_documents({}), 1)
+        self.assertTrue(adapter.remove_filtered_policy("g", "g", 2, "tenant1"))
+        self.assertEqual(db["casbin_rule__tenant1"].count_documents({}), 0)
+
+        adapter.drop_tenant("tenant2")
+        self.assertNotIn("casbin_rule__tenant2", db.list_collection_names())
+        e.load_policy()
+        self.assertEqual(e.get_policy(), [["admin", "tenant3", "data1", "read"]])
+        self.assertEqual(e.get_grouping_policy(), [])
+
+        # the drop left tombstones for delta loads
+        model = casbin.Enforcer(get_fixture("rbac_with_domains_model.conf")).get_model()
+        model.add_policy("p", "p", ["admin", "tenant1", "data1", "read"])
+        model.add_policy("p", "p", ["admin", "tenant2", "data2", "read"])
+        model.add_policy("g", "g", ["alice", "admin", "tenant1"])
+        model.add_policy("g", "g", ["bob", "admin", "tenant2"])
+        adapter.load_policy_since(model, checkpoint)
+        self.assertEqual(
+            model.get_policy("p", "p"), [["admin", "tenant3", "data1", "read"]]
+        )
+        self.assertEqual(model.get_policy("g", "g"), [])
+
+    def test_tenant_buckets(self):
+        """
+        test adapter with tenants hashed into buckets
+        """
+        router = TenantRouter(buckets=2)
+        adapter = Adapter("mongodb://localhost:27017", "casbin_test", collection=router)
+        e = casbin.Enforcer(get_fixture("rbac_with_domains_model.conf"), adapter)
+        e.add_policies([["admin", f"tenant{i}", "data", "read"] for i in range(10)])
+        db = MongoClient("mongodb://localhost:27017")["casbin_test"]
+        for i in range(10):
+            bucket = db[router.collection_name(f"tenant{i}")]
+            self.assertEqual(bucket.count_documents({"v1": f"tenant{i}"}), 1)
+
+        adapter.drop_tenant("tenant0")
+        e.load_policy()
+        self.assertEqual(len(e.get_policy()), 9)
+        self.assertNotIn(["admin", "tenant0", "data", "read"], e.get_policy())
+
+        with self.assertRaises(ValueError):
+            Adapter(
+                "mongodb://localhost:27017",
+                "casbin_test",
+                collection=router,
+                atomic_save=True,
+            )
+
+    def test_partition_queries(self):
+        """
+        test partition_queries function
+        """
+        self.assertEqual(partition_queries([], 4), [{}])
+        self.assertEqual(partition_queries([1, "a"], 2), [{}])
+        self.assertEqual(
+            partition_queries([1, 2, 3, 4, 5, 6, 7, 8], 4),
+            [
+                {"_id": {"$not": {"$gte": 3}}},
+                {"_id": {"$gte": 3, "$lt": 5}},
+                {"_id": {"$gte": 5, "$lt": 7}},
+                {"_id": {"$gte": 7}},
+            ],
+        )
+        # repeated bounds are merged, no range is empty
+        self.assertEqual(
+            partition_queries([1, 1, 1, 1, 2, 2], 3),
+            [
+                {"_id": {"$not": {"$gte": 1}}},
+                {"_id": {"$gte": 1, "$lt": 2}},
+                {"_id": {"$gte": 2}},
+            ],
+        )
+
     def test_str(self):
         """
         test __str__ function
@@ -418,6 +1490,29 @@ class TestConfig(TestCase):
             rule.dict(), {"ptype": "p", "v0": "alice", "v1": "data1", "v2": "read"}
         )
 
+    def test_from_document(self):
+        """
+        test from_document and to_tuple functions
+        """
+        rule = CasbinRule.from_document(
+            {"_id": "id", "ptype": "g", "v0": "alice", "v1": "admin"}
+        )
+        self.assertEqual(rule.dict(), {"ptype": "g", "v0": "alice", "v1": "admin"})
+        self.assertEqual(rule.to_tuple(), ("alice", "admin"))
+        with self.assertRaises(AttributeError):
+            rule._id = "id"
+
+    def test_key(self):
+        """
+        test key function
+        """
+        rule = CasbinRule(ptype="p", v0="alice", v1="data1", v2="read")
+        self.assertEqual(rule.key(), CasbinRule("p", "alice", "data1", "read").key())
+        self.assertNotEqual(rule.key(), CasbinRule("g", "alice", "data1", "read").key())
+        self.assertNotEqual(
+            CasbinRule("p", "a,b", "c").key(), CasbinRule("p", "a", "b,c").key()
+        )
+
     def test_repr(self):
         """
         test __repr__ function
@@ -0,0 +1,159 @@
+from casbin_pymongo_adapter import Adapter
+from casbin_pymongo_adapter._buffer import (
+    ADD,
+    REMOVE,
+    AsyncWriteBuffer,
+    PendingWrites,
+    WriteBuffer,
+)
+from pymongo import MongoClient
+from unittest import TestCase
+import asyncio
+import casbin
+import contextvars
+import threading
+
+from tests.helper import get_fixture
+
+
+class TestWriteBuffer(TestCase):
+    """
+    unittest
+    """
+
+    def setUp(self):
+        MongoClient("mongodb://localhost:27017").drop_database("casbin_test")
+
+    def tearDown(self):
+        MongoClient("mongodb://localhost:27017").drop_database("casbin_test")
+
+    def test_pending_writes(self):
+        """
+        test coalescing of the pending writes
+        """
+        pending = PendingWrites()
+        pending.push(ADD, "p", ["alice", "data1", "read"])
+        pending.push(ADD, "p", ["bob", "data2", "write"])
+        pending.push(REMOVE, "p", ["alice", "data1", "read"])
+        pending.push(REMOVE, "g", ["alice", "admin"])
+        pending.push(ADD, "g", ["alice", "admin"])
+        pending.push(REMOVE, "p", ["carol", "data3", "read"])
+        self.assertEqual(len(pending), 2)
+        self.assertEqual(
+            pending.drain(),
+            [
+                (ADD, "p", ["bob", "data2", "write"]),
+                (REMOVE, "p", ["carol", "data3", "read"]),
+            ],
+        )
+        self.assertEqual(len(pending), 0)
+
+    def test_flush_thresholds(self):
+        """
+        test flushes triggered by the size and the interval
+        """
+        flushed = []
+        done = threading.Event()
+
+        def write(writes):
+            flushed.append(writes)
+            done.set()
+
+        buffer = WriteBuffer(write, size=2, interval=60, max_pending=10)
+        buffer.push(ADD, "p", ["alice", "data1", "read"])
+        self.assertFalse(done.wait(0.1))
+        buffer.push(ADD, "p", ["bob", "data2", "write"])
+        self.assertTrue(done.wait(5))
+        self.assertEqual(len(flushed[0]), 2)
+
+        done.clear()
+        buffer = WriteBuffer(write, size=100, interval=0.05, max_pending=1000)
+        buffer.push(REMOVE, "p", ["alice", "data1", "read"])
+        self.assertTrue(done.wait(5))
+        self.assertEqual(flushed[1], [(REMOVE, "p", ["alice", "data1", "read"])])
+
+    def test_backpressure(self):
+        """
+        test a full buffer being sent by the caller
+        """
+        flushed = []
+        buffer = WriteBuffer(flushed.append, size=100, interval=60, max_pending=100)
+        for i in range(250):
+            buffer.push(ADD, "p", [f"user{i}", "data", "read"])
+        self.assertLessEqual(len(buffer), 100)
+        self.assertEqual([len(writes) for writes in flushed], [100, 100])
+
+    def test_flush_error(self):
+        """
+        test the error callback and the error raised by flush
+        """
+        failures = []
+
+        def write(writes):
+            raise RuntimeError("unavailable")
+
+        buffer = WriteBuffer(
+            write,
+            size=100,
+            interval=60,
+            max_pending=100,
+            on_error=lambda error, writes: failures.append((str(error), writes)),
+        )
+        buffer.push(ADD, "p", ["alice", "data1", "read"])
+        with self.assertRaises(RuntimeError):
+            buffer.flush()
+        self.assertEqual(
+            failures, [("unavailable", [(ADD, "p", ["alice", "data1", "read"])])]
+        )
+        buffer.flush()
+        self.assertEqual(len(failures), 1)
+
+    def test_async_task_context(self):
+        """
+        test the asynchronous flush task not sharing the caller's context
+        """
+        session = contextvars.ContextVar("session", default=None)
+        seen = []
+
+        async def write(writes):
+            seen.append(session.get())
+
+        async def push():
+            buffer = AsyncWriteBuffer(write, size=1, interval=60, max_pending=10)
+            # as causal_session does around the first buffered add
+            session.set("caller session")
+            await buffer.push(ADD, "p", ["alice", "data1", "read"])
+            await asyncio.sleep(0.1)
+
+        asyncio.run(push())
+        self.assertEqual(seen, [None])
+
+    def test_adapter(self):
+        """
+        test an adapter buffering its writes
+        """
+        adapter = Adapter(
+            "mongodb://localhost:27017",
+            "casbin_test",
+            buffer_size=100,
+            flush_interval=60,
+            track_revisions=True,
+        )
+        e = casbin.Enforcer(get_fixture("rbac_model.conf"), adapter)
+        e.add_policy("alice", "data1", "read")
+        e.add_policy("bob", "data2", "write")
+        e.add_grouping_policy("alice", "admin")
+        e.remove_policy("bob", "data2", "write")
+        collection = MongoClient("mongodb://localhost:27017").casbin_test.casbin_rule
+        self.assertEqual(collection.count_documents({}), 0)
+
+        adapter.flush()
+        self.assertEqual(collection.count_documents({}), 2)
+        self.assertEqual(adapter.current_revision(), 2)
+
+        e.remove_policy("alice", "data1", "read")
+        e.add_policy("carol", "data3", "read")
+        self.assertTrue(adapter.has_policy("p", "p", ["carol", "data3", "read"]))
+        e.load_policy()
+        self.assertEqual(e.get_policy(), [["carol", "data3", "read"]])
+        self.assertEqual(e.get_grouping_policy(), [["alice", "admin"]])
@@ -0,0 +1,82 @@
+from casbin_pymongo_adapter import Adapter, DomainCache
+from pymongo import MongoClient
+from unittest import TestCase
+import casbin
+
+from tests.helper import get_fixture
+
+
+class TestDomainCache(TestCase):
+    """
+    unittest
+    """
+
+    def setUp(self):
+        MongoClient("mongodb://localhost:27017").drop_database("casbin_test")
+        adapter = Adapter("mongodb://localhost:27017", "casbin_test")
+        for tenant in ("tenant1", "tenant2", "tenant3"):
+            adapter.add_policy("p", "p", ["admin", tenant, "data", "read"])
+            adapter.add_policy("g", "g", [f"{tenant}_user", "admin", tenant])
+
+        self.enforcer = casbin.Enforcer(
+            get_fixture("rbac_with_domains_model.conf"),
+            Adapter("mongodb://localhost:27017", "casbin_test", filtered=True),
+        )
+
+    def test_load_on_first_enforce(self):
+        """
+        test domains are loaded on their first enforce
+        """
+        cache = DomainCache(self.enforcer)
+        self.assertEqual(self.enforcer.get_policy(), [])
+
+        self.assertTrue(cache.enforce("tenant1_user", "tenant1", "data", "read"))
+        self.assertFalse(cache.enforce("tenant1_user", "tenant2", "data", "read"))
+        self.assertTrue(cache.enforce("tenant1_user", "tenant1", "data", "read"))
+        self.assertEqual(
+            self.enforcer.get_policy(),
+            [
+                ["admin", "tenant1", "data", "read"],
+                ["admin", "tenant2", "data", "read"],
+            ],
+        )
+        self.assertEqual(
+            cache.stats(),
+            {
+                "hits": 1,
+                "misses": 2,
+                "evictions": 0,
+                "domains": 2,
+                "rules": 4,
+                "bytes": cache.stats()["bytes"],
+            },
+        )
+
+    def test_lru_eviction(self):
+        """
+        test the least recently used domain is evicted
+        """
+        cache = DomainCache(self.enforcer, max_domains=2)
+        cache.load_domain("tenant1")
+        cache.load_domain("tenant2")
+        cache.load_domain("tenant1")
+        cache.load_domain("tenant3")
+
+        self.assertEqual(cache.stats()["evictions"], 1)
+        self.assertEqual(
+            sorted(rule[1] for rule in self.enforcer.get_policy()),
+            ["tenant1", "tenant3"],
+        )
+        self.assertEqual(
+            self.enforcer.get_roles_for_user_in_domain("tenant2_user", "tenant2"), []
+        )
+        self.assertTrue(cache.enforce("tenant2_user", "tenant2", "data", "read"))
+        self.assertEqual(cache.stats()["domains"], 2)
+
+        cache = DomainCache(self.enforcer, max_rules=2)
+        cache.load_domain("tenant1")
+        cache.load_domain("tenant2")
+        self.assertEqual(cache.stats()["rules"], 2)
+        self.assertFalse(cache.evict_domain("tenant1"))
+        self.assertTrue(cache.evict_domain("tenant2"))
+        self.assertEqual(self.enforcer.get_policy(), [])
@@ -0,0 +1,93 @@
+from datetime import timedelta
+from casbin_pymongo_adapter import Adapter, Metrics
+from pymongo import MongoClient
+from pymongo.monitoring import CommandStartedEvent, CommandSucceededEvent
+from unittest import TestCase
+import casbin
+
+from tests.helper import get_fixture
+
+
+class TestMetrics(TestCase):
+    """
+    unittest
+    """
+
+    def setUp(self):
+        MongoClient("mongodb://localhost:27017").drop_database("casbin_test")
+
+    def tearDown(self):
+        MongoClient("mongodb://localhost:27017").drop_database("casbin_test")
+
+    def test_methods(self):
+        """
+        test metrics of the adapter methods
+        """
+        calls = []
+        metrics = Metrics(callback=lambda *args: calls.append(args))
+        adapter = Adapter("mongodb://localhost:27017", "casbin_test", metrics=metrics)
+        e = casbin.Enforcer(get_fixture("rbac_model.conf"), adapter)
+        e.add_policy("alice", "data1", "read")
+        e.add_policies([["bob", "data2", "write"], ["carol", "data3", "read"]])
+        e.remove_policy("carol", "data3", "read")
+        e.update_policy(["bob", "data2", "write"], ["bob", "data2", "read"])
+        e.load_policy()
+
+        methods = metrics.snapshot()["methods"]
+        self.assertEqual(methods["load_policy"]["calls"], 2)
+        self.assertEqual(methods["add_policy"]["calls"], 1)
+        self.assertEqual(methods["add_policies"]["calls"], 1)
+        self.assertEqual(methods["remove_policy"]["errors"], 0)
+        # update_policy is recorded once, not also as update_policies
+        self.assertEqual(methods["update_policy"]["calls"], 1)
+        self.assertNotIn("update_policies", methods)
+        self.assertEqual(
+            sum(count for _, count in methods["load_policy"]["histogram"]), 2
+        )
+        self.assertEqual(
+            [name for name, _, _ in calls],
+            [
+                "load_policy",
+                "add_policy",
+                "add_policies",
+                "remove_policy",
+                "update_policy",
+                "load_policy",
+            ],
+        )
+
+        metrics.reset()
+        self.assertEqual(metrics.snapshot(), {"methods": {}, "commands": {}})
+
+    def test_command_listener(self):
+        """
+        test metrics of the commands
+        """
+        metrics = Metrics()
+        listener = metrics.command_listener()
+        address = ("localhost", 27017)
+        with metrics.measure("load_policy"):
+            listener.started(
+                CommandStartedEvent(
+                    {"find": "casbin_rule"}, "casbin_test", 1, address, 1
+                )
+            )
+        listener.succeeded(
+            CommandSucceededEvent(
+                timedelta(milliseconds=2),
+                {"cursor": {"firstBatch": [{"ptype": "p"}, {"ptype": "g"}]}, "ok": 1},
+                "find",
+                1,
+                address,
+                1,
+            )
+        )
+
+        snapshot = metrics.snapshot()
+        find = snapshot["commands"]["find"]
+        self.assertEqual(find["calls"], 1)
+        self.assertEqual(find["documents_read"], 2)
+        self.assertAlmostEqual(find["seconds"], 0.002)
+        self.assertGreater(find["bytes_sent"], 0)
+        self.assertGreater(find["bytes_received"], 0)
+        self.assertEqual(snapshot["methods"]["load_policy"]["documents_read"], 2)
@@ -0,0 +1,195 @@
+from casbin_pymongo_adapter import Adapter, Watcher
+from pymongo import MongoClient
+from unittest import TestCase, skipUnless
+import casbin
+import os
+import tempfile
+import time
+
+from tests.helper import get_fixture
+
+
+def is_replica_set():
+    client = MongoClient("mongodb://localhost:27017")
+    return client.admin.command("hello").get("setName") is not None
+
+
+def server_version():
+    client = MongoClient("mongodb://localhost:27017")
+    return tuple(client.server_info()["versionArray"][:2])
+
+
+def wait_for(predicate, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.05)
+    return predicate()
+
+
+@skipUnless(is_replica_set(), "change streams need a replica set")
+class TestWatcher(TestCase):
+    """
+    unittest
+    """
+
+    def setUp(self):
+        MongoClient("mongodb://localhost:27017").drop_database("casbin_test")
+        self.adapter = Adapter("mongodb://localhost:27017", "casbin_test")
+        self.adapter.add_policy("p", "p", ["alice", "data1", "read"])
+        self.enforcer = casbin.Enforcer(get_fixture("rbac_model.conf"), self.adapter)
+        self.reloads = []
+        self.token_path = os.path.join(tempfile.mkdtemp(), "resume_token")
+
+    def tearDown(self):
+        MongoClient("mongodb://localhost:27017").drop_database("casbin_test")
+
+    def new_watcher(self):
+        watcher = Watcher(
+            self.adapter, self.enforcer, resume_token_path=self.token_path
+        )
+        watcher.set_update_callback(lambda: self.reloads.append(True))
+        self.enforcer.set_watcher(watcher)
+        # let the stream open before other writers start
+        wait_for(lambda: watcher.resume_token is not None)
+        return watcher
+
+    def test_insert_is_applied_incrementally(self):
+        watcher = self.new_watcher()
+        writer = Adapter("mongodb://localhost:27017", "casbin_test")
+        writer.add_policy("p", "p", ["bob", "data2", "write"])
+        writer.add_policy("g", "g", ["carol", "bob"])
+
+        self.assertTrue(
+            wait_for(lambda: self.enforcer.enforce("carol", "data2", "write"))
+        )
+        self.assertTrue(self.enforcer.enforce("alice", "data1", "read"))
+        self.assertEqual(self.reloads, [])
+        watcher.close()
+
+    def test_resume_after_restart(self):
+        watcher = self.new_watcher()
+        watcher.close()
+        self.assertTrue(os.path.exists(self.token_path))
+
+        writer = Adapter("mongodb://localhost:27017", "casbin_test")
+        writer.add_policy("p", "p", ["bob", "data2", "write"])
+
+        watcher = self.new_watcher()
+        self.assertTrue(
+            wait_for(lambda: self.enforcer.enforce("bob", "data2", "write"))
+        )
+        self.assertEqual(self.reloads, [])
+        watcher.close()
+
+    @skipUnless(is_replica_set() and server_version() >= (6, 0), "needs pre-images")
+    def test_delete_and_update_with_pre_images(self):
+        watcher = self.new_watcher()
+        watcher.enable_pre_images()
+        writer = Adapter("mongodb://localhost:27017", "casbin_test")
+        writer.add_policy("p", "p", ["bob", "data2", "write"])
+        self.assertTrue(
+            wait_for(lambda: self.enforcer.enforce("bob", "data2", "write"))
+        )
+
+        writer.remove_policy("p", "p", ["alice", "data1", "read"])
+        writer.update_policy(
+            "p", "p", ["bob", "data2", "write"], ["bob", "data2", "read"]
+        )
+
+        self.assertTrue(wait_for(lambda: self.enforcer.enforce("bob", "data2", "read")))
+        self.assertFalse(self.enforcer.enforce("bob", "data2", "write"))
+        self.assertFalse(self.enforcer.enforce("alice", "data1", "read"))
+        self.assertEqual(self.reloads, [])
+        watcher.close()
+
+    @skipUnless(is_replica_set() and server_version() >= (6, 0), "needs pre-images")
+    def test_deleted_copies_are_skipped(self):
+        watcher = self.new_watcher()
+        watcher.enable_pre_images()
+        collection = MongoClient("mongodb://localhost:27017").casbin_test.casbin_rule
+        collection.insert_many(
+            [
+                {"ptype": "p", "v0": "bob", "v1": "data2", "v2": "write"}
+                for _ in range(3)
+            ]
+        )
+        self.assertTrue(
+            wait_for(lambda: self.enforcer.enforce("bob", "data2", "write"))
+        )
+
+        writer = Adapter("mongodb://localhost:27017", "casbin_test")
+        self.assertEqual(writer.deduplicate(), {"p": 2})
+        writer.add_policy("p", "p", ["carol", "data3", "read"])
+        self.assertTrue(
+            wait_for(lambda: self.enforcer.enforce("carol", "data3", "read"))
+        )
+        self.assertTrue(self.enforcer.enforce("bob", "data2", "write"))
+        self.assertEqual(self.reloads, [])
+        watcher.close()
+
+    def test_reloads_are_coalesced(self):
+        watcher = Watcher(self.adapter, self.enforcer, start=False)
+        watcher.set_update_callback(lambda: self.reloads.append(True))
+        update = {
+            "operationType": "update",
+            "updateDescription": {"updatedFields": {"v2": "write"}},
+        }
+        for _ in range(3):
+            watcher._apply(update)
+        self.assertEqual(self.reloads, [])
+        self.assertTrue(watcher._reload_pending)
+
+        watcher._reload_pending = False
+        watcher._apply(
+            {
+                "operationType": "update",
+                "updateDescription": {"updatedFields": {"key": "k", "rev": 3}},
+            }
+        )
+        self.assertFalse(watcher._reload_pending)
+
+        watcher = self.new_watcher()
+        writer = Adapter("mongodb://localhost:27017", "casbin_test")
+        writer.add_policies(
+            "p", "p", [[f"user{i}", "data", "read"] for i in range(200)]
+        )
+        writer.update_policies(
+            "p",
+            "p",
+            [[f"user{i}", "data", "read"] for i in range(200)],
+            [[f"user{i}", "data", "write"] for i in range(200)],
+        )
+        self.assertTrue(wait_for(lambda: self.reloads))
+        time.sleep(0.5)
+        self.assertLess(len(self.reloads), 10)
+        watcher.close()
+
+    def test_key_updates_are_skipped(self):
+        watcher = self.new_watcher()
+        Adapter(
+            "mongodb://localhost:27017", "casbin_test", rule_keys=True
+        ).backfill_rule_keys()
+        writer = Adapter("mongodb://localhost:27017", "casbin_test")
+        writer.add_policy("p", "p", ["bob", "data2", "write"])
+        self.assertTrue(
+            wait_for(lambda: self.enforcer.enforce("bob", "data2", "write"))
+        )
+        self.assertEqual(self.reloads, [])
+        watcher.close()
+
+    def test_reload_errors_are_logged(self):
+        watcher = Watcher(self.adapter, self.enforcer, retry_interval=0, start=False)
+
+        def fail():
+            raise RuntimeError("unavailable")
+
+        watcher.set_update_callback(fail)
+        with self.assertLogs("casbin_pymongo_adapter", "ERROR"):
+            watcher._reload()
+        self.assertTrue(watcher._reload_pending)
+
+        watcher = self.new_watcher()
+        self.assertEqual(watcher._pre_images, server_version() >= (6, 0))
+        watcher.close()